@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Сквозной бенчмарк сборки справки без обращения к сети.
+Генерирует синтетическую вику, отдаёт её локальным HTTP-сервером с задержкой,
+замеряет обход WikiDownloader и подготовку ChmPrepare (страницы, HHC, HHK),
+а также их конвейер в одном процессе (CrawlPipeline)
+и сохраняет результаты в JSON: время, пропускная способность, пиковая память.
+"""
+
+import os, sys, json
+import time
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+from datetime import datetime
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'qsp_wiki_downloader'))
+sys.path.insert(0, os.path.join(ROOT, 'chm_prepare'))
+
+from local_wiki_server import LocalWikiServer, routes_from_scheme
+from synthetic_wiki import BASE_URL, generate_site
+
+try:
+    import resource
+except ImportError:
+    # Windows: пиковая память не замеряется
+    resource = None
+
+def peak_rss_kb():
+    """ Пиковая память процесса и его дочерних процессов, КБ (None, если замер недоступен) """
+    if resource is None:
+        return None
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # на macOS ru_maxrss в байтах, на Linux - в килобайтах
+    scale = 1024 if sys.platform == 'darwin' else 1
+    return max(own, children) // scale
+
+def crawl_stage(params:dict) -> dict:
+    """ Обход локальной вики загрузчиком """
+    from qsp_wiki_downloader import WikiDownloader
+
+    downloader = WikiDownloader(
+        base_url=params['base_url'], output_dir=params['output_dir'],
+        workers=params['workers'], per_host_limit=params['per_host'],
+        rate=params['rate'], extractor=params['extractor'])
+    started = time.perf_counter()
+    downloader.download_wiki()
+    downloader.save_urls_link_files()
+    wall = time.perf_counter() - started
+
+    stats = downloader.get_download_stats()
+    return {
+        'wall_s': wall,
+        'pages': stats['downloaded_urls'],
+        'images': stats['downloaded_images'],
+        'failed': stats['failed_urls'] + stats['failed_images'],
+        'pages_per_s': stats['downloaded_urls'] / wall,
+        'peak_rss_kb': peak_rss_kb()
+    }
+
+def transform_stage(params:dict) -> dict:
+    """ Подготовка страниц, HHC, HHK и HHP """
+    from to_chm_prepare import ChmPrepare
+
+    started = time.perf_counter()
+    preparat = ChmPrepare(params['settings'])
+    setup = time.perf_counter()
+    errors = preparat.prepare_html_files(jobs=params['jobs'])
+    pages = time.perf_counter()
+    preparat.prepare_navigation()
+    hhp = time.perf_counter()
+
+    # qsp.hhc и qsp.hhk пишутся при подготовке своих страниц: их время - время этих страниц
+    navigation = {'qsp.hhc': 0.0, 'qsp.hhk': 0.0}
+    for file_path in preparat.files_pathes:
+        if preparat.is_toc(file_path):
+            name = os.path.basename(preparat.target_path(file_path))
+            navigation[name] = sum(preparat.metrics.files.get(os.path.basename(file_path), {}).values())
+    files = preparat.build_stats['built']
+    return {
+        'wall_s': hhp - started,
+        'setup_s': setup - started,
+        'pages_s': pages - setup,
+        'hhc_s': navigation['qsp.hhc'],
+        'hhk_s': navigation['qsp.hhk'],
+        'hhp_s': hhp - pages,
+        'files': files,
+        'failed': len(errors),
+        'files_per_s': files / (pages - setup),
+        'peak_rss_kb': peak_rss_kb()
+    }
+
+def pipeline_stage(params:dict) -> dict:
+    """ Обход с подготовкой страниц по ходу загрузки """
+    from qsp_wiki_downloader import WikiDownloader
+    from crawl_pipeline import CrawlPipeline
+
+    downloader = WikiDownloader(
+        base_url=params['base_url'], output_dir=params['output_dir'],
+        workers=params['workers'], per_host_limit=params['per_host'], rate=params['rate'])
+    pipeline = CrawlPipeline(downloader, params['settings'])
+    started = time.perf_counter()
+    downloader.download_wiki()
+    crawled = time.perf_counter()
+    errors = pipeline.finish()
+    finished = time.perf_counter()
+
+    stats = downloader.get_download_stats()
+    return {
+        'wall_s': finished - started,
+        'crawl_s': crawled - started,
+        'finish_s': finished - crawled,
+        'pages': stats['downloaded_urls'],
+        'images': stats['downloaded_images'],
+        'files': pipeline.preparat.build_stats['built'],
+        'immediate': pipeline.stats['immediate'],
+        'deferred': pipeline.stats['deferred'],
+        'failed': stats['failed_urls'] + stats['failed_images'] + len(errors),
+        'pages_per_s': stats['downloaded_urls'] / (finished - started),
+        'peak_rss_kb': peak_rss_kb()
+    }
+
+def _run_stage(stage, workdir:str, params:dict) -> dict:
+    # лог загрузчика создаётся в текущей папке; подробный лог искажал бы замер
+    os.chdir(workdir)
+    logging.disable(logging.INFO)
+    return stage(params)
+
+def run_isolated(stage, workdir:str, params:dict) -> dict:
+    """ Этап в свежем процессе: пиковая память не смешивается между замерами """
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+        return pool.submit(_run_stage, stage, workdir, params).result()
+
+def bench_size(args, pages:int, workdir:str) -> list:
+    """ Все замеры для вики одного размера """
+    runs = []
+    site_dir = os.path.join(workdir, 'site')
+    started = time.perf_counter()
+    site = generate_site(site_dir, pages=pages, links_per_page=args.links,
+                         images_per_page=args.images_per_page, seed=args.seed)
+    site['generate_s'] = time.perf_counter() - started
+    print(f"\n== {pages} страниц: сгенерировано {site['pages']} страниц, {site['images']} изображений, "
+          f"{site['bytes'] / 1024 / 1024:.1f} МБ за {site['generate_s']:.1f} с")
+
+    # без обхода подготовка идёт прямо по сгенерированной вике
+    transform_src, transform_base = site_dir, BASE_URL
+
+    if 'crawl' in args.stages:
+        routes = routes_from_scheme(os.path.join(site_dir, 'urls_links_to_files.json'), site_dir)
+        with LocalWikiServer(routes, latency=args.latency) as server:
+            for workers in args.workers:
+                for extractor in args.extractor:
+                    mode = {'workers': workers, 'extractor': extractor}
+                    output_dir = os.path.join(workdir, f'crawl_w{workers}_{extractor}')
+                    os.makedirs(output_dir)
+                    requests_before, bytes_before = server.requests_count, server.bytes_sent
+                    result = run_isolated(crawl_stage, workdir, {
+                        'base_url': server.base_url, 'output_dir': output_dir,
+                        'workers': workers, 'per_host': args.per_host, 'rate': args.rate,
+                        'extractor': extractor
+                    })
+                    result['requests'] = server.requests_count - requests_before
+                    result['bytes_served'] = server.bytes_sent - bytes_before
+                    runs.append({'size': pages, 'site': site, 'stage': 'crawl', 'mode': mode, **result})
+                    print_run(runs[-1])
+                    if transform_src == site_dir:
+                        transform_src, transform_base = output_dir, server.base_url
+
+    if 'pipeline' in args.stages:
+        routes = routes_from_scheme(os.path.join(site_dir, 'urls_links_to_files.json'), site_dir)
+        with LocalWikiServer(routes, latency=args.latency) as server:
+            for workers in args.workers:
+                output_dir = os.path.join(workdir, f'pipeline_w{workers}')
+                os.makedirs(output_dir)
+                result = run_isolated(pipeline_stage, workdir, {
+                    'base_url': server.base_url, 'output_dir': output_dir,
+                    'workers': workers, 'per_host': args.per_host, 'rate': args.rate,
+                    'settings': {'out_html_folder': os.path.join(workdir, f'pipeline_out_w{workers}'),
+                                 'base_url': server.base_url}
+                })
+                runs.append({'size': pages, 'site': site, 'stage': 'pipeline',
+                             'mode': {'workers': workers}, **result})
+                print_run(runs[-1])
+
+    if 'transform' in args.stages:
+        for engine in args.engine:
+            for jobs in args.jobs:
+                mode = {'engine': engine, 'jobs': jobs}
+                out_dir = os.path.join(workdir, f'out_{engine}_j{jobs}')
+                result = run_isolated(transform_stage, workdir, {
+                    'jobs': jobs,
+                    'settings': {
+                        'src_html_folder': transform_src,
+                        'out_html_folder': out_dir,
+                        'scheme': os.path.join(transform_src, 'urls_links_to_files.json'),
+                        'base_url': transform_base,
+                        'incremental': False,
+                        'engine': engine
+                    }
+                })
+                runs.append({'size': pages, 'site': site, 'stage': 'transform', 'mode': mode, **result})
+                print_run(runs[-1])
+    return runs
+
+def run_key(run:dict) -> str:
+    return json.dumps([run['size'], run['stage'], run['mode']], sort_keys=True)
+
+def print_run(run:dict) -> None:
+    mode = ', '.join(f'{k}={v}' for k, v in run['mode'].items())
+    rss = f"{run['peak_rss_kb'] / 1024:.0f} МБ" if run['peak_rss_kb'] else '-'
+    if run['stage'] == 'crawl':
+        print(f"  обход      [{mode}]: {run['wall_s']:.2f} с, {run['pages']} страниц, "
+              f"{run['images']} изображений, {run['pages_per_s']:.1f} стр/с, "
+              f"запросов {run['requests']}, память {rss}")
+    elif run['stage'] == 'pipeline':
+        print(f"  конвейер   [{mode}]: {run['wall_s']:.2f} с (обход с подготовкой {run['crawl_s']:.2f}, "
+              f"досборка {run['finish_s']:.2f}), {run['files']} файлов, сразу {run['immediate']}, "
+              f"отложено {run['deferred']}, {run['pages_per_s']:.1f} стр/с, память {rss}")
+    else:
+        print(f"  подготовка [{mode}]: {run['wall_s']:.2f} с (страницы {run['pages_s']:.2f}, "
+              f"HHC {run['hhc_s']:.2f}, HHK {run['hhk_s']:.2f}, HHP {run['hhp_s']:.2f}), {run['files']} файлов, "
+              f"{run['files_per_s']:.1f} файл/с, память {rss}")
+
+def compare(runs:list, baseline_path:str, max_slowdown:float) -> bool:
+    """ Сравнение с прошлыми результатами; False, если есть замедление сверх порога """
+    with open(baseline_path, 'r', encoding='utf-8') as fp:
+        baseline = {run_key(run): run for run in json.load(fp)['runs']}
+    ok = True
+    print(f'\nСравнение с {baseline_path}:')
+    for run in runs:
+        old = baseline.get(run_key(run))
+        if old is None:
+            continue
+        ratio = run['wall_s'] / old['wall_s']
+        mark = ''
+        if ratio > max_slowdown:
+            mark = '  <-- замедление'
+            ok = False
+        mode = ', '.join(f'{k}={v}' for k, v in run['mode'].items())
+        print(f"  {run['size']:>6} {run['stage']:<10} [{mode}]: "
+              f"{old['wall_s']:.2f} -> {run['wall_s']:.2f} с ({ratio:.2f}x){mark}")
+    return ok
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Сквозной бенчмарк загрузки и подготовки справки')
+    parser.add_argument('--pages', type=int, nargs='+', default=[100],
+                        help='размеры синтетической вики, например: 100 1000 10000')
+    parser.add_argument('--links', type=int, default=20, help='ссылок на страницу')
+    parser.add_argument('--images-per-page', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--stages', nargs='+', choices=('crawl', 'transform', 'pipeline'),
+                        default=['crawl', 'transform'])
+    parser.add_argument('--latency', type=float, default=0.005, help='задержка ответа сервера, сек.')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8], help='режимы обхода: число потоков')
+    parser.add_argument('--per-host', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=0.0,
+                        help='ограничение загрузчика, запросов в секунду (0 - без ограничения)')
+    parser.add_argument('--extractor', nargs='+', choices=('stream', 'soup'), default=['stream'])
+    parser.add_argument('--engine', nargs='+', choices=('fast', 'full'), default=['fast'])
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, os.cpu_count() or 1],
+                        help='режимы подготовки: число процессов')
+    parser.add_argument('--output', default='bench_results.json', help='файл результатов')
+    parser.add_argument('--workdir', default=None, help='рабочая папка (по умолчанию временная, удаляется)')
+    parser.add_argument('--baseline', default=None, help='прошлые результаты для сравнения')
+    parser.add_argument('--max-slowdown', type=float, default=1.25,
+                        help='допустимое замедление относительно --baseline')
+    args = parser.parse_args(argv)
+    # одинаковые режимы замеряются один раз
+    args.workers = list(dict.fromkeys(args.workers))
+    args.jobs = list(dict.fromkeys(args.jobs))
+    return args
+
+def main():
+    args = parse_args()
+    root_dir = args.workdir or tempfile.mkdtemp(prefix='qsp_bench_')
+    runs = []
+    try:
+        for pages in args.pages:
+            workdir = os.path.join(root_dir, str(pages))
+            shutil.rmtree(workdir, ignore_errors=True)
+            os.makedirs(workdir)
+            runs.extend(bench_size(args, pages, workdir))
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(root_dir, ignore_errors=True)
+
+    results = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'args': vars(args)
+        },
+        'runs': runs
+    }
+    with open(args.output, 'w', encoding='utf-8') as fp:
+        json.dump(results, fp, ensure_ascii=False, indent=2)
+    print(f'\nРезультаты сохранены в {args.output}')
+
+    if args.baseline and not compare(runs, args.baseline, args.max_slowdown):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
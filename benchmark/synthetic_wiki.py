@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Генератор синтетической вики с разметкой DokuWiki (шаблон qspdokuwiki).
+Страницы устроены так же, как на wiki.qsp.org: шапка, боковая панель,
+div.page.group с оглавлением, скрипты и docInfo, подвал.
+Результат - папка в формате html_src со схемой urls_links_to_files.json.
+"""
+
+import os, json
+import html
+import zlib
+import struct
+import random
+import argparse
+
+BASE_URL = 'https://wiki.qsp.org'
+NAMESPACES = ('help', 'howto', 'glossary', 'playground')
+WORDS = ('локация', 'действие', 'переменная', 'строка', 'массив', 'оператор',
+         'функция', 'игрок', 'объект', 'окно', 'значение', 'условие', 'цикл',
+         'код', 'текст', 'кнопка', 'меню', 'звук', 'картинка', 'модуль',
+         'qsp', 'gosub', 'goto', 'act', 'if', 'end', 'pl', 'msg', 'killvar')
+# столько страниц попадает в боковую панель каждой страницы, как на настоящей вики
+ASIDE_PAGES = 40
+
+def page_file_name(page_id:str) -> str:
+    """ Имя файла страницы - так же, как его строит загрузчик """
+    return page_id.replace(':', '_') + '.html'
+
+def image_file_name(url_path:str) -> str:
+    """ Имя файла изображения по пути url: query и /_detail/ ведут на тот же файл """
+    return url_path.split('?')[0].rsplit('/', 1)[-1].replace(':', '_')
+
+def page_id_file(page_id:str) -> str:
+    """ Путь исходника страницы в DokuWiki (для docInfo) """
+    return page_id.replace(':', '/') + '.txt'
+
+def png_bytes(seed:int, width:int = 64, height:int = 48) -> bytes:
+    """ Небольшое корректное PNG-изображение, различное для разных seed """
+    rnd = random.Random(seed)
+    rows = b''.join(
+        b'\x00' + bytes(rnd.randrange(256) for _ in range(width * 3))
+        for _ in range(height))
+
+    def chunk(tag:bytes, data:bytes) -> bytes:
+        return (struct.pack('>I', len(data)) + tag + data
+                + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff))
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(rows))
+            + chunk(b'IEND', b''))
+
+class SyntheticWiki:
+    """ Описание синтетической вики: страницы, ссылки, изображения, ключевые слова """
+
+    def __init__(self, pages:int = 100, links_per_page:int = 20, images:int = None,
+                 images_per_page:int = 2, paragraphs:int = 8, seed:int = 1) -> None:
+        self.rnd = random.Random(seed)
+        self.links_per_page = links_per_page
+        self.images_per_page = images_per_page
+        self.paragraphs = paragraphs
+
+        self.page_ids = ['start'] + [
+            f'{NAMESPACES[i % len(NAMESPACES)]}:page{i:05d}' for i in range(1, pages)]
+        images = max(1, pages // 5) if images is None else images
+        self.image_ids = [f'{NAMESPACES[i % len(NAMESPACES)]}:image{i:05d}.png'
+                          for i in range(images)]
+        # ключевые слова указателя: одно-два на страницу
+        self.keywords = sorted(
+            (f'{self.rnd.choice(WORDS)}{i}', page_id)
+            for i, page_id in enumerate(self.page_ids[1:]) if i % 2 == 0)
+        # адреса изображений, на которые действительно ссылаются страницы
+        self.image_urls:dict[str, None] = {}
+
+    def image_url(self, url_path:str) -> str:
+        self.image_urls[url_path] = None
+        return url_path
+
+    def words(self, count:int) -> str:
+        return ' '.join(self.rnd.choice(WORDS) for _ in range(count))
+
+    def link(self, page_id:str) -> str:
+        return f'<a href="/{page_id}" class="wikilink1" title="{page_id}">{page_id}</a>'
+
+    def aside(self) -> str:
+        items = ''.join(
+            f'<li class="level1"><div class="li">{self.link(page_id)}</div></li>\n'
+            for page_id in self.page_ids[:ASIDE_PAGES])
+        return (f'<div id="dokuwiki__aside"><div class="pad include group">'
+                f'<h3 class="toggle">Боковая панель</h3><div class="content">\n'
+                f'<ul>\n{items}</ul>\n</div></div></div>\n')
+
+    def page_body(self, index:int) -> str:
+        """ Содержимое div.page.group обычной страницы """
+        page_id = self.page_ids[index]
+        # цепочка гарантирует, что до каждой страницы можно дойти обходом
+        targets = [self.page_ids[(index + 1) % len(self.page_ids)]] + [
+            self.rnd.choice(self.page_ids) for _ in range(self.links_per_page - 1)]
+        images = [self.rnd.choice(self.image_ids) for _ in range(self.images_per_page)]
+
+        sections = []
+        toc = []
+        for n in range(self.paragraphs):
+            anchor = f'section_{n}'
+            toc.append(f'<li class="level2"><div class="li"><a href="#{anchor}">'
+                       f'Раздел {n}</a></div></li>')
+            links = ', '.join(self.link(t) for t in targets[n::self.paragraphs])
+            sections.append(
+                f'<h2 class="sectionedit{n + 2}" id="{anchor}">Раздел {n}</h2>\n'
+                f'<div class="level2">\n<p>\n{self.words(60)} {links}\n</p>\n'
+                f'<pre class="brush: qsp">\n{html.escape(self.words(12))}\n'
+                f'if x &gt; 0: pl "{self.words(3)}"\n</pre>\n</div>\n')
+        for n, image_id in enumerate(images):
+            # загрузчик берёт ссылку на /_detail/ без query, а src уменьшенной копии - целиком
+            self.image_url(f'/_detail/{image_id}')
+            src = self.image_url(f'/_media/{image_id}?w=200&tok={n:06x}')
+            sections.append(
+                f'<p><a href="/_detail/{image_id}?id={page_id}" class="media" title="{image_id}">'
+                f'<img src="{html.escape(src)}" class="mediacenter" '
+                f'width="200" alt="" /></a></p>\n')
+
+        return (f'<div id="dw__toc" class="dw__toc"><h3 class="toggle">Содержание</h3>'
+                f'<div><ul class="toc">\n{"".join(toc)}\n</ul></div></div>\n'
+                f'<h1 class="sectionedit1" id="{page_id.replace(":", "_")}">{page_id}</h1>\n'
+                + ''.join(sections))
+
+    def sidebar_body(self) -> str:
+        """ Содержание справки: разделы по пространствам имён, внутри - страницы """
+        groups = []
+        for namespace in NAMESPACES:
+            items = ''.join(
+                f'<li class="level2"><div class="li">{self.link(page_id)}</div></li>\n'
+                for page_id in self.page_ids if page_id.startswith(namespace + ':'))
+            groups.append(f'<li class="level1 node"><div class="li"><strong>{namespace}</strong>'
+                          f'</div>\n<ul>\n{items}</ul>\n</li>\n')
+        start = f'<li class="level1"><div class="li">{self.link("start")}</div></li>\n'
+        return f'<h1>Содержание</h1>\n<ul>\n{start}{"".join(groups)}</ul>\n'
+
+    def keywords_body(self) -> str:
+        """ Указатель: ключевое слово -> страница """
+        items = ''.join(
+            f'<li class="level1"><div class="li"><a href="/{page_id}" class="wikilink1" '
+            f'title="{page_id}">{word}</a></div></li>\n'
+            for word, page_id in self.keywords)
+        return f'<h1>Ключевые слова</h1>\n<ul>\n{items}</ul>\n'
+
+    def render(self, page_id:str, body:str) -> str:
+        """ Полная страница DokuWiki вокруг содержимого """
+        for name in ('/_media/wiki:logo.png', '/lib/tpl/qspdokuwiki/images/button-donate.gif',
+                     '/lib/tpl/qspdokuwiki/images/button-dw.png'):
+            self.image_url(name)
+        crumbs = ''.join(
+            f'<a href="/{t}" class="breadcrumbs" title="{t}">{t}</a> '
+            for t in self.rnd.sample(self.page_ids, min(5, len(self.page_ids))))
+        return f'''<!DOCTYPE html>
+<html lang="ru" dir="ltr" class="no-js">
+<head>
+<meta charset="utf-8" />
+<title>{page_id} [Документация QSP]</title>
+<script>(function(H){{H.className=H.className.replace(/\\bno-js\\b/,'js')}})(document.documentElement)</script>
+<meta name="generator" content="DokuWiki"/>
+<link rel="contents" href="/{page_id}?do=index" title="Все страницы"/>
+<link rel="stylesheet" type="text/css" href="/lib/exe/css.php?t=qspdokuwiki"/>
+<script type="text/javascript">var NS='';var JSINFO = {{"id":"{page_id}"}};</script>
+</head>
+<body>
+<div id="dokuwiki__site"><div id="dokuwiki__top" class="site dokuwiki mode_show tpl_qspdokuwiki showSidebar hasSidebar">
+<div id="dokuwiki__header"><div class="pad group">
+<div class="headings group"><h1><a href="/start" accesskey="h" title="[H]"><img src="/_media/wiki:logo.png" width="147" height="74" alt="" /></a></h1></div>
+<div class="tools group"><div id="dokuwiki__usertools"><ul>
+<li><a href="/{page_id}?do=login&amp;sectok=" class="action login" rel="nofollow" title="Войти">Войти</a></li>
+<li><a href="/{page_id}?do=index" class="action index" rel="nofollow" title="Все страницы">Все страницы</a></li>
+</ul></div></div>
+<div class="breadcrumbs"><div class="trace">{crumbs}</div></div>
+</div></div>
+<div class="wrapper group">
+{self.aside()}
+<div id="dokuwiki__content"><div class="pad group">
+<div class="pageId"><span>{page_id}</span></div>
+<div class="page group">
+{body}
+<script type='text/javascript'>SyntaxHighlighter.all();</script>
+</div>
+<div class="docInfo"><bdi>{page_id_file(page_id)}</bdi> · Последние изменения: 2025/01/01 00:00</div>
+</div></div>
+<div id="dokuwiki__pagetools"><div class="tools"><ul>
+<li><a href="/{page_id}?do=edit" class="action source" rel="nofollow">Показать исходный текст</a></li>
+<li><a href="#dokuwiki__top" class="action top" rel="nofollow">Наверх</a></li>
+</ul></div></div>
+</div>
+<div id="dokuwiki__footer"><div class="pad"><div class="buttons">
+<a href="https://www.dokuwiki.org/donate" title="Donate"><img src="/lib/tpl/qspdokuwiki/images/button-donate.gif" width="80" height="15" alt="Donate" /></a>
+<a href="https://dokuwiki.org/" title="Driven by DokuWiki"><img src="/lib/tpl/qspdokuwiki/images/button-dw.png" width="80" height="15" alt="Driven by DokuWiki" /></a>
+</div></div></div>
+</div></div>
+</body>
+</html>
+'''
+
+    def pages(self):
+        """ Пары (id страницы, html): обычные страницы, содержание и указатель """
+        for index, page_id in enumerate(self.page_ids):
+            body = self.page_body(index)
+            if page_id == 'start':
+                # содержание и указатель доступны со стартовой страницы
+                body = (f'<p>{self.link("sidebar")} {self.link("help:keywords")}</p>\n' + body)
+            yield page_id, self.render(page_id, body)
+        yield 'sidebar', self.render('sidebar', self.sidebar_body())
+        yield 'help:keywords', self.render('help:keywords', self.keywords_body())
+
+    def images(self):
+        """ Пары (путь url файла изображения, содержимое) """
+        yield '/_media/wiki:logo.png', png_bytes(0)
+        for name in ('button-donate.gif', 'button-dw.png'):
+            yield f'/lib/tpl/qspdokuwiki/images/{name}', png_bytes(len(name), 80, 15)
+        for n, image_id in enumerate(self.image_ids, start=1):
+            yield f'/_media/{image_id}', png_bytes(n)
+
+def generate_site(out_dir:str, **kwargs) -> dict:
+    """
+    Записывает синтетическую вики в out_dir (формат html_src) и возвращает
+    сводку: число страниц, изображений и общий размер в байтах.
+    """
+    wiki = SyntheticWiki(**kwargs)
+    images_dir = os.path.join(out_dir, 'images')
+    os.makedirs(images_dir, exist_ok=True)
+    scheme = {'pages': {}, 'images': {}}
+    total_bytes = 0
+
+    for page_id, markup in wiki.pages():
+        file_name = page_file_name(page_id)
+        data = markup.encode('utf-8')
+        with open(os.path.join(out_dir, file_name), 'wb') as fp:
+            fp.write(data)
+        total_bytes += len(data)
+        # пути в схеме - как у загрузчика под Windows
+        scheme['pages'][f'{BASE_URL}/{page_id}'] = f'..\\html_src\\{file_name}'
+        if page_id == 'start':
+            scheme['pages'][BASE_URL] = f'..\\html_src\\{file_name}'
+
+    for url_path, data in wiki.images():
+        with open(os.path.join(images_dir, image_file_name(url_path)), 'wb') as fp:
+            fp.write(data)
+    # в схему попадают только адреса, найденные на страницах
+    for url_path in wiki.image_urls:
+        file_name = image_file_name(url_path)
+        scheme['images'][f'{BASE_URL}{url_path}'] = f'..\\html_src\\images\\{file_name}'
+        total_bytes += os.path.getsize(os.path.join(images_dir, file_name))
+
+    with open(os.path.join(out_dir, 'urls_links_to_files.json'), 'w', encoding='utf-8') as fp:
+        json.dump(scheme, fp, ensure_ascii=False, indent=4)
+
+    return {
+        'pages': len(wiki.page_ids) + 2,
+        'images': len(wiki.image_urls),
+        'bytes': total_bytes
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Генератор синтетической вики DokuWiki')
+    parser.add_argument('out_dir')
+    parser.add_argument('--pages', type=int, default=100)
+    parser.add_argument('--links', type=int, default=20, help='ссылок на страницу')
+    parser.add_argument('--images', type=int, default=None, help='разных изображений (по умолчанию pages/5)')
+    parser.add_argument('--images-per-page', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    summary = generate_site(args.out_dir, pages=args.pages, links_per_page=args.links,
+                            images=args.images, images_per_page=args.images_per_page, seed=args.seed)
+    print(f"Страниц: {summary['pages']}, изображений: {summary['images']}, "
+          f"объём: {summary['bytes'] / 1024 / 1024:.1f} МБ")
+
+if __name__ == "__main__":
+    main()
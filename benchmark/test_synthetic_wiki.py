@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка синтетической вики: обход находит все страницы и изображения,
+а ChmPrepare собирает по ней страницы, содержание и указатель.
+"""
+
+import os, json
+
+from run_benchmark import crawl_stage, transform_stage
+from local_wiki_server import LocalWikiServer, routes_from_scheme
+from synthetic_wiki import generate_site
+
+def test_synthetic_wiki_end_to_end(tmp_path):
+    site_dir = str(tmp_path / 'site')
+    site = generate_site(site_dir, pages=30, links_per_page=5)
+    with open(os.path.join(site_dir, 'urls_links_to_files.json'), encoding='utf-8') as fp:
+        scheme = json.load(fp)
+
+    routes = routes_from_scheme(os.path.join(site_dir, 'urls_links_to_files.json'), site_dir)
+    output_dir = str(tmp_path / 'crawl')
+    os.makedirs(output_dir)
+    with LocalWikiServer(routes) as server:
+        crawl = crawl_stage({
+            'base_url': server.base_url, 'output_dir': output_dir,
+            'workers': 4, 'per_host': 4, 'rate': 0, 'extractor': 'stream'
+        })
+        base_url = server.base_url
+
+    # все страницы и все адреса изображений схемы достижимы обходом
+    assert crawl['failed'] == 0
+    assert crawl['pages'] == len(scheme['pages']) == site['pages'] + 1
+    assert crawl['images'] == len(scheme['images'])
+
+    out_dir = str(tmp_path / 'out')
+    transform = transform_stage({
+        'jobs': 1,
+        'settings': {
+            'src_html_folder': output_dir, 'out_html_folder': out_dir,
+            'scheme': os.path.join(output_dir, 'urls_links_to_files.json'),
+            'base_url': base_url, 'incremental': False
+        }
+    })
+    assert transform['failed'] == 0
+    assert transform['files'] == crawl['pages']
+    with open(os.path.join(out_dir, 'qsp.hhc'), encoding='windows-1251') as fp:
+        hhc = fp.read()
+    assert hhc.count('text/sitemap') == 30 + 4
@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Сборка справки в несколько форматов за один запуск: CHM (html_out с qsp.hhc,
+qsp.hhk и qsp.hhp), статический сайт, одна html-страница и EPUB.
+Страницы разбираются и очищаются один раз (ParsedCorpus), их ссылки
+разрешаются один раз в граф ссылок, содержание и указатель - в деревья.
+Форматы отличаются только правилами ссылок и способом записи.
+"""
+
+import os, re, json
+import html
+import time
+import uuid
+import base64
+import zipfile
+import argparse
+import traceback
+from urllib.parse import urljoin
+from concurrent.futures import ProcessPoolExecutor
+
+import lxml.html
+from lxml import etree
+
+from to_chm_prepare import ChmPrepare, fill_links, read_file, write_file
+from toc_model import TocNode
+from link_index import canonicalize_url
+
+TITLE_SUFFIX_RE = re.compile(r'\s*\[[^\]]*\]\s*$')
+TAG_RE = re.compile(r'<([a-zA-Z][a-zA-Z0-9]*)\b[^>]*>')
+ID_ATTR_RE = re.compile(r'(\sid=")([^"]*)(")')
+NAME_ATTR_RE = re.compile(r'(\sname=")([^"]*)(")')
+MEDIA_TYPES = {'.png': 'image/png', '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.gif': 'image/gif',
+               '.svg': 'image/svg+xml', '.webp': 'image/webp'}
+BOOK_TITLE = 'Документация QSP'
+
+class ParsedCorpus:
+    """
+    Результат единственного разбора: для каждой страницы (по имени выходного
+    файла chm) - очищенный фрагмент с метками ссылок (ChmPrepare.prepare_deferred),
+    разрешённые цели ссылок и заголовок; деревья содержания и указателя.
+    Цель ссылки - ('page', 'help_acts.htm', '#якорь'), ('anchor', None, '#якорь'),
+    ('image', 'x.png', ''), ('external', None, адрес) или ('missing_page' и 'missing_image',
+    исходное значение, адрес в вики) - внутренняя ссылка, которой нет в схеме.
+    """
+
+    def __init__(self, preparat:ChmPrepare, jobs:int = 1) -> None:
+        if preparat.sets['engine'] != 'fast':
+            raise ValueError('сборка нескольких форматов работает с движком fast')
+        self.preparat = preparat
+        self.pages:dict[str, dict] = {}
+        self.sources:dict[str, str] = {}
+        self.errors:dict[str, str] = {}
+        started = time.perf_counter()
+        files_pathes = sorted(preparat.files_pathes)
+        if jobs > 1 and len(files_pathes) > 1:
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(preparat.sets,)) as pool:
+                parsed = list(pool.map(_parse_worker, files_pathes, chunksize=max(1, len(files_pathes) // (jobs * 4))))
+        else:
+            parsed = [_parse_safe(preparat, f) for f in files_pathes]
+        for file_path, error, deferred in parsed:
+            if error:
+                self.errors[file_path] = error
+                continue
+            name = os.path.basename(preparat.output_path(file_path))
+            resolved = [self.resolve(scheme_type, value) for scheme_type, value in deferred['links']]
+            deferred['targets'] = [target for target, _, _ in resolved]
+            # ключи схемы, по которым разрешались ссылки, и ненайденные - для манифеста сборки
+            deferred['link_keys'] = sorted({(scheme_type, key) for (scheme_type, _), (_, key, _)
+                                            in zip(deferred['links'], resolved) if key is not None})
+            deferred['unresolved'] = sorted({key for _, key, found in resolved if key is not None and not found})
+            deferred['text_title'] = TITLE_SUFFIX_RE.sub('', html.unescape(re.sub(r'<[^>]+>', '', deferred['title'])))
+            self.pages[name] = deferred
+            self.sources[name] = file_path
+        self.parse_s = time.perf_counter() - started
+
+        self.toc_page, self.keywords_page = preparat.sets['hhc'], preparat.sets['hhk']
+        self.toc = self.toc_tree(self.toc_page)
+        self.keywords = self.toc_tree(self.keywords_page)
+        # порядок страниц в книге: по содержанию, затем остальные по имени
+        self.order = []
+        self._order_toc(self.toc)
+        self.order += sorted(name for name in self.pages if name not in self.order and name != self.toc_page)
+        self.start_page = os.path.basename(preparat.output_path(preparat.sets['start_file']))
+
+    def toc_tree(self, page:str) -> list:
+        """ Дерево содержания или указателя, построенное при разборе страницы """
+        return [TocNode.from_json(node) for node in self.pages[page]['toc']] if page in self.pages else []
+
+    def _order_toc(self, nodes:list) -> None:
+        for node in nodes:
+            target = self.toc_target(node)
+            if target and target[0] == 'page' and target[1] in self.pages and target[1] not in self.order:
+                self.order.append(target[1])
+            self._order_toc(node.children)
+
+    def toc_target(self, node:TocNode, page:str = None):
+        """ Цель ссылки пункта содержания (page - страница дерева, по умолчанию содержание) """
+        if node.link is None:
+            return None
+        return self.pages[page or self.toc_page]['targets'][node.link]
+
+    def resolve(self, scheme_type:str, value:str) -> tuple:
+        """ Цель ссылки по схеме, независимая от формата: (цель, ключ схемы или None, найдена ли) """
+        link_index = self.preparat.link_index
+        if scheme_type == 'pages':
+            href, key, found = link_index.resolve_link(value)
+            if key is None:
+                return (('anchor', None, href) if href.startswith('#') else ('external', None, href)), key, found
+            if not found:
+                return ('missing_page', value, str(urljoin(link_index.base_url, value))), key, found
+            target = link_index.pages[key]
+            return ('page', target, href[len(target):]), key, found
+        src, key, found = link_index.resolve_image(value)
+        if key is None:
+            return ('external', None, src), key, found
+        if not found:
+            return ('missing_image', value, key), key, found
+        return ('image', src, ''), key, found
+
+    def images(self) -> set:
+        """ Имена изображений, на которые ссылаются страницы """
+        return {target[1] for page in self.pages.values() for target in page['targets'] if target[0] == 'image'}
+
+def fragment(suffix:str) -> str:
+    """ Якорь из хвоста ссылки: query вне вики смысла не имеет """
+    return suffix[suffix.index('#'):] if '#' in suffix else ''
+
+class Backend:
+    """
+    Формат вывода. Наследник задаёт правило ссылок link() и запись write().
+    Страница - фрагмент ParsedCorpus с подставленными по этому правилу ссылками.
+    """
+
+    name = ''
+
+    def __init__(self, corpus:ParsedCorpus, out_path:str) -> None:
+        self.corpus = corpus
+        self.out_path = os.path.abspath(out_path)
+        # имя изображения в справке -> имя файла в выводе
+        self._image_names:dict[str, str] = {}
+
+    def link(self, page:str, target:tuple) -> str:
+        raise NotImplementedError
+
+    def page_body(self, page:str) -> str:
+        deferred = self.corpus.pages[page]
+        return fill_links(deferred['body'], [self.link(page, target) for target in deferred['targets']])
+
+    def toc_html(self, nodes:list, list_tag:str = 'ul', page:str = None) -> str:
+        """ Дерево содержания списком ссылок по правилу формата """
+        items = []
+        for node in nodes:
+            target = self.corpus.toc_target(node, page)
+            name = html.escape(node.name, quote=False)
+            item = f'<a href="{html.escape(self.link(page or self.corpus.toc_page, target))}">{name}</a>' \
+                if target else f'<span>{name}</span>'
+            if node.children:
+                item += self.toc_html(node.children, list_tag, page)
+            items.append(f'<li>{item}</li>')
+        return f'<{list_tag}>{"".join(items)}</{list_tag}>' if items else ''
+
+    def css(self) -> str:
+        """ default.css из папки chm, если он там есть """
+        path = os.path.join(self.corpus.preparat.out_html_folder, 'default.css')
+        return read_file(path) if os.path.isfile(path) else ''
+
+    def load_images(self) -> tuple:
+        """ Изображения страниц: (имя в справке -> функция чтения, ненайденные имена) """
+        preparat = self.corpus.preparat
+        sources, missing = preparat.image_sources(self.corpus.images())
+        # сжатие и конвертация - стадия chm, здесь изображения берутся как есть,
+        # поэтому и имена у них исходные
+        return {(preparat.image_name(src_name) if preparat.image_name else src_name): (src_name, read)
+                for src_name, read in sources.items()}, missing
+
+    def image_link(self, name:str) -> str:
+        return 'images/' + self._image_names.get(name, name)
+
+    def write(self) -> dict:
+        raise NotImplementedError
+
+class ChmBackend(Backend):
+    """
+    html_out для компилятора chm: ссылки те же, что подставляет ChmPrepare
+    (имена htm-файлов по LinkIndex), страницы - по шаблону CHM_PAGE,
+    содержание и указатель - в qsp.hhc и qsp.hhk; плюс манифест сборки
+    """
+
+    name = 'chm'
+
+    def link(self, page:str, target:tuple) -> str:
+        kind, name, value = target
+        if kind == 'page':
+            return name + value
+        if kind == 'image':
+            return name
+        if kind == 'missing_page':
+            # ненайденная в схеме страница остаётся такой, какой её оставляет LinkIndex
+            return self.corpus.preparat.link_index.resolve_link(name)[0]
+        if kind == 'missing_image':
+            return self.corpus.preparat.link_index.resolve_image(name)[0]
+        return value
+
+    def write(self) -> dict:
+        preparat = self.corpus.preparat
+        manifest = preparat.open_manifest()
+        for output_name in manifest.stale_outputs({os.path.basename(f) for f in self.corpus.sources.values()}):
+            output_path = os.path.join(preparat.out_html_folder, output_name)
+            if os.path.isfile(output_path): os.remove(output_path)
+        for file_path in self.corpus.errors:
+            manifest.forget(os.path.basename(file_path))
+        for name, file_path in self.corpus.sources.items():
+            deferred = self.corpus.pages[name]
+            output_path = preparat.output_path(file_path)
+            if 'toc' in deferred:
+                # дерево с подставленными адресами пишется в qsp.hhc или qsp.hhk
+                values = [self.link(name, target) for target in deferred['targets']]
+                output_path = preparat.finish_toc(deferred, output_path, values, time.perf_counter())['output']
+            else:
+                write_file(output_path, preparat.page_template.render(deferred['title'], self.page_body(name)))
+            manifest.update(os.path.basename(file_path), preparat.source_digest(file_path),
+                            os.path.basename(output_path), deferred['link_keys'], deferred['unresolved'])
+        manifest.save()
+        preparat.save_unresolved_report(manifest)
+        preparat.prepare_navigation()
+        return {'pages': len(self.corpus.sources)}
+
+SITE_PAGE = '''<!DOCTYPE html>
+<html lang="ru">
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+{title}
+<link type="text/css" href="default.css" rel="stylesheet" />
+<link type="text/css" href="site.css" rel="stylesheet" />
+</head>
+<body>
+<nav class="site-toc">{toc}</nav>
+<main class="site-page">
+{body}
+</main>
+</body>
+</html>'''
+
+SITE_CSS = '''body { display: flex; margin: 0; }
+.site-toc { flex: 0 0 18em; height: 100vh; overflow: auto; position: sticky; top: 0; padding: 1em; box-sizing: border-box; border-right: 1px solid #ccc; }
+.site-toc ul { padding-left: 1em; }
+.site-page { flex: 1; padding: 1em 2em; min-width: 0; }
+'''
+
+class SiteBackend(Backend):
+    """ Статический сайт: страницы .html с содержанием сбоку, изображения в images/ """
+
+    name = 'site'
+
+    def page_file(self, page:str) -> str:
+        return os.path.splitext(page)[0] + '.html'
+
+    def link(self, page:str, target:tuple) -> str:
+        kind, name, value = target
+        if kind == 'page':
+            # содержание - на каждой странице, ссылки на него ведут на стартовую
+            return 'index.html' if name == self.corpus.toc_page else self.page_file(name) + fragment(value)
+        if kind == 'image':
+            return self.image_link(name)
+        return value
+
+    def write(self) -> dict:
+        corpus = self.corpus
+        os.makedirs(os.path.join(self.out_path, 'images'), exist_ok=True)
+        images, missing = self.load_images()
+        self._image_names = {name: src_name for name, (src_name, read) in images.items()}
+        # содержание одно на все страницы: строится один раз
+        toc = self.toc_html(corpus.toc)
+        for page in corpus.order:
+            title = corpus.pages[page]['title']
+            write_file(os.path.join(self.out_path, self.page_file(page)),
+                       SITE_PAGE.format(title=title, toc=toc, body=self.page_body(page)))
+        if corpus.start_page in corpus.pages:
+            write_file(os.path.join(self.out_path, 'index.html'),
+                       SITE_PAGE.format(title=corpus.pages[corpus.start_page]['title'], toc=toc,
+                                        body=self.page_body(corpus.start_page)))
+        write_file(os.path.join(self.out_path, 'default.css'), self.css())
+        write_file(os.path.join(self.out_path, 'site.css'), SITE_CSS)
+        for src_name, read in images.values():
+            with open(os.path.join(self.out_path, 'images', src_name), 'wb') as fp:
+                fp.write(read())
+        return {'pages': len(corpus.order), 'images': len(images), 'missing_images': len(missing)}
+
+SINGLE_PAGE = '''<!DOCTYPE html>
+<html lang="ru">
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>{title}</title>
+<style>
+{css}
+</style>
+</head>
+<body>
+<nav class="single-toc" id="toc">{toc}</nav>
+{sections}
+</body>
+</html>'''
+
+class SinglePageBackend(Backend):
+    """
+    Одна страница без внешних файлов: разделы <section> по порядку содержания,
+    id и <a name> страниц получают префикс имени страницы, изображения встроены как data:.
+    """
+
+    name = 'single'
+
+    def __init__(self, corpus:ParsedCorpus, out_path:str) -> None:
+        super().__init__(corpus, out_path)
+        self._images:dict[str, str] = {}
+
+    @staticmethod
+    def prefix(page:str) -> str:
+        return os.path.splitext(page)[0]
+
+    def link(self, page:str, target:tuple) -> str:
+        kind, name, value = target
+        if kind == 'page' and name == self.corpus.toc_page:
+            return '#toc'
+        if kind == 'page':
+            anchor = fragment(value)
+            return f'#{self.prefix(name)}--{anchor[1:]}' if anchor else f'#p-{self.prefix(name)}'
+        if kind == 'anchor':
+            return f'#{self.prefix(page)}--{value[1:]}'
+        if kind == 'image':
+            return self._images.get(name, self.image_link(name))
+        return value
+
+    def page_body(self, page:str) -> str:
+        prefix = self.prefix(page)
+
+        def prefix_ids(match):
+            tag = match.group(0)
+            tag = ID_ATTR_RE.sub(lambda m: f'{m.group(1)}{prefix}--{m.group(2)}{m.group(3)}', tag)
+            if match.group(1).lower() == 'a':
+                tag = NAME_ATTR_RE.sub(lambda m: f'{m.group(1)}{prefix}--{m.group(2)}{m.group(3)}', tag)
+            return tag
+        return TAG_RE.sub(prefix_ids, super().page_body(page))
+
+    def write(self) -> dict:
+        corpus = self.corpus
+        images, missing = self.load_images()
+        for name, (src_name, read) in images.items():
+            media_type = MEDIA_TYPES.get(os.path.splitext(src_name)[1].lower(), 'application/octet-stream')
+            self._images[name] = f'data:{media_type};base64,{base64.b64encode(read()).decode("ascii")}'
+        sections = [f'<section id="p-{self.prefix(page)}">\n{self.page_body(page)}\n</section>' for page in corpus.order]
+        os.makedirs(os.path.dirname(self.out_path), exist_ok=True)
+        write_file(self.out_path, SINGLE_PAGE.format(title=BOOK_TITLE, css=self.css(), toc=self.toc_html(corpus.toc),
+                                                     sections='\n'.join(sections)))
+        return {'pages': len(corpus.order), 'images': len(images), 'missing_images': len(missing)}
+
+EPUB_CONTAINER = '''<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>'''
+
+EPUB_PAGE = '''<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" xml:lang="ru" lang="ru">
+<head>
+<meta charset="UTF-8"/>
+<title>{title}</title>
+<link type="text/css" href="default.css" rel="stylesheet"/>
+</head>
+<body>
+{body}
+</body>
+</html>'''
+
+EPUB_PACKAGE = '''<?xml version="1.0" encoding="UTF-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id" xml:lang="ru">
+<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+<dc:identifier id="book-id">{identifier}</dc:identifier>
+<dc:title>{title}</dc:title>
+<dc:language>ru</dc:language>
+<meta property="dcterms:modified">{modified}</meta>
+</metadata>
+<manifest>
+{manifest}
+</manifest>
+<spine>
+{spine}
+</spine>
+</package>'''
+
+class EpubBackend(Backend):
+    """ EPUB 3: страницы XHTML в порядке содержания, оглавление nav.xhtml из дерева содержания """
+
+    name = 'epub'
+
+    def page_file(self, page:str) -> str:
+        return os.path.splitext(page)[0] + '.xhtml'
+
+    def link(self, page:str, target:tuple) -> str:
+        kind, name, value = target
+        if kind == 'page':
+            return 'nav.xhtml' if name == self.corpus.toc_page else self.page_file(name) + fragment(value)
+        if kind == 'image':
+            return self.image_link(name)
+        return value
+
+    def page_body(self, page:str) -> str:
+        """ Фрагмент в синтаксисе XML: EPUB требует XHTML """
+        return etree.tostring(lxml.html.fromstring(super().page_body(page)), method='xml', encoding='unicode')
+
+    def nav_html(self, nodes:list) -> str:
+        items = []
+        for node in nodes:
+            target = self.corpus.toc_target(node)
+            name = html.escape(node.name, quote=False)
+            children = self.nav_html(node.children) if node.children else ''
+            if target:
+                items.append(f'<li><a href="{html.escape(self.link(self.corpus.toc_page, target))}">{name}</a>{children}</li>')
+            elif children:
+                items.append(f'<li><span>{name}</span>{children}</li>')
+        return f'<ol>{"".join(items)}</ol>' if items else ''
+
+    def write(self) -> dict:
+        corpus = self.corpus
+        images, missing = self.load_images()
+        self._image_names = {name: src_name for name, (src_name, read) in images.items()}
+        sources = dict(images.values())
+        manifest = ['<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>',
+                    '<item id="css" href="default.css" media-type="text/css"/>']
+        spine = []
+        for number, page in enumerate(corpus.order):
+            manifest.append(f'<item id="p{number}" href="{self.page_file(page)}" media-type="application/xhtml+xml"/>')
+            spine.append(f'<itemref idref="p{number}"/>')
+        for number, name in enumerate(sorted(sources)):
+            media_type = MEDIA_TYPES.get(os.path.splitext(name)[1].lower(), 'application/octet-stream')
+            manifest.append(f'<item id="i{number}" href="images/{html.escape(name)}" media-type="{media_type}"/>')
+        package = EPUB_PACKAGE.format(
+            identifier=f'urn:uuid:{uuid.uuid5(uuid.NAMESPACE_URL, canonicalize_url(corpus.preparat.base_url))}',
+            title=BOOK_TITLE, modified=time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            manifest='\n'.join(manifest), spine='\n'.join(spine))
+        nav = EPUB_PAGE.format(title='Содержание',
+                               body=f'<nav epub:type="toc" id="toc"><h1>Содержание</h1>{self.nav_html(corpus.toc)}</nav>')
+
+        os.makedirs(os.path.dirname(self.out_path), exist_ok=True)
+        part_path = self.out_path + '.part'
+        with zipfile.ZipFile(part_path, 'w', zipfile.ZIP_DEFLATED) as book:
+            # mimetype - первым и без сжатия
+            book.writestr(zipfile.ZipInfo('mimetype'), 'application/epub+zip', zipfile.ZIP_STORED)
+            book.writestr('META-INF/container.xml', EPUB_CONTAINER)
+            book.writestr('OEBPS/content.opf', package)
+            book.writestr('OEBPS/nav.xhtml', nav)
+            book.writestr('OEBPS/default.css', self.css())
+            for page in corpus.order:
+                book.writestr(f'OEBPS/{self.page_file(page)}',
+                              EPUB_PAGE.format(title=html.escape(corpus.pages[page]['text_title'], quote=False),
+                                               body=self.page_body(page)))
+            for name, read in sources.items():
+                book.writestr(f'OEBPS/images/{name}', read(), zipfile.ZIP_STORED)
+        os.replace(part_path, self.out_path)
+        return {'pages': len(corpus.order), 'images': len(images), 'missing_images': len(missing)}
+
+BACKENDS = {backend.name: backend for backend in (ChmBackend, SiteBackend, SinglePageBackend, EpubBackend)}
+
+def build_targets(preparat:ChmPrepare, outputs:dict, jobs:int = 1) -> dict:
+    """
+    Один разбор и запись всех форматов. outputs - формат -> путь вывода
+    (у chm - out_html_folder настроек). Возвращает сведения и время по форматам.
+    """
+    corpus = ParsedCorpus(preparat, jobs)
+    report = {'parse': {'pages': len(corpus.pages), 'errors': len(corpus.errors), 'seconds': round(corpus.parse_s, 3)}}
+    for name, out_path in outputs.items():
+        started = time.perf_counter()
+        stats = BACKENDS[name](corpus, out_path).write()
+        report[name] = {**stats, 'seconds': round(time.perf_counter() - started, 3)}
+    preparat.errors = dict(corpus.errors)
+    return report
+
+def _init_worker(settings:dict) -> None:
+    global _worker_preparat
+    _worker_preparat = ChmPrepare(settings)
+
+def _parse_worker(file_path:str):
+    return _parse_safe(_worker_preparat, file_path)
+
+def _parse_safe(preparat:ChmPrepare, file_path:str):
+    """ Разбор и очистка страницы: (путь, текст ошибки или None, фрагмент) """
+    try:
+        return file_path, None, preparat.prepare_deferred(preparat.read_source(file_path),
+                                                          toc=preparat.is_toc(file_path))
+    except Exception:
+        return file_path, traceback.format_exc(), None
+
+def parse_args(argv=None):
+    """ Разбор аргументов командной строки """
+    parser = argparse.ArgumentParser(description='Сборка справки QSP в несколько форматов за один разбор')
+    parser.add_argument('--targets', nargs='+', choices=list(BACKENDS), default=list(BACKENDS))
+    parser.add_argument('--site-out', default=os.path.join('..', 'html_site'))
+    parser.add_argument('--single-out', default=os.path.join('..', 'qsp_help.html'))
+    parser.add_argument('--epub-out', default=os.path.join('..', 'qsp_help.epub'))
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='число процессов разбора страниц')
+    parser.add_argument('--corpus', metavar='FILE',
+                        help='собирать из корпуса SQLite загрузчика')
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    preparat = ChmPrepare({'corpus': args.corpus})
+    paths = {'chm': preparat.out_html_folder, 'site': args.site_out, 'single': args.single_out, 'epub': args.epub_out}
+    report = build_targets(preparat, {name: paths[name] for name in args.targets}, args.jobs)
+    print(json.dumps(report, ensure_ascii=False, indent=4))
+    if preparat.errors:
+        print(f'Не удалось разобрать файлов: {len(preparat.errors)}')
+        for file_path, error in preparat.errors.items():
+            print(f'--- {file_path}')
+            print(error)
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
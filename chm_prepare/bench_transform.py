@@ -0,0 +1,74 @@
+"""
+Сравнение движков преобразования страниц ChmPrepare:
+время на страницу и пиковая память (tracemalloc) для full и fast.
+"""
+
+import os, sys
+import time
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+
+from to_chm_prepare import ChmPrepare
+
+ENGINES = ('full', 'fast')
+
+def bench_engine(settings:dict, engine:str, repeat:int) -> dict:
+    """ Замеры одного движка: время - отдельно от памяти, чтобы tracemalloc не искажал его """
+    preparat = ChmPrepare(dict(settings, engine=engine, incremental=False))
+    files = sorted(preparat.files_pathes)
+
+    times = {f: [] for f in files}
+    for _ in range(repeat):
+        for f in files:
+            started = time.perf_counter()
+            preparat.prepare_htm(f)
+            times[f].append(time.perf_counter() - started)
+
+    peaks = {}
+    for f in files:
+        tracemalloc.start()
+        preparat.prepare_htm(f)
+        peaks[f] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    per_page = [min(t) for t in times.values()]
+    return {
+        'engine': engine,
+        'pages': len(files),
+        'total_s': sum(per_page),
+        'mean_ms': statistics.mean(per_page) * 1000,
+        'median_ms': statistics.median(per_page) * 1000,
+        'max_ms': max(per_page) * 1000,
+        'mean_peak_kb': statistics.mean(peaks.values()) / 1024,
+        'max_peak_kb': max(peaks.values()) / 1024,
+    }
+
+def main():
+    workdir = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    parser = argparse.ArgumentParser(description='Бенчмарк движков преобразования страниц')
+    parser.add_argument('--src', default=os.path.join(workdir, 'html_src'))
+    parser.add_argument('--repeat', type=int, default=3, help='повторов замера времени')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        settings = {
+            'src_html_folder': args.src,
+            'out_html_folder': out_dir,
+            'scheme': os.path.join(args.src, 'urls_links_to_files.json'),
+        }
+        results = [bench_engine(settings, engine, args.repeat) for engine in ENGINES]
+
+    print(f"{'движок':<8}{'страниц':>9}{'всего, с':>10}{'сред., мс':>11}{'медиана, мс':>13}"
+          f"{'макс., мс':>11}{'пик сред., КБ':>15}{'пик макс., КБ':>15}")
+    for r in results:
+        print(f"{r['engine']:<8}{r['pages']:>9}{r['total_s']:>10.3f}{r['mean_ms']:>11.2f}"
+              f"{r['median_ms']:>13.2f}{r['max_ms']:>11.2f}{r['mean_peak_kb']:>15.0f}{r['max_peak_kb']:>15.0f}")
+
+    full, fast = results
+    print(f"\nУскорение fast относительно full: {full['total_s'] / fast['total_s']:.2f}x, "
+          f"пиковая память: {full['max_peak_kb'] / fast['max_peak_kb']:.2f}x меньше")
+
+if __name__ == "__main__":
+    sys.exit(main())
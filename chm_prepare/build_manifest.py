@@ -0,0 +1,115 @@
+""" Манифест инкрементальной сборки html_out """
+
+import os, json
+import hashlib
+
+def file_digest(path:str) -> str:
+    """ Хэш содержимого файла """
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(64 * 1024), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def text_digest(*parts:str) -> str:
+    """ Хэш набора строк """
+    hasher = hashlib.sha256()
+    for part in parts:
+        hasher.update(part.encode('utf-8'))
+        hasher.update(b'\0')
+    return hasher.hexdigest()
+
+def links_digest(resolve, link_keys:list) -> str:
+    """
+    Хэш разрешения исходящих ссылок страницы по схеме.
+    resolve(раздел схемы, url) - текущее разрешение ссылки,
+    link_keys - пары (раздел схемы, url), которые страница искала в схеме.
+    """
+    resolved = [[scheme_type, key, resolve(scheme_type, key)]
+                for scheme_type, key in sorted(link_keys)]
+    return text_digest(json.dumps(resolved, ensure_ascii=False))
+
+class BuildManifest:
+    """
+    Манифест сборки: хэши исходников, схемы и кода преобразования.
+    По нему определяется, какие выходные файлы нужно пересобрать.
+    """
+
+    def __init__(self, path:str, transform_hash:str, scheme_hash:str, resolve) -> None:
+        self.path = path
+        self.transform_hash = transform_hash
+        self.scheme_hash = scheme_hash
+        self.resolve = resolve
+
+        data = self._load()
+        # смена кода преобразования, шаблонов или настроек делает недействительным всё;
+        # записи остаются, чтобы выходные файлы удалённых исходников всё равно убирались
+        if data.get('transform') != transform_hash:
+            data['pages'] = {src_name: {**entry, 'source': None}
+                             for src_name, entry in data.get('pages', {}).items()}
+        self.old_scheme_hash = data.get('scheme')
+        self.pages:dict[str, dict] = data.get('pages', {})
+
+    def _load(self) -> dict:
+        if not os.path.isfile(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as fp:
+                return json.load(fp)
+        except ValueError:
+            return {}
+
+    def is_up_to_date(self, src_name:str, src_hash:str, output_path:str) -> bool:
+        """ Актуален ли выходной файл для исходника """
+        entry = self.pages.get(src_name)
+        if entry is None or entry['source'] != src_hash:
+            return False
+        if not os.path.isfile(output_path):
+            return False
+        if self.old_scheme_hash != self.scheme_hash:
+            # схема изменилась: пересобираем, только если изменились
+            # адреса, на которые ссылается сама страница
+            return entry['links'] == links_digest(self.resolve, entry['link_keys'])
+        return True
+
+    def update(self, src_name:str, src_hash:str, output_name:str, link_keys:list,
+               unresolved:list = ()) -> None:
+        """ Запоминает собранную страницу и её неразрешённые внутренние ссылки """
+        link_keys = sorted([scheme_type, key] for scheme_type, key in link_keys)
+        self.pages[src_name] = {
+            'source': src_hash,
+            'output': output_name,
+            'link_keys': link_keys,
+            'links': links_digest(self.resolve, link_keys),
+            'unresolved': sorted(unresolved)
+        }
+
+    def unresolved_links(self) -> dict:
+        """ Неразрешённые внутренние ссылки всей сборки: url -> страницы """
+        report = {}
+        for src_name, entry in sorted(self.pages.items()):
+            for url in entry.get('unresolved', ()):
+                report.setdefault(url, []).append(entry['output'])
+        return dict(sorted(report.items()))
+
+    def forget(self, src_name:str) -> None:
+        self.pages.pop(src_name, None)
+
+    def stale_outputs(self, src_names:set) -> list:
+        """ Выходные файлы, исходники которых удалены; убираются из манифеста """
+        stale = []
+        for src_name in list(self.pages):
+            if src_name not in src_names:
+                stale.append(self.pages.pop(src_name)['output'])
+        return stale
+
+    def save(self) -> None:
+        """ Атомарно сохраняет манифест """
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fp:
+            json.dump({
+                'transform': self.transform_hash,
+                'scheme': self.scheme_hash,
+                'pages': self.pages
+            }, fp, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Обход вики и подготовка страниц в одном процессе.
+Каждая загруженная страница сразу проходит преобразование ChmPrepare:
+без повторного чтения html_src с диска, а разбирается только фрагмент
+div.page.group, границы которого нашёл потоковый разбор обхода.
+Ссылки, цели которых ещё не скачаны, подставляются в конце обхода
+быстрым проходом по готовому тексту страниц.
+"""
+
+import os, sys
+import time
+import hashlib
+import argparse
+import traceback
+
+# модули загрузчика вики: путь к ним добавляется до импорта подготовки и обхода
+DOWNLOADER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'qsp_wiki_downloader')
+if DOWNLOADER_DIR not in sys.path:
+    sys.path.insert(0, DOWNLOADER_DIR)
+
+from to_chm_prepare import ChmPrepare, transform_hash
+from build_manifest import BuildManifest, file_digest
+from link_index import LinkIndex
+from search_index import SearchIndex
+# модули загрузчика
+from qsp_wiki_downloader import WikiDownloader
+from link_extractor import extract_stream_content
+from corpus_store import CorpusStore
+
+class CrawlPipeline:
+    """ Конвейер: обход WikiDownloader -> подготовка ChmPrepare """
+
+    def __init__(self, downloader:WikiDownloader, settings:dict = None) -> None:
+        self.downloader = downloader
+        self.preparat = ChmPrepare({'src_html_folder': downloader.output_dir, **(settings or {})},
+                                   scheme={'images': {}, 'pages': {}})
+        # разбор обхода заодно находит область содержимого страницы
+        downloader.extract_page_links = extract_stream_content
+        downloader.on_page = self._on_page
+        # таблица ссылок пополняется по мере сохранения файлов
+        downloader.on_stored = self.preparat.link_index.add
+
+        # путь к исходнику -> (подготовленная страница с метками, хэш исходника)
+        self.pending:dict[str, tuple] = {}
+        # путь к исходнику -> (хэш исходника, сведения о результате)
+        self.done:dict[str, tuple] = {}
+        self.stats = {'immediate': 0, 'deferred': 0, 'from_source': 0}
+
+    def _on_page(self, url:str, html:str, parsed:tuple) -> None:
+        """ Страница сохранена обходом: готовим её, пока идёт загрузка следующих """
+        file_path = self.downloader.urls_link_file['pages'][url]
+        preparat = self.preparat
+        data = html.encode('utf-8')
+        span = parsed[2] if len(parsed) > 2 else None
+        try:
+            deferred = preparat.prepare_deferred(html, html[span[0]:span[1]] if span else None,
+                                                 toc=preparat.is_toc(file_path))
+            # если все цели ссылок уже известны, страница записывается сразу
+            info = preparat.finish_deferred(deferred, preparat.output_path(file_path), partial=True)
+        except Exception:
+            preparat.errors[file_path] = traceback.format_exc()
+            return
+        preparat.errors.pop(file_path, None)
+        preparat.metrics.count('bytes_read', len(data))
+        src_hash = hashlib.sha256(data).hexdigest()
+        self.pending.pop(file_path, None)
+        self.done.pop(file_path, None)
+        if info is None:
+            self.pending[file_path] = (deferred, src_hash)
+        else:
+            self.done[file_path] = (src_hash, info)
+
+    def run(self) -> dict:
+        """ Обход и сборка; возвращает словарь ошибок подготовки """
+        self.downloader.download_wiki()
+        return self.finish()
+
+    def finish(self) -> dict:
+        """
+        Сохраняет схему обхода, подставляет отложенные ссылки, готовит
+        страницы, которых не было в памяти (сохранены до --resume),
+        и пишет qsp.hhc, qsp.hhk и qsp.hhp. Манифест сборки совместим с to_chm_prepare.py.
+        """
+        started = time.perf_counter()
+        downloader, preparat = self.downloader, self.preparat
+        downloader.save_urls_link_files()
+        scheme = downloader.urls_link_file
+        preparat.link_index = LinkIndex(scheme, preparat.base_url, preparat.image_name)
+        if downloader.corpus is not None:
+            preparat.corpus = CorpusStore(downloader.corpus.final_path, root=preparat.src_html_folder,
+                                          readonly=True)
+            scheme_digest = preparat.link_digest(preparat.corpus.scheme_digest())
+        else:
+            scheme_digest = preparat.link_digest(file_digest(os.path.join(downloader.output_dir, 'urls_links_to_files.json')))
+        manifest = BuildManifest(
+            os.path.join(preparat.out_html_folder, '.build_manifest.json'),
+            transform_hash(preparat.sets), scheme_digest, preparat.link_index.lookup
+        )
+
+        if preparat.sets['search_index']:
+            preparat.search = SearchIndex(os.path.join(preparat.out_html_folder, '.search_pages.json'))
+
+        self.stats['immediate'] = len(self.done)
+        self.stats['deferred'] = len(self.pending)
+        for file_path, (deferred, src_hash) in self.pending.items():
+            self.done[file_path] = (src_hash, preparat.finish_deferred(deferred, preparat.output_path(file_path)))
+        self.pending = {}
+
+        for file_path in scheme['pages'].values():
+            if file_path in self.done or file_path in preparat.errors:
+                continue
+            try:
+                info = preparat.prepare_htm(file_path)
+            except Exception:
+                preparat.errors[file_path] = traceback.format_exc()
+                continue
+            preparat.metrics.count('bytes_read', info['bytes_read'])
+            self.done[file_path] = (preparat.source_digest(file_path), info)
+            self.stats['from_source'] += 1
+
+        for output_name in manifest.stale_outputs({os.path.basename(f) for f in scheme['pages'].values()}):
+            output_path = os.path.join(preparat.out_html_folder, output_name)
+            if os.path.isfile(output_path): os.remove(output_path)
+        for file_path in preparat.errors:
+            manifest.forget(os.path.basename(file_path))
+        for file_path, (src_hash, info) in self.done.items():
+            src_name = os.path.basename(file_path)
+            manifest.update(src_name, src_hash, os.path.basename(info['output']),
+                            info['link_keys'], info['unresolved'])
+            preparat.metrics.record_file(src_name, info['timings'])
+            preparat.metrics.count('bytes_written', info['bytes_written'])
+            if preparat.search is not None:
+                preparat.search.update(os.path.basename(info['output']), src_hash, info['search'])
+        manifest.save()
+        preparat.save_unresolved_report(manifest)
+        if preparat.search is not None:
+            preparat.save_search_index(list(scheme['pages'].values()))
+        preparat.build_stats['built'] = len(self.done)
+
+        preparat.prepare_navigation()
+        preparat.metrics.wall_s += time.perf_counter() - started
+        return preparat.errors
+
+def parse_args(argv=None):
+    """ Разбор аргументов командной строки """
+    parser = argparse.ArgumentParser(description='Обход wiki.qsp.org с подготовкой страниц к сборке chm')
+    parser.add_argument('--base-url', default='https://wiki.qsp.org')
+    parser.add_argument('--src', default=os.path.join('..', 'html_src'),
+                        help='папка выгрузки (исходные страницы, журнал, кэш)')
+    parser.add_argument('--out', default=os.path.join('..', 'html_out'),
+                        help='папка подготовленных страниц')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='потоков загрузки: страницы готовятся, пока идёт загрузка следующих')
+    parser.add_argument('--per-host', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=4.0,
+                        help='максимум запросов в секунду к хосту (0 - без ограничения)')
+    parser.add_argument('--resume', action='store_true',
+                        help='продолжить прерванный обход')
+    parser.add_argument('--offline', action='store_true',
+                        help='собрать из кэша без обращения к сети')
+    parser.add_argument('--corpus', metavar='FILE',
+                        help='сохранить выгрузку в корпус SQLite')
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='метрики обхода (.json или .csv)')
+    parser.add_argument('--prepare-metrics', metavar='FILE',
+                        help='метрики подготовки страниц (.json или .csv)')
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    downloader = WikiDownloader(base_url=args.base_url, output_dir=args.src, workers=args.workers,
+                                per_host_limit=args.per_host, rate=args.rate, resume=args.resume,
+                                offline=args.offline, corpus=args.corpus)
+    pipeline = CrawlPipeline(downloader, {'out_html_folder': args.out})
+    try:
+        errors = pipeline.run()
+    except KeyboardInterrupt:
+        downloader.save_checkpoint()
+        print('\nОбход прерван. Для продолжения запустите скрипт с ключом --resume')
+        raise SystemExit(1)
+
+    stats = downloader.get_download_stats()
+    print(f"Скачано страниц: {stats['downloaded_urls']}, изображений: {stats['downloaded_images']}, "
+          f"ошибок: {stats['failed_urls'] + stats['failed_images']}")
+    print(f"Подготовлено сразу: {pipeline.stats['immediate']}, после обхода: {pipeline.stats['deferred']}, "
+          f"из html_src: {pipeline.stats['from_source']}")
+    if pipeline.preparat.unresolved_links:
+        print(f'Неразрешённых внутренних ссылок: {len(pipeline.preparat.unresolved_links)} (см. unresolved_links.json)')
+    if args.metrics:
+        downloader.metrics.save(args.metrics)
+    if args.prepare_metrics:
+        pipeline.preparat.metrics.save(args.prepare_metrics)
+
+    if errors:
+        print(f'Не удалось подготовить файлов: {len(errors)}')
+        for file_path, error in errors.items():
+            print(f'--- {file_path}')
+            print(error)
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
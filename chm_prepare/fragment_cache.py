@@ -0,0 +1,72 @@
+""" Дисковый кэш очищенных фрагментов страниц для повторных сборок """
+
+import os, json
+
+from build_manifest import text_digest
+
+class FragmentCache:
+    """
+    Кэш результата дорогой части подготовки страницы: разбора, очистки
+    и извлечения ссылок (см. ChmPrepare.prepare_deferred).
+    Запись - файл <ключ>.json в folder, ключ - хэш исходника и версии очистки.
+    Время последнего обращения - mtime файла, по нему при превышении
+    max_bytes или max_entries удаляются давно не использованные записи (LRU).
+    Записи пишутся через временный файл, поэтому кэш можно делить между процессами.
+    """
+
+    def __init__(self, folder:str, version:str, max_bytes:int = None, max_entries:int = None) -> None:
+        self.folder = folder
+        self.version = version
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        os.makedirs(folder, exist_ok=True)
+
+    def path(self, src_hash:str) -> str:
+        return os.path.join(self.folder, text_digest(src_hash, self.version) + '.json')
+
+    def get(self, src_hash:str):
+        """ Запись для исходника или None """
+        path = self.path(src_hash)
+        try:
+            with open(path, 'r', encoding='utf-8') as fp:
+                record = json.load(fp)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            # запись могла удалить очистка в другом процессе: она уже прочитана
+            pass
+        return record
+
+    def put(self, src_hash:str, record:dict) -> None:
+        path = self.path(src_hash)
+        part_path = f'{path}.{os.getpid()}.part'
+        with open(part_path, 'w', encoding='utf-8') as fp:
+            json.dump(record, fp, ensure_ascii=False, separators=(',', ':'))
+        os.replace(part_path, path)
+
+    def evict(self) -> dict:
+        """ Удаляет давно не использованные записи сверх лимитов; возвращает состояние кэша """
+        entries = []
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if name.endswith('.part'):
+                # недописанная запись прерванного процесса
+                os.remove(path)
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size, path))
+        entries.sort()
+        total = sum(entry[2] for entry in entries)
+        evicted = 0
+        while entries and ((self.max_bytes is not None and total > self.max_bytes)
+                           or (self.max_entries is not None and len(entries) > self.max_entries)):
+            _, _, size, path = entries.pop(0)
+            os.remove(path)
+            total -= size
+            evicted += 1
+        return {'entries': len(entries), 'bytes': total, 'evicted': evicted}
@@ -0,0 +1,172 @@
+"""
+Оптимизация изображений справки: PNG пережимаются без потерь, WEBP
+(его плохо показывают просмотрщики CHM) переводится в PNG, слишком широкие
+скриншоты по желанию уменьшаются. Нужен Pillow; результаты кэшируются
+по хэшу исходного файла и параметров.
+"""
+
+import os, json
+import hashlib
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+try:
+    from PIL import Image
+except ImportError:
+    # Pillow - необязательная зависимость: без него оптимизация недоступна
+    Image = None
+
+# версия алгоритма: при её смене кэш становится недействительным
+OPTIMIZER_VERSION = 1
+# форматы, которые переводятся в другие при сборке
+CONVERT_EXT = {'.webp': '.png'}
+PIL_FORMATS = {'.png': 'PNG', '.jpg': 'JPEG', '.jpeg': 'JPEG', '.gif': 'GIF'}
+
+def available() -> bool:
+    return Image is not None
+
+def output_image_name(name:str) -> str:
+    """ Имя изображения в справке: WEBP -> PNG, остальные как есть """
+    stem, ext = os.path.splitext(name)
+    return stem + CONVERT_EXT[ext.lower()] if ext.lower() in CONVERT_EXT else name
+
+def _to_palette(img):
+    """ RGB с не более чем 256 цветами -> палитра, если это без потерь """
+    if img.mode != 'RGB' or img.getcolors(256) is None:
+        return img
+    paletted = img.convert('P', palette=Image.ADAPTIVE, colors=256)
+    return paletted if paletted.convert('RGB').tobytes() == img.tobytes() else img
+
+def optimize_bytes(data:bytes, name:str, max_width:int = None, jpeg_quality:int = 85) -> bytes:
+    """
+    Оптимизированное содержимое изображения в формате output_image_name(name).
+    JPEG и GIF пережимаются только при уменьшении (иначе это потери без пользы).
+    Если результат не меньше исходника того же формата, возвращается исходник.
+    """
+    out_ext = os.path.splitext(output_image_name(name))[1].lower()
+    out_format = PIL_FORMATS.get(out_ext)
+    if out_format is None:
+        return data
+    with Image.open(BytesIO(data)) as img:
+        same_format = img.format == out_format
+        # анимацию не трогаем, у WEBP берётся первый кадр
+        if same_format and getattr(img, 'n_frames', 1) > 1:
+            return data
+        img.load()
+        resized = bool(max_width) and img.width > max_width
+        if resized:
+            img = img.resize((max_width, max(1, round(img.height * max_width / img.width))), Image.LANCZOS)
+        elif same_format and out_format != 'PNG':
+            return data
+
+        buffer = BytesIO()
+        if out_format == 'PNG':
+            if img.mode not in ('1', 'L', 'LA', 'P', 'RGB', 'RGBA'):
+                img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+            _to_palette(img).save(buffer, 'PNG', optimize=True)
+        elif out_format == 'JPEG':
+            img.convert('RGB').save(buffer, 'JPEG', quality=jpeg_quality, optimize=True)
+        else:
+            img.save(buffer, out_format)
+    result = buffer.getvalue()
+    if same_format and not resized and len(result) >= len(data):
+        return data
+    return result
+
+def _optimize_job(args):
+    """ Задача пула: (имя, содержимое, параметры) -> (имя, результат или None, ошибка) """
+    name, data, options = args
+    try:
+        return name, optimize_bytes(data, name, **options), None
+    except Exception as e:
+        return name, None, f'{type(e).__name__}: {e}'
+
+class ImageOptimizer:
+    """
+    Этап изображений сборки: берёт исходные изображения, оптимизирует их
+    в пуле процессов и записывает в папку справки.
+    Результат кэшируется в cache_dir под ключом из хэша исходника и параметров,
+    поэтому неизменившиеся изображения повторно не обрабатываются.
+    """
+
+    def __init__(self, cache_dir:str, jobs:int = 1, max_width:int = None, jpeg_quality:int = 85) -> None:
+        if Image is None:
+            raise RuntimeError('для оптимизации изображений нужен Pillow: pip install pillow')
+        self.cache_dir = cache_dir
+        self.jobs = max(1, jobs)
+        self.options = {'max_width': max_width, 'jpeg_quality': jpeg_quality}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def cache_key(self, data:bytes) -> str:
+        hasher = hashlib.sha256(data)
+        hasher.update(json.dumps([OPTIMIZER_VERSION, self.options], sort_keys=True).encode('utf-8'))
+        return hasher.hexdigest()
+
+    def run(self, sources:dict, out_dir:str) -> dict:
+        """
+        sources - имя исходного изображения -> функция, возвращающая его содержимое.
+        Результаты пишутся в out_dir под именами output_image_name сразу по готовности,
+        в памяти одновременно только изображения, которые сейчас обрабатываются.
+        Возвращает отчёт: число изображений, обработано, из кэша, байты до и после, ошибки.
+        """
+        report = {'images': len(sources), 'processed': 0, 'cached': 0, 'converted': [],
+                  'bytes_in': 0, 'bytes_out': 0, 'errors': {}}
+        pool = ProcessPoolExecutor(max_workers=self.jobs) if self.jobs > 1 and len(sources) > 1 else None
+        pending = {}
+        try:
+            for name in sorted(sources):
+                data = sources[name]()
+                report['bytes_in'] += len(data)
+                cache_path = os.path.join(self.cache_dir, self.cache_key(data)
+                                          + os.path.splitext(output_image_name(name))[1].lower())
+                if os.path.isfile(cache_path):
+                    with open(cache_path, 'rb') as fp:
+                        self._write_output(fp.read(), name, out_dir, report)
+                    report['cached'] += 1
+                elif pool is None:
+                    self._finish_job(_optimize_job((name, data, self.options)), cache_path, sources, out_dir, report)
+                else:
+                    # в работе не больше двух изображений на процесс
+                    if len(pending) >= self.jobs * 2:
+                        self._finish_done(pending, sources, out_dir, report)
+                    pending[pool.submit(_optimize_job, (name, data, self.options))] = cache_path
+            while pending:
+                self._finish_done(pending, sources, out_dir, report)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        report['converted'].sort()
+        report['bytes_saved'] = report['bytes_in'] - report['bytes_out']
+        return report
+
+    def _finish_done(self, pending:dict, sources:dict, out_dir:str, report:dict) -> None:
+        """ Дожидается хотя бы одной задачи пула и записывает готовые результаты """
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            self._finish_job(future.result(), pending.pop(future), sources, out_dir, report)
+
+    def _finish_job(self, result:tuple, cache_path:str, sources:dict, out_dir:str, report:dict) -> None:
+        name, optimized, error = result
+        if error:
+            # изображение, которое Pillow не разобрал, копируется как есть
+            report['errors'][name] = error
+            optimized = sources[name]()
+        else:
+            with open(cache_path, 'wb') as fp:
+                fp.write(optimized)
+            report['processed'] += 1
+        self._write_output(optimized, name, out_dir, report)
+
+    def _write_output(self, data:bytes, name:str, out_dir:str, report:dict) -> None:
+        """ Записывает изображение в out_dir, если там нет такого же """
+        out_name = output_image_name(name)
+        if out_name != name:
+            report['converted'].append(name)
+        out_path = os.path.join(out_dir, out_name)
+        report['bytes_out'] += len(data)
+        if os.path.isfile(out_path) and os.path.getsize(out_path) == len(data):
+            with open(out_path, 'rb') as fp:
+                if fp.read() == data:
+                    return
+        with open(out_path, 'wb') as fp:
+            fp.write(data)
@@ -0,0 +1,95 @@
+""" Предварительно разрешённые ссылки схемы сборки """
+
+import os
+from urllib.parse import urljoin
+
+# канонизация url общая с загрузчиком вики (путь к нему добавляют to_chm_prepare и crawl_pipeline)
+from crawl_frontier import canonicalize_url
+
+# служебные адреса DokuWiki для изображений (страница просмотра, выдача файла):
+# это не страницы вики, в схему они не попадают и битыми ссылками не считаются
+MEDIA_ENDPOINTS = ('/_detail/', '/_media/', '/lib/exe/fetch.php', '/lib/exe/detail.php')
+
+def output_name(path:str, ext:str = None) -> str:
+    """ Имя выходного файла по пути из схемы (пути в схеме могут быть виндовыми) """
+    name = path.replace('\\', '/').rsplit('/', 1)[-1]
+    if ext:
+        name = os.path.splitext(name)[0] + ext
+    return name
+
+class LinkIndex:
+    """
+    Таблица, построенная один раз при запуске:
+    канонический абсолютный url -> имя выходного файла.
+    Переписывание ссылки или изображения - одно обращение к словарю.
+    """
+
+    def __init__(self, scheme:dict, base_url:str, image_name=None) -> None:
+        """ image_name - переименование изображений при сборке (например, WEBP -> PNG) """
+        self.base_url = base_url
+        self.image_name = image_name
+        self.pages:dict[str, str] = {
+            canonicalize_url(url): output_name(path, '.htm')
+            for url, path in scheme.get('pages', {}).items()
+        }
+        # у изображений query (размер, токен) - часть адреса, поэтому url как есть
+        self.images:dict[str, str] = {
+            url: self._image_file(path)
+            for url, path in scheme.get('images', {}).items()
+        }
+
+    def add(self, scheme_type:str, url:str, path:str) -> None:
+        """ Пополнение таблицы по ходу обхода """
+        if scheme_type == 'pages':
+            self.pages[canonicalize_url(url)] = output_name(path, '.htm')
+        else:
+            self.images[url] = self._image_file(path)
+
+    def _image_file(self, path:str) -> str:
+        name = output_name(path)
+        return self.image_name(name) if self.image_name else name
+
+    def is_internal(self, url:str) -> bool:
+        return url.startswith(self.base_url)
+
+    def is_media_endpoint(self, url:str) -> bool:
+        """ Ссылка на просмотр или выдачу изображения, а не на страницу вики """
+        return url[len(self.base_url.rstrip('/')):].startswith(MEDIA_ENDPOINTS)
+
+    def resolve_link(self, href:str):
+        """
+        Разрешение ссылки <a href>.
+        Возвращает (новый href, ключ схемы или None для внешних ссылок, найдена ли цель).
+        Ссылки на изображения вики (MEDIA_ENDPOINTS) остаются абсолютными, как внешние.
+        """
+        if href.startswith('#'):
+            # якорь на той же странице
+            return href, None, True
+        url = str(urljoin(self.base_url, href))
+        if not self.is_internal(url) or self.is_media_endpoint(url):
+            return url, None, True
+
+        address, hash_sep, fragment = url.partition('#')
+        address, query_sep, query = address.partition('?')
+        key = canonicalize_url(address)
+        target = self.pages.get(key)
+        if target is None:
+            return url.replace('.html', '.htm'), key, False
+        return f'{target}{query_sep}{query}{hash_sep}{fragment}', key, True
+
+    def resolve_image(self, src:str):
+        """
+        Разрешение <img src>.
+        Возвращает (новый src, ключ схемы или None для внешних изображений, найден ли файл).
+        """
+        url = str(urljoin(self.base_url, src))
+        if not self.is_internal(url):
+            return src, None, True
+        target = self.images.get(url)
+        if target is None:
+            return src, url, False
+        return target, url, True
+
+    def lookup(self, scheme_type:str, key:str):
+        """ Разрешённое имя файла для ключа схемы или None """
+        return (self.pages if scheme_type == 'pages' else self.images).get(key)
@@ -0,0 +1,96 @@
+""" Граф ссылок справки и достижимость страниц от корней (стартовая страница, содержание, указатель) """
+
+import os, json
+from collections import deque
+
+from link_index import LinkIndex
+# потоковый разбор общий с загрузчиком (путь к нему добавляет to_chm_prepare)
+from link_extractor import ContentLinkParser
+
+def content_links(html:str):
+    """ (href ссылок, src изображений) области содержимого div.page.group """
+    parser = ContentLinkParser(html)
+    parser.feed(html)
+    parser.close()
+    return parser.content_hrefs, parser.content_srcs
+
+class LinkGraph:
+    """
+    Граф: страница -> страницы и изображения, на которые она ссылается.
+    Учитываются только ссылки области содержимого: они и попадают в справку,
+    а навигация DokuWiki (меню, шапка) отбрасывается при подготовке.
+    Вершины - имена выходных файлов (help_acts.htm, 0a1b2c.png).
+    Рёбра кэшируются в cache_path по хэшу исходника и схемы, поэтому
+    при повторной сборке разбираются только изменившиеся страницы.
+    """
+
+    def __init__(self, link_index:LinkIndex, cache_path:str = None, scheme_hash:str = None) -> None:
+        self.link_index = link_index
+        self.cache_path = cache_path
+        self.scheme_hash = scheme_hash
+        self.pages:dict[str, set] = {}
+        self.images:dict[str, set] = {}
+        self.sources:dict[str, str] = {}
+        self.parsed = 0
+        self._cache = self._load()
+
+    def _load(self) -> dict:
+        if not self.cache_path or not os.path.isfile(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as fp:
+                data = json.load(fp)
+        except ValueError:
+            return {}
+        # рёбра зависят от схемы: при её смене цели ссылок могли измениться
+        return data.get('pages', {}) if data.get('scheme') == self.scheme_hash else {}
+
+    def save(self) -> None:
+        if not self.cache_path:
+            return
+        with open(self.cache_path, 'w', encoding='utf-8') as fp:
+            json.dump({
+                'scheme': self.scheme_hash,
+                'pages': {
+                    name: {'source': self.sources[name], 'pages': sorted(self.pages[name]),
+                           'images': sorted(self.images[name])}
+                    for name in sorted(self.pages)
+                }
+            }, fp, ensure_ascii=False, indent=1)
+
+    def add_page(self, name:str, src_hash:str, read) -> None:
+        """ Страница графа; read() - текст исходника, читается только при промахе кэша """
+        self.sources[name] = src_hash
+        entry = self._cache.get(name)
+        if entry is not None and entry['source'] == src_hash:
+            self.pages[name] = set(entry['pages'])
+            self.images[name] = set(entry['images'])
+            return
+        self.parsed += 1
+        hrefs, srcs = content_links(read())
+        pages, images = set(), set()
+        for href in hrefs:
+            _, key, found = self.link_index.resolve_link(href)
+            if key is not None and found:
+                pages.add(self.link_index.pages[key])
+        for src in srcs:
+            target, key, found = self.link_index.resolve_image(src)
+            if key is not None and found:
+                images.add(target)
+        self.pages[name] = pages
+        self.images[name] = images
+
+    def reachable(self, roots) -> tuple:
+        """ Обход в ширину от корней: (достижимые страницы, их изображения) """
+        seen = set()
+        queue = deque(root for root in roots if root in self.pages)
+        seen.update(queue)
+        while queue:
+            for target in self.pages[queue.popleft()]:
+                if target not in seen and target in self.pages:
+                    seen.add(target)
+                    queue.append(target)
+        images = set()
+        for name in seen:
+            images.update(self.images[name])
+        return seen, images
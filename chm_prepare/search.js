@@ -0,0 +1,248 @@
+/*
+ * Клиент поиска по search_index.json (строит search_index.py).
+ * Стеммер, разбор запроса и ранжирование повторяют search_index.py,
+ * поэтому результаты совпадают с поиском из python.
+ * Написан на ES5, чтобы работать и в старых встроенных браузерах.
+ */
+(function (global) {
+    'use strict';
+
+    var WORD_RE = /[0-9a-zа-яё_]+/g;
+    var PHRASE_RE = /"([^"]*)"/g;
+
+    // стеммер Портера для русского языка (Snowball), окончания в области RV.
+    // Окончания, допустимые только после а или я, - во второй группе: буква остаётся
+    var RV_RE = /^(.*?[аеиоуыэюя])(.*)$/;
+    var PERFECTIVE_GERUND_RE = /(ив|ивши|ившись|ыв|ывши|ывшись)$|([ая])(в|вши|вшись)$/;
+    var REFLEXIVE_RE = /(ся|сь)$/;
+    var ADJECTIVE_RE = /(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$/;
+    var PARTICIPLE_RE = /(ивш|ывш|ующ)$|([ая])(ем|нн|вш|ющ|щ)$/;
+    var VERB_RE = new RegExp('(ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|ены' +
+                             '|ить|ыть|ишь|ую|ю)$|([ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)$');
+    var NOUN_RE = new RegExp('(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях' +
+                             '|ы|ь|ию|ью|ю|ия|ья|я)$');
+    var DERIVATIONAL_RE = /.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$/;
+    var SUPERLATIVE_RE = /(ейше|ейш)$/;
+
+    function cut(word, re) {
+        var m = re.exec(word);
+        if (!m) return word;
+        return word.slice(0, m.index) + (m[2] || '');
+    }
+
+    var stemCache = {};
+
+    function stem(word) {
+        word = word.toLowerCase().replace(/ё/g, 'е');
+        if (stemCache.hasOwnProperty(word)) return stemCache[word];
+        var m = RV_RE.exec(word);
+        if (!m) return (stemCache[word] = word);
+        var start = m[1], rv = m[2], temp = cut(rv, PERFECTIVE_GERUND_RE);
+        if (temp === rv) {
+            rv = cut(rv, REFLEXIVE_RE);
+            temp = cut(rv, ADJECTIVE_RE);
+            if (temp !== rv) {
+                rv = cut(temp, PARTICIPLE_RE);
+            } else {
+                temp = cut(rv, VERB_RE);
+                rv = temp === rv ? cut(rv, NOUN_RE) : temp;
+            }
+        } else {
+            rv = temp;
+        }
+        if (rv.charAt(rv.length - 1) === 'и') rv = rv.slice(0, -1);
+        if (DERIVATIONAL_RE.test(rv)) rv = rv.replace(/ость?$/, '');
+        if (rv.charAt(rv.length - 1) === 'ь') {
+            rv = rv.slice(0, -1);
+        } else {
+            rv = cut(rv, SUPERLATIVE_RE);
+            if (rv.slice(-2) === 'нн') rv = rv.slice(0, -1);
+        }
+        return (stemCache[word] = start + rv);
+    }
+
+    function tokenize(text) {
+        return text.toLowerCase().match(WORD_RE) || [];
+    }
+
+    function stems(text) {
+        var words = tokenize(text), result = [];
+        for (var i = 0; i < words.length; i++) result.push(stem(words[i]));
+        return result;
+    }
+
+    function parseQuery(query) {
+        var groups = [], m, i, words;
+        PHRASE_RE.lastIndex = 0;
+        while ((m = PHRASE_RE.exec(query)) !== null) groups.push(stems(m[1]));
+        words = stems(query.replace(PHRASE_RE, ' '));
+        for (i = 0; i < words.length; i++) groups.push([words[i]]);
+        return groups.filter(function (group) { return group.length > 0; });
+    }
+
+    function decodePostings(flat) {
+        var postings = {}, i = 0, page, count, position, positions, j;
+        while (i < flat.length) {
+            page = flat[i];
+            count = flat[i + 1];
+            positions = [];
+            position = 0;
+            for (j = 0; j < count; j++) {
+                position += flat[i + 2 + j];
+                positions.push(position);
+            }
+            postings[page] = positions;
+            i += 2 + count;
+        }
+        return postings;
+    }
+
+    function SearchEngine(index) {
+        this.index = index;
+        this.pages = index.pages;
+        this.postingsCache = {};
+        this.titles = {};
+    }
+
+    SearchEngine.prototype.postings = function (term) {
+        if (!this.postingsCache.hasOwnProperty(term)) {
+            var flat = this.index.terms.hasOwnProperty(term) ? this.index.terms[term] : [];
+            this.postingsCache[term] = decodePostings(flat);
+        }
+        return this.postingsCache[term];
+    };
+
+    SearchEngine.prototype.titleTerms = function (page) {
+        if (!this.titles.hasOwnProperty(page)) {
+            var terms = {}, words = stems(this.pages[page][1] || '');
+            for (var i = 0; i < words.length; i++) terms[words[i]] = true;
+            this.titles[page] = terms;
+        }
+        return this.titles[page];
+    };
+
+    SearchEngine.prototype.matchGroup = function (group) {
+        var first = this.postings(group[0]), matches = {}, page, starts, offset, following, next, i, count;
+        for (page in first) {
+            if (!first.hasOwnProperty(page)) continue;
+            if (group.length === 1) {
+                matches[page] = first[page].length;
+                continue;
+            }
+            starts = {};
+            for (i = 0; i < first[page].length; i++) starts[first[page][i]] = true;
+            for (offset = 1; offset < group.length; offset++) {
+                following = this.postings(group[offset])[page] || [];
+                next = {};
+                for (i = 0; i < following.length; i++) {
+                    if (starts[following[i] - offset]) next[following[i] - offset] = true;
+                }
+                starts = next;
+            }
+            count = 0;
+            for (i in starts) if (starts.hasOwnProperty(i)) count++;
+            if (count) matches[page] = count;
+        }
+        return matches;
+    };
+
+    // [[имя файла, заголовок, оценка]] по убыванию оценки, как SearchEngine.search в python
+    SearchEngine.prototype.search = function (query, limit) {
+        var groups = parseQuery(query), total = this.pages.length, scores = null, self = this;
+        var g, group, matches, count, idf, groupScores, page, score, next, i, ranked = [];
+        if (!groups.length) return [];
+        for (g = 0; g < groups.length; g++) {
+            group = groups[g];
+            matches = this.matchGroup(group);
+            count = 0;
+            for (page in matches) if (matches.hasOwnProperty(page)) count++;
+            idf = Math.log(1 + total / Math.max(1, count));
+            groupScores = {};
+            for (page in matches) {
+                if (!matches.hasOwnProperty(page)) continue;
+                score = (1 + Math.log(matches[page])) * idf;
+                var titled = true, terms = this.titleTerms(page);
+                for (i = 0; i < group.length; i++) if (!terms[group[i]]) titled = false;
+                if (titled) score += 2 * idf;
+                groupScores[page] = score;
+            }
+            if (scores === null) {
+                scores = groupScores;
+            } else {
+                next = {};
+                for (page in scores) {
+                    if (scores.hasOwnProperty(page) && groupScores.hasOwnProperty(page)) {
+                        next[page] = scores[page] + groupScores[page];
+                    }
+                }
+                scores = next;
+            }
+        }
+        for (page in scores) if (scores.hasOwnProperty(page)) ranked.push([+page, scores[page]]);
+        ranked.sort(function (a, b) {
+            if (a[1] !== b[1]) return b[1] - a[1];
+            var x = self.pages[a[0]][0], y = self.pages[b[0]][0];
+            return x < y ? -1 : x > y ? 1 : 0;
+        });
+        return ranked.slice(0, limit || 20).map(function (item) {
+            return [self.pages[item[0]][0], self.pages[item[0]][1], Math.round(item[1] * 10000) / 10000];
+        });
+    };
+
+    function load(url, callback) {
+        var request = new XMLHttpRequest();
+        request.open('GET', url, true);
+        request.onreadystatechange = function () {
+            if (request.readyState !== 4) return;
+            // при открытии с диска (file://) статус равен 0
+            if (request.status === 200 || (request.status === 0 && request.responseText)) {
+                callback(null, new SearchEngine(JSON.parse(request.responseText)));
+            } else {
+                callback(new Error('не удалось загрузить ' + url));
+            }
+        };
+        request.send(null);
+    }
+
+    function escapeHtml(text) {
+        return String(text).replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;').replace(/"/g, '&quot;');
+    }
+
+    // форма поиска на странице search.htm
+    function attach(indexUrl, formId, inputId, resultsId, statusId) {
+        var doc = global.document, form = doc.getElementById(formId), input = doc.getElementById(inputId);
+        var results = doc.getElementById(resultsId), status = doc.getElementById(statusId), engine = null;
+
+        function run() {
+            if (!engine) return;
+            var started = new Date().getTime(), found = engine.search(input.value, 50), html = [];
+            for (var i = 0; i < found.length; i++) {
+                html.push('<li><a href="' + escapeHtml(found[i][0]) + '">' + escapeHtml(found[i][1] || found[i][0]) + '</a></li>');
+            }
+            results.innerHTML = html.join('');
+            status.innerHTML = 'Найдено: ' + found.length + ' (' + (new Date().getTime() - started) + ' мс)';
+        }
+
+        form.onsubmit = function () { run(); return false; };
+        var match = /[?&]q=([^&]*)/.exec(global.location.search);
+        if (match) input.value = decodeURIComponent(match[1].replace(/\+/g, ' '));
+        status.innerHTML = 'Загрузка индекса...';
+        load(indexUrl, function (error, loaded) {
+            if (error) {
+                status.innerHTML = escapeHtml(error.message);
+                return;
+            }
+            engine = loaded;
+            status.innerHTML = '';
+            if (input.value) run();
+        });
+    }
+
+    var QspSearch = {stem: stem, tokenize: tokenize, parseQuery: parseQuery, decodePostings: decodePostings,
+                     SearchEngine: SearchEngine, load: load, attach: attach};
+    if (typeof module !== 'undefined' && module.exports) {
+        module.exports = QspSearch;
+    } else {
+        global.QspSearch = QspSearch;
+    }
+})(this);
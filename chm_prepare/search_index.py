@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Полнотекстовый поиск по собранной справке.
+Индекс строится по тексту div.page.group при подготовке страниц:
+слова приводятся к основе стеммером Портера для русского языка,
+для каждой основы хранятся страницы и позиции слов на них.
+Тот же стеммер и разбор запроса повторяет клиент search.js.
+"""
+
+import os, re, sys, json
+import math
+import time
+import argparse
+from functools import lru_cache
+
+# версия разбора текста: при её смене страницы индексируются заново
+INDEX_VERSION = 1
+
+WORD_RE = re.compile(r'[0-9a-zа-яё_]+')
+PHRASE_RE = re.compile(r'"([^"]*)"')
+
+# стеммер Портера для русского языка (Snowball), окончания в области RV
+RV_RE = re.compile(r'^(.*?[аеиоуыэюя])(.*)$', re.S)
+PERFECTIVE_GERUND_RE = re.compile(r'(?:ив|ивши|ившись|ыв|ывши|ывшись|(?<=[ая])(?:в|вши|вшись))$')
+REFLEXIVE_RE = re.compile(r'(?:ся|сь)$')
+ADJECTIVE_RE = re.compile(r'(?:ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$')
+PARTICIPLE_RE = re.compile(r'(?:ивш|ывш|ующ|(?<=[ая])(?:ем|нн|вш|ющ|щ))$')
+VERB_RE = re.compile(r'(?:ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|ены'
+                     r'|ить|ыть|ишь|ую|ю|(?<=[ая])(?:ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно))$')
+NOUN_RE = re.compile(r'(?:а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях'
+                     r'|ы|ь|ию|ью|ю|ия|ья|я)$')
+DERIVATIONAL_RE = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+SUPERLATIVE_RE = re.compile(r'(?:ейше|ейш)$')
+
+@lru_cache(maxsize=65536)
+def stem(word:str) -> str:
+    """ Основа слова; слова без русских гласных (команды QSP, числа) не меняются """
+    word = word.lower().replace('ё', 'е')
+    match = RV_RE.match(word)
+    if not match:
+        return word
+    start, rv = match.groups()
+    cut = PERFECTIVE_GERUND_RE.sub('', rv, 1)
+    if cut == rv:
+        rv = REFLEXIVE_RE.sub('', rv, 1)
+        cut = ADJECTIVE_RE.sub('', rv, 1)
+        if cut != rv:
+            rv = PARTICIPLE_RE.sub('', cut, 1)
+        else:
+            cut = VERB_RE.sub('', rv, 1)
+            rv = NOUN_RE.sub('', rv, 1) if cut == rv else cut
+    else:
+        rv = cut
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    if DERIVATIONAL_RE.match(rv):
+        rv = re.sub(r'ость?$', '', rv)
+    if rv.endswith('ь'):
+        rv = rv[:-1]
+    else:
+        rv = SUPERLATIVE_RE.sub('', rv, 1)
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+    return start + rv
+
+def tokenize(text:str) -> list:
+    """ Слова текста в нижнем регистре """
+    return WORD_RE.findall(text.lower())
+
+def index_text(title:str, text:str) -> dict:
+    """ Запись страницы для индекса: заголовок и основа -> позиции слов в тексте """
+    terms = {}
+    for position, word in enumerate(tokenize(text)):
+        terms.setdefault(stem(word), []).append(position)
+    return {'title': title, 'terms': terms}
+
+def encode_postings(entries:list) -> list:
+    """ [(номер страницы, позиции)] -> [страница, число позиций, первая позиция, разности...] """
+    flat = []
+    for page, positions in entries:
+        flat += [page, len(positions), positions[0]]
+        flat += [b - a for a, b in zip(positions, positions[1:])]
+    return flat
+
+def decode_postings(flat:list) -> dict:
+    """ Обратное к encode_postings: номер страницы -> позиции """
+    postings, i = {}, 0
+    while i < len(flat):
+        page, count = flat[i], flat[i + 1]
+        positions, position = [], 0
+        for delta in flat[i + 2:i + 2 + count]:
+            position += delta
+            positions.append(position)
+        postings[page] = positions
+        i += 2 + count
+    return postings
+
+class SearchIndex:
+    """
+    Индекс справки с инкрементальным обновлением.
+    Записи страниц кэшируются в cache_path по хэшу исходника, поэтому
+    заново разбирается только текст пересобранных страниц, а итоговый
+    search_index.json собирается слиянием готовых записей.
+    """
+
+    def __init__(self, cache_path:str) -> None:
+        self.cache_path = cache_path
+        self.pages:dict[str, dict] = self._load()
+
+    def _load(self) -> dict:
+        if not os.path.isfile(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as fp:
+                data = json.load(fp)
+        except ValueError:
+            return {}
+        return data.get('pages', {}) if data.get('version') == INDEX_VERSION else {}
+
+    def is_indexed(self, name:str, src_hash:str) -> bool:
+        entry = self.pages.get(name)
+        return entry is not None and entry['source'] == src_hash
+
+    def update(self, name:str, src_hash:str, entry:dict) -> None:
+        self.pages[name] = {'source': src_hash, **entry}
+
+    def retain(self, names) -> None:
+        """ Оставляет только страницы сборки """
+        names = set(names)
+        self.pages = {name: entry for name, entry in self.pages.items() if name in names}
+
+    def save(self) -> None:
+        with open(self.cache_path, 'w', encoding='utf-8') as fp:
+            json.dump({'version': INDEX_VERSION, 'pages': self.pages}, fp, ensure_ascii=False,
+                      separators=(',', ':'))
+
+    def build(self) -> dict:
+        """ Компактный индекс: список страниц и основа -> закодированные позиции """
+        names = sorted(self.pages)
+        postings:dict[str, list] = {}
+        for number, name in enumerate(names):
+            for term, positions in self.pages[name]['terms'].items():
+                postings.setdefault(term, []).append((number, positions))
+        return {
+            'version': INDEX_VERSION,
+            'pages': [[name, self.pages[name]['title']] for name in names],
+            'terms': {term: encode_postings(postings[term]) for term in sorted(postings)}
+        }
+
+    def write(self, path:str) -> dict:
+        index = self.build()
+        with open(path, 'w', encoding='utf-8') as fp:
+            json.dump(index, fp, ensure_ascii=False, separators=(',', ':'))
+        return index
+
+def load_index(path:str) -> dict:
+    with open(path, 'r', encoding='utf-8') as fp:
+        return json.load(fp)
+
+def parse_query(query:str) -> list:
+    """ Запрос -> список групп основ; группа из нескольких слов - фраза в кавычках """
+    groups = [[stem(word) for word in tokenize(phrase)] for phrase in PHRASE_RE.findall(query)]
+    groups += [[stem(word)] for word in tokenize(PHRASE_RE.sub(' ', query))]
+    return [group for group in groups if group]
+
+class SearchEngine:
+    """
+    Поиск по search_index.json: страницы, содержащие все слова запроса
+    (фразы - подряд), по убыванию tf-idf с бонусом за слова в заголовке.
+    Списки позиций раскодируются при первом обращении к основе.
+    """
+
+    def __init__(self, index:dict) -> None:
+        self.index = index
+        self.pages = index['pages']
+        self._postings:dict[str, dict] = {}
+        self._titles:dict[int, set] = {}
+
+    def postings(self, term:str) -> dict:
+        postings = self._postings.get(term)
+        if postings is None:
+            postings = self._postings[term] = decode_postings(self.index['terms'].get(term, []))
+        return postings
+
+    def title_terms(self, page:int) -> set:
+        terms = self._titles.get(page)
+        if terms is None:
+            terms = self._titles[page] = {stem(word) for word in tokenize(self.pages[page][1] or '')}
+        return terms
+
+    def search(self, query:str, limit:int = 20) -> list:
+        """ [(имя файла, заголовок, оценка)] """
+        groups = parse_query(query)
+        if not groups:
+            return []
+        total = len(self.pages)
+        scores = None
+        for group in groups:
+            matches = self._match_group(group)
+            idf = math.log(1 + total / max(1, len(matches)))
+            group_scores = {}
+            for page, count in matches.items():
+                score = (1 + math.log(count)) * idf
+                if all(term in self.title_terms(page) for term in group):
+                    score += 2 * idf
+                group_scores[page] = score
+            if scores is None:
+                scores = group_scores
+            else:
+                scores = {page: score + group_scores[page] for page, score in scores.items() if page in group_scores}
+            if not scores:
+                return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self.pages[item[0]][0]))[:limit]
+        return [(self.pages[page][0], self.pages[page][1], round(score, 4)) for page, score in ranked]
+
+    def _match_group(self, group:list) -> dict:
+        """ Страница -> число вхождений слова или фразы """
+        first = self.postings(group[0])
+        if len(group) == 1:
+            return {page: len(positions) for page, positions in first.items()}
+        matches = {}
+        for page, positions in first.items():
+            starts = set(positions)
+            for offset, term in enumerate(group[1:], 1):
+                following = self.postings(term).get(page)
+                if not following:
+                    starts = set()
+                    break
+                starts &= {position - offset for position in following}
+            if starts:
+                matches[page] = len(starts)
+        return matches
+
+def parse_args(argv=None):
+    """ Разбор аргументов командной строки """
+    parser = argparse.ArgumentParser(description='Поиск по индексу собранной справки')
+    parser.add_argument('query', help='слова запроса; фраза - в кавычках')
+    parser.add_argument('--index', default=os.path.join('..', 'html_out', 'search_index.json'))
+    parser.add_argument('--limit', type=int, default=20)
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    started = time.perf_counter()
+    engine = SearchEngine(load_index(args.index))
+    loaded = time.perf_counter()
+    results = engine.search(args.query, args.limit)
+    finished = time.perf_counter()
+    for name, title, score in results:
+        print(f'{score:8.3f}  {name}  {title}')
+    print(f'Найдено: {len(results)}, загрузка индекса {(loaded - started) * 1000:.1f} мс, '
+          f'поиск {(finished - loaded) * 1000:.2f} мс', file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
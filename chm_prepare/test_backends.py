@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка сборки в несколько форматов: chm совпадает с обычной сборкой байт в байт,
+страницы разбираются один раз, а сайт, одна страница и EPUB ссылаются на свои файлы
+"""
+
+import os
+import shutil
+import zipfile
+
+from lxml import etree
+
+import to_chm_prepare
+from to_chm_prepare import ChmPrepare
+from backends import build_targets
+from validate_html import HtmlValidator
+
+HTML_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'html_src')
+
+def preparat(src, out):
+    return ChmPrepare({'src_html_folder': str(src), 'out_html_folder': str(out),
+                       'start_file': str(src / 'start.html'), 'scheme': str(src / 'urls_links_to_files.json')})
+
+def read_outputs(folder):
+    return {name: (folder / name).read_bytes() for name in os.listdir(folder) if not name.startswith('.')}
+
+def test_targets(tmp_path, monkeypatch):
+    src = tmp_path / 'src'
+    shutil.copytree(HTML_SRC, src)
+    full = preparat(src, tmp_path / 'full')
+    assert full.prepare_html_files() == {}
+    full.prepare_navigation()
+
+    parsed = []
+    prepare_deferred = ChmPrepare.prepare_deferred
+    monkeypatch.setattr(to_chm_prepare.ChmPrepare, 'prepare_deferred',
+                        lambda self, *args, **kwargs: parsed.append(1) or prepare_deferred(self, *args, **kwargs))
+    report = build_targets(preparat(src, tmp_path / 'chm'), {
+        'chm': str(tmp_path / 'chm'), 'site': str(tmp_path / 'site'),
+        'single': str(tmp_path / 'one' / 'help.html'), 'epub': str(tmp_path / 'help.epub')})
+    pages = report['parse']['pages']
+    assert len(parsed) == pages and report['parse']['errors'] == 0
+
+    assert read_outputs(tmp_path / 'chm') == read_outputs(tmp_path / 'full')
+
+    # ссылки на страницы и якоря ведут туда же, что и в chm: ошибки - только ошибки исходников
+    def broken(folder):
+        errors = HtmlValidator(str(folder)).run()
+        return sorted(e['ref'].split('#')[-1] for e in errors.get('missing_anchor', []))
+    full_anchors = broken(tmp_path / 'full')
+    assert broken(tmp_path / 'site') == full_anchors
+    assert sorted(ref.split('--', 1)[-1] for ref in broken(tmp_path / 'one')) == full_anchors
+
+    site = tmp_path / 'site'
+    assert (site / 'index.html').is_file() and (site / 'site.css').is_file()
+    assert report['site']['images'] == len(os.listdir(site / 'images')) > 0
+    assert 'href="help_acts.html' in (site / 'help_goto.html').read_text(encoding='utf-8')
+
+    single = (tmp_path / 'one' / 'help.html').read_text(encoding='utf-8')
+    assert '<section id="p-help_acts">' in single and 'src="data:image/' in single
+
+    with zipfile.ZipFile(tmp_path / 'help.epub') as book:
+        names = book.namelist()
+        assert names[0] == 'mimetype' and book.getinfo('mimetype').compress_type == zipfile.ZIP_STORED
+        assert book.read('mimetype') == b'application/epub+zip'
+        assert 'OEBPS/help_acts.xhtml' in names and 'OEBPS/nav.xhtml' in names
+        for name in names:
+            if name.endswith(('.xhtml', '.opf', '.xml')):
+                etree.fromstring(book.read(name))
+        assert b'href="help_acts.xhtml' in book.read('OEBPS/nav.xhtml')
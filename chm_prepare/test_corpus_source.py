@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка сборки из корпуса SQLite: результат тот же, что и из папки html_src
+"""
+
+import os
+
+from to_chm_prepare import ChmPrepare, read_bytes
+from corpus_store import CorpusWriter
+
+HTML_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'html_src')
+
+def read_pages(folder):
+    # содержание и указатель собираются сразу в qsp.hhc и qsp.hhk
+    return {name: read_bytes(os.path.join(folder, name))
+            for name in os.listdir(folder) if name.endswith(('.htm', '.hhc', '.hhk'))}
+
+def test_corpus_build_matches_folder(tmp_path):
+    writer = CorpusWriter(str(tmp_path / 'wiki.sqlite'), root=HTML_SRC)
+    writer.import_folder(HTML_SRC)
+    writer.publish()
+
+    from_folder = ChmPrepare({'src_html_folder': HTML_SRC, 'out_html_folder': str(tmp_path / 'folder'),
+                              'scheme': os.path.join(HTML_SRC, 'urls_links_to_files.json')})
+    from_corpus = ChmPrepare({'src_html_folder': HTML_SRC, 'out_html_folder': str(tmp_path / 'corpus'),
+                              'corpus': str(tmp_path / 'wiki.sqlite')})
+    assert sorted(from_corpus.files_pathes) == sorted(from_folder.files_pathes)
+    assert from_folder.prepare_html_files() == from_corpus.prepare_html_files() == {}
+
+    pages = read_pages(tmp_path / 'folder')
+    assert len(pages) == len(from_folder.files_pathes)
+    assert read_pages(tmp_path / 'corpus') == pages
+    assert from_corpus.unresolved_links == from_folder.unresolved_links
+    # ссылки на просмотр и выдачу изображений вики - не битые страницы
+    assert from_folder.unresolved_links
+    assert not [url for url in from_folder.unresolved_links if from_folder.link_index.is_media_endpoint(url)]
+
+    # хэши исходников в корпусе те же, что у файлов: пересобирать нечего
+    again = ChmPrepare({'src_html_folder': HTML_SRC, 'out_html_folder': str(tmp_path / 'corpus'),
+                        'corpus': str(tmp_path / 'wiki.sqlite')})
+    again.prepare_html_files()
+    assert again.build_stats['built'] == 0
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка конвейера обхода и подготовки: результат тот же, что у двух
+отдельных этапов, а манифест совместим с to_chm_prepare.py
+"""
+
+import os
+
+from crawl_pipeline import CrawlPipeline
+from to_chm_prepare import ChmPrepare
+from qsp_wiki_downloader import WikiDownloader
+from local_wiki_server import LocalWikiServer, routes_from_scheme
+
+HTML_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'html_src')
+
+def read_outputs(folder):
+    outputs = {}
+    for name in os.listdir(folder):
+        if name.endswith(('.htm', '.hhc', '.hhk')) or name == 'unresolved_links.json':
+            with open(os.path.join(folder, name), 'rb') as fp:
+                outputs[name] = fp.read()
+    return outputs
+
+def test_pipeline_matches_separate_stages(tmp_path):
+    routes = routes_from_scheme(os.path.join(HTML_SRC, 'urls_links_to_files.json'), HTML_SRC)
+    with LocalWikiServer(routes) as server:
+        downloader = WikiDownloader(base_url=server.base_url, output_dir=str(tmp_path / 'src'),
+                                    workers=4, rate=0)
+        pipeline = CrawlPipeline(downloader, {'out_html_folder': str(tmp_path / 'pipeline'),
+                                              'base_url': server.base_url})
+        assert pipeline.run() == {}
+
+    # страницы, у которых цели ссылок появились позже, готовились отложенно
+    assert pipeline.stats['immediate'] > 0 and pipeline.stats['deferred'] > 0
+    assert pipeline.stats['from_source'] == 0
+
+    settings = {'src_html_folder': str(tmp_path / 'src'), 'base_url': server.base_url,
+                'scheme': str(tmp_path / 'src' / 'urls_links_to_files.json')}
+    separate = ChmPrepare({**settings, 'out_html_folder': str(tmp_path / 'separate')})
+    assert separate.prepare_html_files() == {}
+    separate.prepare_navigation()
+    outputs = read_outputs(tmp_path / 'separate')
+    assert len(outputs) > 50
+    assert read_outputs(tmp_path / 'pipeline') == outputs
+
+    again = ChmPrepare({**settings, 'out_html_folder': str(tmp_path / 'pipeline')})
+    again.prepare_html_files()
+    # qsp.hhc и qsp.hhk тоже в манифесте: пересобирать нечего
+    assert again.build_stats['built'] == 0
+    assert again.build_stats['skipped'] == len(again.files_pathes)
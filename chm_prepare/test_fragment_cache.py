@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка кэша фрагментов: результат совпадает со сборкой без кэша,
+повторная сборка не разбирает страницы, лимиты вытесняют старые записи
+"""
+
+import os, time
+
+from to_chm_prepare import ChmPrepare, PageTemplate, CHM_PAGE
+from fragment_cache import FragmentCache
+
+HTML_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'html_src')
+
+def preparat(out_dir, **settings):
+    return ChmPrepare({'src_html_folder': HTML_SRC, 'out_html_folder': str(out_dir),
+                       'start_file': os.path.join(HTML_SRC, 'start.html'),
+                       'scheme': os.path.join(HTML_SRC, 'urls_links_to_files.json'), **settings})
+
+def read_pages(folder):
+    return {name: (folder / name).read_bytes() for name in os.listdir(folder) if name.endswith('.htm')}
+
+def test_fragment_cache(tmp_path):
+    plain = preparat(tmp_path / 'plain')
+    assert plain.prepare_html_files() == {}
+
+    cached = preparat(tmp_path / 'cached', fragment_cache=True)
+    assert cached.prepare_html_files(jobs=2) == {}
+    stats = cached.build_stats['fragment_cache']
+    assert stats['hit'] == 0 and stats['miss'] == len(cached.files_pathes) == stats['entries']
+    assert read_pages(tmp_path / 'cached') == read_pages(tmp_path / 'plain')
+
+    # полная пересборка с другим шаблоном: страницы не разбираются, а шаблон новый
+    again = preparat(tmp_path / 'cached', fragment_cache=True, incremental=False)
+    again.page_template = PageTemplate(CHM_PAGE.replace('default.css', 'tuned.css'))
+    assert again.prepare_html_files() == {}
+    assert again.build_stats['fragment_cache']['hit'] == len(again.files_pathes)
+    assert again.metrics.report()['stages'].get('parse') is None
+    page = (tmp_path / 'cached' / 'help_acts.htm').read_text(encoding='utf-8')
+    assert 'tuned.css' in page
+    assert page.replace('tuned.css', 'default.css') == (tmp_path / 'plain' / 'help_acts.htm').read_text(encoding='utf-8')
+
+def test_fragment_cache_lru(tmp_path):
+    cache = FragmentCache(str(tmp_path), 'v1', max_entries=2)
+    for number in range(3):
+        cache.put(f'src{number}', {'n': number})
+        # разное время обращения для LRU
+        os.utime(cache.path(f'src{number}'), (time.time() - 100 + number,) * 2)
+    assert cache.get('src0') == {'n': 0}
+    assert cache.evict() == {'entries': 2, 'bytes': os.path.getsize(cache.path('src0')) * 2, 'evicted': 1}
+    # вытеснена давно не использованная запись, а не самая старая по записи
+    assert cache.get('src1') is None and cache.get('src0') == {'n': 0} and cache.get('src2') == {'n': 2}
+    # другая версия очистки - другие ключи
+    assert FragmentCache(str(tmp_path), 'v2').get('src0') is None
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка оптимизации изображений: PNG без потерь, WEBP -> PNG вместе с <img src>,
+уменьшение широких изображений и кэш по хэшу исходника
+"""
+
+import os, json
+from io import BytesIO
+
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+from to_chm_prepare import ChmPrepare
+
+BASE_URL = 'https://wiki.qsp.org'
+PAGE = '''<html><head><title>Картинки</title></head><body>
+<div class="page group"><p><img src="/_media/shot.png"> <img src="/_media/logo.webp"> <img src="/_media/photo.jpg"></p></div>
+</body></html>'''
+
+def image_bytes(size, fmt, **params):
+    img = Image.new('RGB', size, (255, 255, 255))
+    # несколько цветов: PNG без сжатия заметно пережимается в палитру
+    for x in range(0, size[0], 7):
+        for y in range(size[1]):
+            img.putpixel((x, y), ((x * 5) % 256, 40, 90))
+    buffer = BytesIO()
+    img.save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+def make_src(folder):
+    images = {'shot.png': image_bytes((180, 80), 'PNG', compress_level=0),
+              'logo.webp': image_bytes((60, 40), 'WEBP', lossless=True),
+              'photo.jpg': image_bytes((400, 100), 'JPEG', quality=95)}
+    os.makedirs(folder / 'images')
+    for name, data in images.items():
+        (folder / 'images' / name).write_bytes(data)
+    (folder / 'pictures.html').write_text(PAGE, encoding='utf-8')
+    scheme = {'pages': {f'{BASE_URL}/pictures': '..\\html_src\\pictures.html'},
+              'images': {f'{BASE_URL}/_media/{name}': f'..\\html_src\\images\\{name}' for name in images}}
+    with open(folder / 'urls_links_to_files.json', 'w', encoding='utf-8') as fp:
+        json.dump(scheme, fp)
+    return images
+
+def preparat(src, out, **settings):
+    return ChmPrepare({'src_html_folder': str(src), 'out_html_folder': str(out), 'base_url': BASE_URL,
+                       'start_file': str(src / 'pictures.html'),
+                       'scheme': str(src / 'urls_links_to_files.json'), **settings})
+
+def test_optimize_images(tmp_path):
+    src, out = tmp_path / 'src', tmp_path / 'out'
+    images = make_src(src)
+
+    first = preparat(src, out, optimize_images=True, max_image_width=200)
+    assert first.prepare_html_files(jobs=2) == {}
+    report = first.images_report
+    assert report['images'] == 3 and report['processed'] == 3 and report['cached'] == 0
+    assert report['converted'] == ['logo.webp'] and report['errors'] == {}
+    assert report['bytes_saved'] > 0
+
+    # WEBP стал PNG, и страница ссылается на новое имя
+    page = (out / 'pictures.htm').read_text(encoding='utf-8')
+    assert 'src="logo.png"' in page and 'webp' not in page
+    with Image.open(out / 'logo.png') as img, Image.open(src / 'images' / 'logo.webp') as orig:
+        assert img.format == 'PNG' and img.convert('RGB').tobytes() == orig.convert('RGB').tobytes()
+    # PNG пережат без потерь
+    assert os.path.getsize(out / 'shot.png') < len(images['shot.png'])
+    with Image.open(out / 'shot.png') as img, Image.open(src / 'images' / 'shot.png') as orig:
+        assert img.convert('RGB').tobytes() == orig.convert('RGB').tobytes()
+    # широкие изображения уменьшены с сохранением пропорций
+    with Image.open(out / 'photo.jpg') as img:
+        assert img.size == (200, 50)
+
+    # повторная сборка берёт результаты из кэша
+    again = preparat(src, out, optimize_images=True, max_image_width=200)
+    again.prepare_html_files()
+    assert again.images_report['cached'] == 3 and again.images_report['processed'] == 0
+    assert again.build_stats['built'] == 0
+    with open(out / 'images_report.json', encoding='utf-8') as fp:
+        assert json.load(fp)['bytes_saved'] == report['bytes_saved']
+
+    # без оптимизации изображения копируются как есть, а ссылки ведут на исходные имена
+    plain = preparat(src, tmp_path / 'plain', prune=True)
+    plain.prepare_html_files()
+    assert (tmp_path / 'plain' / 'shot.png').read_bytes() == images['shot.png']
+    assert 'src="logo.webp"' in (tmp_path / 'plain' / 'pictures.htm').read_text(encoding='utf-8')
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка отсечения страниц и изображений, недостижимых от start, sidebar и help_keywords
+"""
+
+import os, json
+
+from to_chm_prepare import ChmPrepare
+
+HTML_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'html_src')
+
+def preparat(out_dir, **settings):
+    return ChmPrepare({'src_html_folder': HTML_SRC, 'out_html_folder': str(out_dir),
+                       'start_file': os.path.join(HTML_SRC, 'start.html'),
+                       'scheme': os.path.join(HTML_SRC, 'urls_links_to_files.json'), **settings})
+
+def test_prune_unreachable(tmp_path):
+    full = preparat(tmp_path)
+    assert full.prepare_html_files() == {}
+    assert os.path.isfile(tmp_path / 'discussions.htm')
+
+    pruned = preparat(tmp_path, prune=True)
+    assert pruned.prepare_html_files() == {}
+    with open(tmp_path / 'pruned.json', encoding='utf-8') as fp:
+        report = json.load(fp)
+    assert report['roots'] == ['start.htm', 'sidebar.htm', 'help_keywords.htm']
+    # служебные страницы и песочница ни откуда из справки не достижимы
+    assert {'discussions.htm', 'index.htm', 'playground_playground.htm'} <= set(report['pages'])
+    assert report['reachable']['pages'] + len(report['pages']) == len(full.files_pathes)
+    assert pruned.build_stats['pruned'] == len(report['pages'])
+    # смена настройки prune пересобирает все оставшиеся страницы
+    assert pruned.build_stats['built'] == report['reachable']['pages']
+    for name in report['pages']:
+        assert not os.path.exists(tmp_path / name)
+    assert os.path.isfile(tmp_path / 'help_acts.htm')
+
+    # изображения достижимых страниц копируются, недостижимые - нет
+    copied = {name for name in os.listdir(tmp_path) if not name.endswith(('.htm', '.json', '.hhc', '.hhk'))}
+    assert copied and not copied & set(report['images'])
+    assert len(copied) + len(report['missing_images']) == report['reachable']['images']
+
+    # граф ссылок берётся из кэша, пока исходники и схема не менялись
+    assert pruned.build_stats['graph_parsed'] == len(full.files_pathes)
+    again = preparat(tmp_path, prune=True)
+    again.prepare_html_files()
+    assert again.build_stats['graph_parsed'] == 0
+    assert again.build_stats['built'] == 0
+    assert again.pruned == pruned.pruned
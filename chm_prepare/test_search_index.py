@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка поискового индекса: стеммер, запросы, инкрементальное обновление
+и совпадение результатов клиента search.js с поиском из python
+"""
+
+import os, json
+import shutil
+import subprocess
+
+import pytest
+
+from to_chm_prepare import ChmPrepare
+from search_index import SearchEngine, load_index, stem, decode_postings, encode_postings
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HTML_SRC = os.path.join(HERE, '..', 'html_src')
+QUERIES = ['переменные', 'Локация', '"строковые переменные"', 'цикл while', 'act', 'ёлка']
+
+def preparat(out_dir, **settings):
+    return ChmPrepare({'src_html_folder': HTML_SRC, 'out_html_folder': str(out_dir),
+                       'start_file': os.path.join(HTML_SRC, 'start.html'),
+                       'scheme': os.path.join(HTML_SRC, 'urls_links_to_files.json'), 'search_index': True,
+                       **settings})
+
+def test_stem():
+    assert {stem(w) for w in ('переменная', 'переменные', 'переменных')} == {'перемен'}
+    assert {stem(w) for w in ('действие', 'действия', 'действий')} == {'действ'}
+    assert stem('Играли') == stem('играть') == 'игра'
+    assert stem('ёлка') == 'елк'
+    # команды QSP и числа не меняются
+    assert stem('addobj') == 'addobj' and stem('1000') == '1000'
+    postings = {0: [3, 8, 20], 5: [1]}
+    assert decode_postings(encode_postings(postings.items())) == postings
+
+def test_search_index(tmp_path):
+    first = preparat(tmp_path)
+    assert first.prepare_html_files() == {}
+    index = load_index(tmp_path / 'search_index.json')
+    names = [name for name, _ in index['pages']]
+    assert 'help_variables.htm' in names and 'sidebar.htm' not in names
+    assert os.path.isfile(tmp_path / 'search.js') and os.path.isfile(tmp_path / 'search.htm')
+
+    engine = SearchEngine(index)
+    assert engine.search('переменные')[0][0] == 'help_variables.htm'
+    assert engine.search('циклы')[0][0] == 'help_cycle.htm'
+    # фраза требует слов подряд, а без кавычек достаточно всех слов на странице
+    phrase = {name for name, _, _ in engine.search('"строковые переменные"', 100)}
+    words = {name for name, _, _ in engine.search('строковые переменные', 100)}
+    assert phrase and phrase <= words
+    assert engine.search('несуществующееслово') == []
+
+    # повторная сборка не индексирует неизменившиеся страницы
+    again = preparat(tmp_path)
+    again.prepare_html_files()
+    assert again.build_stats['built'] == 0
+    assert load_index(tmp_path / 'search_index.json') == index
+
+@pytest.mark.parametrize('fragment_cache', [False, True])
+def test_search_rebuild_skips_all(tmp_path, fragment_cache):
+    """ Содержание и указатель в индекс не входят и пересборку с поиском не вызывают """
+    assert preparat(tmp_path, fragment_cache=fragment_cache).prepare_html_files() == {}
+    again = preparat(tmp_path, fragment_cache=fragment_cache)
+    again.prepare_html_files()
+    assert again.build_stats['skipped'] == len(again.files_pathes)
+    assert again.build_stats['built'] == 0
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='нужен node')
+def test_js_client_matches_python(tmp_path):
+    preparat(tmp_path).prepare_html_files()
+    engine = SearchEngine(load_index(tmp_path / 'search_index.json'))
+    script = ("const s = require(process.argv[1]); const fs = require('fs');"
+              "const e = new s.SearchEngine(JSON.parse(fs.readFileSync(process.argv[2], 'utf8')));"
+              "const qs = JSON.parse(process.argv[3]);"
+              "console.log(JSON.stringify(qs.map(q => [e.search(q, 20), q.split(' ').map(s.stem)])));")
+    output = subprocess.run(['node', '-e', script, os.path.join(HERE, 'search.js'),
+                             str(tmp_path / 'search_index.json'), json.dumps(QUERIES)],
+                            capture_output=True, text=True, encoding='utf-8', check=True).stdout
+    for query, (results, stems) in zip(QUERIES, json.loads(output)):
+        assert [tuple(item[:2]) for item in results] == [item[:2] for item in engine.search(query, 20)]
+        assert stems == [stem(word) for word in query.split(' ')]
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка файлов навигации: qsp.hhc и qsp.hhk пишутся из дерева, построенного
+при подготовке страниц содержания и указателя, без промежуточных htm-файлов;
+символы вне windows-1251 становятся числовыми ссылками, qsp.hhp перечисляет
+достижимые страницы справки
+"""
+
+import os
+import shutil
+
+from bs4 import BeautifulSoup
+
+from to_chm_prepare import ChmPrepare, LINK_MARK
+from toc_model import toc_nodes
+
+HTML_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'html_src')
+
+def preparat(src, out):
+    return ChmPrepare({'src_html_folder': str(src), 'out_html_folder': str(out),
+                       'start_file': str(src / 'start.html'), 'scheme': str(src / 'urls_links_to_files.json')})
+
+def test_toc_nodes():
+    page = BeautifulSoup('<div class="page group"><ul><li><div class="li"><a href="/start">Раздел</a></div>'
+                         '<ul><li><div class="li"><strong>Без ссылки</strong></div></li></ul></li></ul></div>', 'lxml')
+    # метки ссылок ставит prepare_deferred уже после разбора
+    page.a['href'] = LINK_MARK.format(0)
+    [node] = toc_nodes(page.div)
+    assert (node.name, node.link) == ('Раздел', 0)
+    assert [(child.name, child.link) for child in node.children] == [('Без ссылки', None)]
+    assert node.resolved(['start.htm']).link == 'start.htm'
+
+def test_navigation(tmp_path):
+    src, out = tmp_path / 'src', tmp_path / 'out'
+    shutil.copytree(HTML_SRC, src, ignore=shutil.ignore_patterns('images'))
+    keywords = (src / 'help_keywords.html').read_text(encoding='utf-8')
+    (src / 'help_keywords.html').write_text(keywords.replace('>ACT<', '>ACT ≠<'), encoding='utf-8')
+
+    full = preparat(src, out)
+    assert full.prepare_html_files(jobs=2) == {}
+    full.prepare_navigation()
+    assert not os.path.exists(out / 'sidebar.htm') and not os.path.exists(out / 'help_keywords.htm')
+
+    hhk = (out / 'qsp.hhk').read_text(encoding='windows-1251')
+    assert '<param name="Name" value="ACT &#8800;">' in hhk
+    assert full.build_stats['unencodable'] == {'qsp.hhk': ['ACT ≠']}
+    hhc = (out / 'qsp.hhc').read_text(encoding='windows-1251')
+    assert hhc.count('text/sitemap') == sum(1 for _ in walk(full.navigation['qsp.hhc'])) > 20
+
+    hhp = (out / 'qsp.hhp').read_text(encoding='windows-1251')
+    files = hhp.split('[FILES]\n')[1].split('\n\n')[0].split('\n')
+    assert 'Default topic=start.htm' in hhp and 'Index file=qsp.hhk' in hhp
+    # в проекте только страницы, достижимые из справки, без служебных страниц вики
+    assert files == sorted(files) and set(files) < {name for name in os.listdir(out) if name.endswith('.htm')}
+    assert 'start.htm' in files and 'help_acts.htm' in files
+    assert not {'discussions.htm', 'index.htm', 'playground_playground.htm'} & set(files)
+
+    # содержание и указатель в манифесте, как страницы: без изменений они не пересобираются
+    again = preparat(src, out)
+    again.prepare_html_files()
+    assert again.build_stats['built'] == 0 and again.navigation == {}
+    sidebar = (src / 'sidebar.html').read_text(encoding='utf-8')
+    (src / 'sidebar.html').write_text(sidebar.replace('Вывод текста', 'Вывод на экран'), encoding='utf-8')
+    again = preparat(src, out)
+    again.prepare_html_files()
+    assert again.build_stats['built'] == 1 and list(again.navigation) == ['qsp.hhc']
+    assert 'Вывод на экран' in (out / 'qsp.hhc').read_text(encoding='windows-1251')
+
+def walk(nodes):
+    for node in nodes:
+        yield node
+        yield from walk(node.children)
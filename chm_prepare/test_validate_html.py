@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка валидатора собранной справки: ошибки находятся и группируются по типам,
+а сценарий завершается с ненулевым кодом
+"""
+
+import os, sys
+import subprocess
+
+from validate_html import HtmlValidator
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+PAGE = '''<html><head><title>Страница</title><link type="text/css" href="default.css" rel="stylesheet" /></head>
+<body><h2 id="intro">Введение</h2><a name="old"></a>
+<a href="#intro">ok</a> <a href="#old">ok</a> <a href="#nope">якорь</a>
+<a href="other.htm#part">ok</a> <a href="other.htm#gone">якорь</a> <a href="Other.htm">регистр</a>
+<a href="missing.htm">файл</a> <a href="https://wiki.qsp.org/help:acts">абсолютная</a>
+<a href="https://example.com/x">внешняя</a> <a href="mailto:a@b.c">почта</a>
+<img src="pic.png" /> <img src="nopic.png" />
+</body></html>'''
+OTHER = '<html><body><p id="part">Часть</p></body></html>'
+HHC = '''<html><body><ul>
+<li><OBJECT type="text/sitemap"><param name="Name" value="Страница"><param name="Local" value="page.htm"></OBJECT>
+<li><OBJECT type="text/sitemap"><param name="Name" value="Нет"><param name="Local" value="absent.htm"></OBJECT>
+<li><OBJECT type="text/sitemap"><param name="Name" value="Якорь"><param name="Local" value="other.htm#none"></OBJECT>
+</ul></body></html>'''
+
+def make_site(folder):
+    (folder / 'page.htm').write_text(PAGE, encoding='utf-8')
+    (folder / 'other.htm').write_text(OTHER, encoding='utf-8')
+    (folder / 'default.css').write_text('body {}', encoding='utf-8')
+    (folder / 'pic.png').write_bytes(b'png')
+    (folder / 'qsp.hhc').write_text(HHC, encoding='windows-1251')
+    # служебные папки сборки не проверяются
+    os.makedirs(folder / '.fragment_cache')
+    (folder / '.fragment_cache' / 'x.htm').write_text('<a href="nothing.htm">', encoding='utf-8')
+
+def test_validator_groups_errors(tmp_path):
+    make_site(tmp_path)
+    validator = HtmlValidator(str(tmp_path), jobs=2)
+    errors = validator.run()
+    found = {error_type: sorted(error['ref'] for error in items) for error_type, items in errors.items()}
+    assert found == {
+        'missing_file': ['missing.htm', 'nopic.png'],
+        'case_mismatch': ['Other.htm'],
+        'missing_anchor': ['#nope', 'other.htm#gone'],
+        'absolute_link': ['https://wiki.qsp.org/help:acts'],
+        'toc_missing_file': ['absent.htm'],
+        'toc_missing_anchor': ['other.htm#none'],
+    }
+    assert validator.checked == 16
+
+    result = subprocess.run([sys.executable, os.path.join(HERE, 'validate_html.py'), str(tmp_path), '-j', '1'],
+                            capture_output=True, text=True, encoding='utf-8')
+    assert result.returncode == 1 and '(missing_anchor): 2' in result.stdout
+
+    (tmp_path / 'page.htm').write_text('<a href="other.htm#part">ok</a>', encoding='utf-8')
+    (tmp_path / 'qsp.hhc').write_text('<param name="Local" value="page.htm">', encoding='windows-1251')
+    assert HtmlValidator(str(tmp_path)).run() == {}
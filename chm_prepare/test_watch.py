@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка режима --watch: изменённая страница пересобирается меньше чем
+за секунду, серия записей даёт одну пересборку, а результат совпадает
+с полной сборкой изменённых исходников; при 'prune' новые страницы проходят
+отбор по достижимости
+"""
+
+import os
+import time
+import shutil
+import threading
+
+from to_chm_prepare import ChmPrepare
+from watch import BuildWatcher
+
+HTML_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'html_src')
+
+def preparat(src, out, **settings):
+    return ChmPrepare({'src_html_folder': str(src), 'out_html_folder': str(out),
+                       'start_file': str(src / 'start.html'), 'scheme': str(src / 'urls_links_to_files.json'),
+                       **settings})
+
+def read_outputs(folder):
+    return {name: (folder / name).read_bytes() for name in os.listdir(folder)
+            if name.endswith(('.htm', '.hhc', '.hhk', '.hhp'))}
+
+def edit(path, old, new):
+    text = path.read_text(encoding='utf-8')
+    assert old in text
+    path.write_text(text.replace(old, new), encoding='utf-8')
+
+def wait_rebuilds(watcher, count, timeout=5.0):
+    deadline = time.perf_counter() + timeout
+    while watcher.rebuilds < count:
+        assert time.perf_counter() < deadline, 'пересборка не дождалась'
+        time.sleep(0.01)
+
+def start_watcher(watcher, log):
+    stop = threading.Event()
+    thread = threading.Thread(target=watcher.run, args=(stop,))
+    thread.start()
+    while not log:
+        time.sleep(0.01)
+    return stop, thread
+
+def test_watch(tmp_path):
+    src, out = tmp_path / 'src', tmp_path / 'out'
+    shutil.copytree(HTML_SRC, src, ignore=shutil.ignore_patterns('images'))
+    log = []
+    watcher = BuildWatcher(preparat(src, out), log=log.append)
+    stop, thread = start_watcher(watcher, log)
+    try:
+        hhc = (out / 'qsp.hhc').read_bytes()
+
+        # правка страницы: пересобирается только она, быстрее секунды
+        edit(src / 'help_acts.html', 'Действия', 'Действия и кнопки')
+        changed_at = time.perf_counter()
+        wait_rebuilds(watcher, 1)
+        assert time.perf_counter() - changed_at < 1.0
+        assert 'Действия и кнопки' in (out / 'help_acts.htm').read_text(encoding='utf-8')
+        assert 'пересобрано 1: help_acts.htm' in log[-1]
+        assert (out / 'qsp.hhc').read_bytes() == hhc
+
+        # серия записей - одна пересборка
+        for name in ('help_goto.html', 'help_objs.html', 'help_main.html'):
+            (src / name).write_text((src / name).read_text(encoding='utf-8') + '\n', encoding='utf-8')
+            time.sleep(0.05)
+        wait_rebuilds(watcher, 2)
+        time.sleep(0.5)
+        assert watcher.rebuilds == 2 and 'пересобрано 3:' in log[-1]
+
+        # правка содержания пересобирает qsp.hhc из разобранной в памяти страницы
+        edit(src / 'sidebar.html', 'Вывод текста', 'Вывод на экран')
+        wait_rebuilds(watcher, 3)
+        assert (out / 'qsp.hhc').read_bytes() != hhc
+        assert not os.path.exists(out / 'sidebar.htm')
+
+        # отслеживаются стили, которые подключают страницы справки, - default.css в out_html_folder
+        (out / 'default.css').write_text('body { margin: 0; }', encoding='utf-8')
+        wait_rebuilds(watcher, 4)
+        assert 'пересобрано 1: default.css' in log[-1]
+    finally:
+        stop.set()
+        thread.join()
+
+    full = preparat(src, tmp_path / 'full')
+    assert full.prepare_html_files() == {}
+    full.prepare_navigation()
+    assert read_outputs(out) == read_outputs(tmp_path / 'full')
+
+def test_watch_prune(tmp_path):
+    src, out = tmp_path / 'src', tmp_path / 'out'
+    shutil.copytree(HTML_SRC, src, ignore=shutil.ignore_patterns('images'))
+    log = []
+    watcher = BuildWatcher(preparat(src, out, prune=True), log=log.append)
+    stop, thread = start_watcher(watcher, log)
+    try:
+        assert not os.path.exists(out / 'discussions.htm')
+
+        # новая страница, на которую нет ссылок, в сборку не попадает
+        shutil.copyfile(src / 'help_goto.html', src / 'playground_new.html')
+        wait_rebuilds(watcher, 1)
+        assert not os.path.exists(out / 'playground_new.htm')
+
+        # ссылка из справки делает страницу достижимой, её удаление - снова отбрасывает
+        edit(src / 'help_acts.html', '<div class="page group">',
+             '<div class="page group"><p><a href="/discussions">Обсуждения</a></p>')
+        wait_rebuilds(watcher, 2)
+        assert os.path.isfile(out / 'discussions.htm')
+        assert 'discussions.htm' in (out / 'qsp.hhp').read_text(encoding='windows-1251')
+        edit(src / 'help_acts.html', '<p><a href="/discussions">Обсуждения</a></p>', '')
+        wait_rebuilds(watcher, 3)
+        assert not os.path.exists(out / 'discussions.htm')
+    finally:
+        stop.set()
+        thread.join()
+
+    full = preparat(src, tmp_path / 'full', prune=True)
+    assert full.prepare_html_files() == {}
+    full.prepare_navigation()
+    assert read_outputs(out) == read_outputs(tmp_path / 'full')
@@ -1,8 +1,40 @@
-import os, json
-from bs4 import BeautifulSoup, Tag
+import os, sys, json, re
+import time
+import inspect
+import shutil
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from bs4 import BeautifulSoup, SoupStrainer, NavigableString, Tag
+from bs4.formatter import HTMLFormatter
 
 from urllib.parse import urljoin, urlparse, ParseResult
 
+# модули загрузчика вики (канонизация url, потоковый разбор, корпус, метрики) общие
+# с подготовкой: путь к ним добавляется здесь, до импорта модулей, которые их используют
+DOWNLOADER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'qsp_wiki_downloader')
+if DOWNLOADER_DIR not in sys.path:
+    sys.path.insert(0, DOWNLOADER_DIR)
+
+from build_manifest import BuildManifest, file_digest, text_digest
+import link_index
+from link_index import LinkIndex, output_name
+from reachability import LinkGraph
+import image_optimizer
+from image_optimizer import ImageOptimizer, output_image_name
+import search_index
+from search_index import SearchIndex, index_text, INDEX_VERSION
+import fragment_cache
+from fragment_cache import FragmentCache
+from validate_html import HtmlValidator, print_report
+from watch import BuildWatcher
+# модули загрузчика
+from run_metrics import RunMetrics, run_profiled
+from corpus_store import CorpusStore
+import crawl_frontier
+import toc_model
+from toc_model import toc_nodes, TocNode, write_navigation, write_project
+
 def json_load(path:str):
     with open(path, 'r', encoding='utf-8') as fp:
         return json.load(fp)
@@ -11,6 +43,10 @@ def read_file(path:str):
     with open(path, 'r', encoding='utf-8') as fp:
         return fp.read()
 
+def read_bytes(path:str):
+    with open(path, 'rb') as fp:
+        return fp.read()
+
 def write_file(path:str, text:str):
     with open(path, 'w', encoding='utf-8') as fp:
         return fp.write(text)
@@ -43,10 +79,70 @@ HHK_PAGE = '''<!DOCTYPE HTML PUBLIC "-//IETF//DTD HTML//EN">
 	<param name="FrameName" value="">
 </OBJECT></BODY></HTML>'''
 
+# страница поиска по search_index.json (клиент search.js)
+SEARCH_PAGE = '''<div class="page group">
+<h1>Поиск</h1>
+<form id="search-form"><input id="search-query" type="text" size="40" /> <input type="submit" value="Найти" /></form>
+<p id="search-status"></p>
+<ol id="search-results"></ol>
+</div>
+<script type="text/javascript" src="search.js"></script>
+<script type="text/javascript">QspSearch.attach('search_index.json', 'search-form', 'search-query', 'search-results', 'search-status');</script>'''
+
+# быстрый разбор: из страницы DokuWiki строится дерево только для области содержимого
+CONTENT_STRAINER = SoupStrainer('div', attrs={'class': re.compile(r'(^|\s)page(\s|$)')})
+TITLE_RE = re.compile(r'<title\b[^>]*>.*?</title\s*>', re.S | re.I)
+# метка отложенной ссылки в готовой странице: атрибут вместе с кавычками
+LINK_MARK = '\x00{}\x00'
+LINK_MARK_RE = re.compile(r'"\x00(\d+)\x00"')
+ATTR_FORMATTER = HTMLFormatter.REGISTRY['minimal']
+
+def fill_links(text:str, values:list) -> str:
+    """ Подстановка значений атрибутов вместо меток LINK_MARK """
+    return LINK_MARK_RE.sub(
+        lambda m: ATTR_FORMATTER.quoted_attribute_value(ATTR_FORMATTER.attribute_value(values[int(m.group(1))])),
+        text)
+
+class PageTemplate:
+    """ Шаблон страницы, разобранный один раз и заполняемый строками """
+
+    TITLE_MARK = '\x00title\x00'
+    BODY_MARK = '\x00body\x00'
+
+    def __init__(self, markup:str) -> None:
+        soup = BeautifulSoup(markup, 'lxml')
+        soup.title.replace_with(NavigableString(self.TITLE_MARK))
+        soup.body.append(NavigableString(self.BODY_MARK))
+        self.head, rest = str(soup).split(self.TITLE_MARK)
+        self.middle, self.tail = rest.split(self.BODY_MARK)
+
+    def render(self, title:str, body:str) -> str:
+        return f'{self.head}{title}{self.middle}{body}{self.tail}'
+
+# модули, от кода которых зависят выходные страницы: преобразование и движки разбора,
+# запись навигации, разрешение ссылок и канонизация url, имена изображений, индекс, кэш фрагментов
+TRANSFORM_MODULES = (toc_model, link_index, crawl_frontier, image_optimizer, search_index, fragment_cache)
+# настройки, от которых зависят выходные страницы
+TRANSFORM_SETTINGS = ('engine', 'base_url', 'hhc', 'hhk', 'prune', 'optimize_images', 'max_image_width',
+                      'search_index')
+
+def transform_hash(settings:dict) -> str:
+    """
+    Хэш кода преобразования, шаблонов и настроек, меняющих вывод:
+    при изменении любого из них пересобирается всё
+    """
+    sources = []
+    for path in (__file__, *(module.__file__ for module in TRANSFORM_MODULES)):
+        with open(path, 'r', encoding='utf-8') as fp:
+            sources.append(fp.read())
+    options = json.dumps({key: settings.get(key) for key in TRANSFORM_SETTINGS}, sort_keys=True)
+    return text_digest(*sources, CHM_PAGE, HHC_PAGE, HHK_PAGE, options)
+
 class ChmPrepare:
     """ Подготовка HTML-файлов к компиляции """
 
-    def __init__(self, settings:dict = None) -> None:
+    def __init__(self, settings:dict = None, scheme:dict = None) -> None:
+        """ scheme - готовая схема вместо файла (её пополняет конвейер обхода) """
 
         workdir = os.path.normpath(os.path.join(os.getcwd(), '..\\'))
         # подготавливаем настройки
@@ -57,7 +153,28 @@ class ChmPrepare:
             'scheme': os.path.join(workdir, 'html_src/urls_links_to_files.json'),
             'base_url': 'https://wiki.qsp.org',
             'hhc': 'sidebar.htm',
-            'hhk': 'help_keywords.htm'
+            'hhk': 'help_keywords.htm',
+            # заголовок и язык справки в проекте qsp.hhp
+            'title': 'QSP Help 5.9.2',
+            'language': '0x419 Русский (Россия)',
+            # пересобирать только изменившиеся файлы
+            'incremental': True,
+            # 'fast' - разбор только области содержимого, 'full' - всей страницы
+            'engine': 'fast',
+            # корпус SQLite загрузчика вместо папки html_src и файла схемы
+            'corpus': None,
+            # собирать только страницы, достижимые от start_file, hhc и hhk
+            'prune': False,
+            # оптимизировать изображения (нужен Pillow): PNG без потерь, WEBP -> PNG
+            'optimize_images': False,
+            # уменьшать изображения шире заданного числа пикселей
+            'max_image_width': None,
+            # строить полнотекстовый индекс search_index.json и клиент search.js
+            'search_index': False,
+            # кэш очищенных фрагментов страниц (только движок 'fast') и его лимиты
+            'fragment_cache': False,
+            'fragment_cache_size': 256 * 2**20,
+            'fragment_cache_entries': None
         }
         if settings: self.sets.update(settings)
 
@@ -68,38 +185,375 @@ class ChmPrepare:
         if not os.path.exists(self.out_html_folder):
             os.makedirs(self.out_html_folder)
 
-        self.files_pathes:list[str] = [] # Список файлов для преподготовки
+        # исходники из корпуса адресуются теми же путями, как если бы лежали в src_html_folder
+        self.corpus = None
+        if self.sets['corpus']:
+            self.corpus = CorpusStore(self.sets['corpus'], root=self.src_html_folder, readonly=True)
 
-        for f in os.listdir(self.src_html_folder):
-            rf = os.path.join(self.src_html_folder, f)
-            if os.path.isfile(rf) and os.path.splitext(rf)[1] == '.html':
-                self.files_pathes.append(rf)
+        self.files_pathes:list[str] = [] # Список файлов для преподготовки
 
-        self.hhc_src_path = os.path.join(self.out_html_folder, self.sets['hhc'])
-        self.hhc_dst_path = os.path.join(self.out_html_folder, 'qsp.hhc')
-        self.hhk_src_path = os.path.join(self.out_html_folder, self.sets['hhk'])
-        self.hhk_dst_path = os.path.join(self.out_html_folder, 'qsp.hhk')
+        if self.corpus is not None:
+            self.files_pathes = [rf for rf in self.corpus.list_files()
+                                 if os.path.splitext(rf)[1] == '.html']
+        else:
+            for f in os.listdir(self.src_html_folder):
+                rf = os.path.join(self.src_html_folder, f)
+                if os.path.isfile(rf) and os.path.splitext(rf)[1] == '.html':
+                    self.files_pathes.append(rf)
+
+        self.hhp_path = os.path.join(self.out_html_folder, 'qsp.hhp')
+        # страницы содержания и указателя: имя выходного файла -> файл навигации и его шаблон
+        self.toc_files = {self.sets['hhc']: ('qsp.hhc', HHC_PAGE), self.sets['hhk']: ('qsp.hhk', HHK_PAGE)}
+        # деревья, построенные текущей сборкой: 'qsp.hhc', 'qsp.hhk' -> пункты с адресами
+        self.navigation:dict[str, list] = {}
+        # их разобранные страницы (prepare_deferred) до подстановки ссылок: имя страницы -> фрагмент;
+        # по ним содержание и указатель пишутся заново при смене схемы без повторного разбора
+        self.toc_deferred:dict[str, dict] = {}
 
         self.base_url = self.sets['base_url']
 
-        # схема сборки
-        self.scheme = json_load(self.sets['scheme'])        
+        # имя изображения в справке: при оптимизации WEBP становится PNG
+        self.image_name = output_image_name if self.sets['optimize_images'] else None
 
-    def prepare_html_files(self):
-        """ Подготовка html-файлов к компиляции """
+        # схема сборки
+        if scheme is not None:
+            self.scheme = scheme
+            self.scheme_digest = None
+            self.link_index = LinkIndex(self.scheme, self.base_url, self.image_name)
+        else:
+            self.load_scheme()
+        # шаблон страницы chm: разбирается один раз
+        self.page_template = PageTemplate(CHM_PAGE)
+
+        # ошибки подготовки: путь к файлу -> текст ошибки
+        self.errors:dict[str, str] = {}
+        # ключи схемы, которые искались при подготовке текущего файла,
+        # и внутренние ссылки, которых в схеме нет
+        self._link_lookups:set = set()
+        self._unresolved:set = set()
+        # неразрешённые ссылки всей сборки: url -> страницы
+        self.unresolved_links:dict[str, list] = {}
+        self.build_stats = {'built': 0, 'skipped': 0, 'removed': 0, 'pruned': 0}
+        # отброшенное при 'prune': страницы и изображения
+        self.pruned:dict[str, list] = {}
+        # отчёт оптимизации изображений
+        self.images_report:dict = {}
+        # поисковый индекс текущей сборки (при 'search_index')
+        self.search:SearchIndex = None
+        # кэш фрагментов: полный движок заполняет шаблон разбором, его результат не кэшируется
+        self.fragments:FragmentCache = None
+        if self.sets['fragment_cache'] and self.sets['engine'] == 'fast':
+            self.fragments = FragmentCache(os.path.join(self.out_html_folder, '.fragment_cache'),
+                                           self.fragment_version(), self.sets['fragment_cache_size'],
+                                           self.sets['fragment_cache_entries'])
+        # хэши исходников текущей сборки
+        self._source_hashes:dict[str, str] = {}
+        # время этапов и отдельных файлов
+        self.metrics = RunMetrics()
+
+    def prepare_html_files(self, jobs:int = 1) -> dict:
+        """
+        Подготовка html-файлов к компиляции.
+        jobs > 1 - файлы обрабатываются параллельно в пуле процессов.
+        Ошибка в одном файле не прерывает сборку: возвращается словарь ошибок.
+        """
+        self.errors = {}
+        self._source_hashes = {}
+        started = time.perf_counter()
+        if self.sets['search_index']:
+            self.search = SearchIndex(os.path.join(self.out_html_folder, '.search_pages.json'))
+        if self.sets['prune']:
+            with self.metrics.timer('prune'):
+                self.prune_unreachable(jobs)
+        elif self.sets['optimize_images']:
+            # без отбора в справку идут все изображения схемы
+            with self.metrics.timer('images'):
+                self.prepare_images(set(self.link_index.images.values()), jobs)
+        with self.metrics.timer('select'):
+            manifest = self.open_manifest()
+            files_pathes, src_hashes = self.select_changed_files(manifest)
+
+        if jobs > 1 and len(files_pathes) > 1:
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                     initargs=(self.sets,)) as pool:
+                results = list(pool.map(_prepare_htm_worker, files_pathes,
+                                        chunksize=max(1, len(files_pathes) // (jobs * 4))))
+        else:
+            results = [_prepare_htm_safe(self, f) for f in files_pathes]
+
+        fragment_stats = {'hit': 0, 'miss': 0}
+        for file_path, error, info in results:
+            src_name = os.path.basename(file_path)
+            if error:
+                self.errors[file_path] = error
+                manifest.forget(src_name)
+            else:
+                manifest.update(src_name, src_hashes[file_path],
+                                os.path.basename(info['output']), info['link_keys'],
+                                info['unresolved'])
+                self.metrics.record_file(src_name, info['timings'])
+                self.metrics.count('bytes_read', info['bytes_read'])
+                self.metrics.count('bytes_written', info['bytes_written'])
+                if self.search is not None:
+                    self.search.update(os.path.basename(info['output']), src_hashes[file_path], info['search'])
+                if 'fragment_cache' in info:
+                    fragment_stats[info['fragment_cache']] += 1
+                if 'toc' in info:
+                    # дерево из процесса пула
+                    self.navigation[os.path.basename(info['output'])] = info['toc']
+                    self.toc_deferred[os.path.basename(self.output_path(file_path))] = info['deferred']
+                    self._report_unencodable(os.path.basename(info['output']), info['unencodable'])
+        if self.fragments is not None:
+            with self.metrics.timer('fragment_evict'):
+                self.build_stats['fragment_cache'] = {**fragment_stats, **self.fragments.evict()}
+            self.metrics.count('fragment_hits', fragment_stats['hit'])
+            self.metrics.count('fragment_misses', fragment_stats['miss'])
+        manifest.save()
+        self.save_unresolved_report(manifest)
+        if self.search is not None:
+            with self.metrics.timer('search_index'):
+                self.save_search_index(self.files_pathes)
+        self.build_stats['built'] = len(results) - len(self.errors)
+        self.metrics.wall_s += time.perf_counter() - started
+        return self.errors
+
+    def load_scheme(self) -> None:
+        """ Схема сборки из корпуса или файла и таблица разрешённых ссылок: строится один раз """
+        if self.corpus is not None:
+            self.scheme = self.corpus.load_scheme()
+            self.scheme_digest = self.link_digest(self.corpus.scheme_digest())
+        else:
+            self.scheme = json_load(self.sets['scheme'])
+            self.scheme_digest = self.link_digest(file_digest(self.sets['scheme']))
+        self.link_index = LinkIndex(self.scheme, self.base_url, self.image_name)
+
+    def open_manifest(self) -> BuildManifest:
+        return BuildManifest(
+            os.path.join(self.out_html_folder, '.build_manifest.json'),
+            transform_hash(self.sets), self.scheme_digest, self.link_index.lookup
+        )
+
+    def link_digest(self, scheme_digest:str) -> str:
+        """ Хэш схемы с учётом настроек, меняющих цели ссылок: при их смене страницы пересобираются """
+        if scheme_digest is not None and self.sets['optimize_images']:
+            return text_digest(scheme_digest, 'optimize_images')
+        return scheme_digest
+
+    def prune_unreachable(self, jobs:int = 1) -> dict:
+        """
+        Оставляет в сборке только страницы, достижимые по ссылкам от стартовой
+        страницы, содержания и указателя, и копирует в out_html_folder их изображения.
+        Отброшенное записывается в pruned.json; выходные файлы отброшенных страниц
+        удаляются как устаревшие.
+        """
+        graph, sources = self.link_graph()
+        roots = self.help_roots()
+        pages, images = graph.reachable(roots)
+
+        self.files_pathes = [f for name, f in sources.items() if name in pages]
+        self.pruned = {
+            'roots': [root for root in roots if root in sources],
+            'reachable': {'pages': len(pages), 'images': len(images)},
+            'pages': sorted(name for name in sources if name not in pages),
+            'images': sorted(set(self.link_index.images.values()) - images)
+        }
+        self.pruned['missing_images'] = self.prepare_images(images, jobs)
+        # изображения, скопированные прошлыми сборками и ставшие недостижимыми
+        for name in self.pruned['images']:
+            output_path = os.path.join(self.out_html_folder, name)
+            if os.path.isfile(output_path): os.remove(output_path)
+        with open(os.path.join(self.out_html_folder, 'pruned.json'), 'w', encoding='utf-8') as fp:
+            json.dump(self.pruned, fp, ensure_ascii=False, indent=4)
+        self.build_stats['pruned'] = len(self.pruned['pages'])
+        self.build_stats['graph_parsed'] = graph.parsed
+        return self.pruned
+
+    def link_graph(self) -> tuple:
+        """
+        Граф ссылок страниц сборки, рёбра кэшируются в .link_graph.json:
+        (граф, имя выходного файла -> исходник)
+        """
+        graph = LinkGraph(self.link_index, os.path.join(self.out_html_folder, '.link_graph.json'),
+                          self.scheme_digest)
+        sources = {}
         for f in self.files_pathes:
-            self.prepare_htm(f)
-
-    def prepare_htm(self, file_path:str):
-        """ Подготовка отдельного htm файла к публикации """
-
-        # извлекаем имена
+            name = os.path.basename(self.output_path(f))
+            sources[name] = f
+            graph.add_page(name, self.source_digest(f), lambda f=f: self.read_source(f))
+        graph.save()
+        return graph, sources
+
+    def help_roots(self) -> list:
+        """ Корни справки: стартовая страница, содержание и указатель """
+        return [os.path.basename(self.output_path(self.sets['start_file'])), self.sets['hhc'], self.sets['hhk']]
+
+    def prepare_images(self, names, jobs:int = 1) -> list:
+        """
+        Изображения справки: копируются или, при 'optimize_images', оптимизируются
+        в out_html_folder. names - имена в справке; возвращает ненайденные.
+        """
+        if not self.sets['optimize_images']:
+            return self.copy_images(names)
+        sources, missing = self.image_sources(names)
+        optimizer = ImageOptimizer(os.path.join(self.out_html_folder, '.image_cache'), jobs=jobs,
+                                   max_width=self.sets['max_image_width'])
+        self.images_report = optimizer.run(sources, self.out_html_folder)
+        self.images_report['missing'] = missing
+        with open(os.path.join(self.out_html_folder, 'images_report.json'), 'w', encoding='utf-8') as fp:
+            json.dump(self.images_report, fp, ensure_ascii=False, indent=4)
+        self.metrics.count('image_bytes_in', self.images_report['bytes_in'])
+        self.metrics.count('image_bytes_saved', self.images_report['bytes_saved'])
+        return missing
+
+    def image_sources(self, names):
+        """
+        Исходники изображений по именам в справке:
+        (имя исходника -> функция чтения содержимого, ненайденные имена)
+        """
+        # имя в справке -> имя исходника (у сконвертированных они различаются)
+        src_names = {}
+        if self.image_name:
+            src_names = {self.image_name(output_name(path)): output_name(path)
+                         for path in self.scheme.get('images', {}).values()}
+        sources, missing = {}, []
+        for name in sorted(names):
+            src_name = src_names.get(name, name)
+            src_path = os.path.join(self.src_html_folder, 'images', src_name)
+            if self.corpus is not None and self.corpus.exists(src_path):
+                sources[src_name] = lambda p=src_path: self.corpus.read_file(p)
+            elif self.corpus is None and os.path.isfile(src_path):
+                sources[src_name] = lambda p=src_path: read_bytes(p)
+            else:
+                missing.append(name)
+        return sources, missing
+
+    def copy_images(self, names) -> list:
+        """ Копирует изображения из папки images исходников; возвращает ненайденные """
+        missing = []
+        for name in sorted(names):
+            src_path = os.path.join(self.src_html_folder, 'images', name)
+            dst_path = os.path.join(self.out_html_folder, name)
+            if self.corpus is not None:
+                if not self.corpus.exists(src_path):
+                    missing.append(name)
+                elif not (os.path.isfile(dst_path) and os.path.getsize(dst_path) == self.corpus.file_size(src_path)):
+                    with open(dst_path, 'wb') as fp:
+                        fp.write(self.corpus.read_file(src_path))
+            elif not os.path.isfile(src_path):
+                missing.append(name)
+            elif not (os.path.isfile(dst_path) and os.path.getsize(dst_path) == os.path.getsize(src_path)):
+                shutil.copyfile(src_path, dst_path)
+        return missing
+
+    def save_search_index(self, files_pathes:list) -> None:
+        """ search_index.json по страницам сборки, клиент search.js и страница поиска search.htm """
+        # содержание и указатель сами в справку не входят: из них строятся qsp.hhc и qsp.hhk
+        service = {self.sets['hhc'], self.sets['hhk']}
+        self.search.retain(name for name in (os.path.basename(self.output_path(f)) for f in files_pathes)
+                           if name not in service)
+        self.search.save()
+        index = self.search.write(os.path.join(self.out_html_folder, 'search_index.json'))
+        shutil.copyfile(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'search.js'),
+                        os.path.join(self.out_html_folder, 'search.js'))
+        write_file(os.path.join(self.out_html_folder, 'search.htm'),
+                   self.page_template.render('<title>Поиск</title>', SEARCH_PAGE))
+        self.build_stats['indexed_terms'] = len(index['terms'])
+
+    def validate(self, jobs:int = 1) -> dict:
+        """ Проверка собранной справки (validate_html.py); ошибки по типам пишутся в validation.json """
+        with self.metrics.timer('validate'):
+            validator = HtmlValidator(self.out_html_folder, self.base_url, jobs)
+            invalid = validator.run()
+        self.build_stats['validated_refs'] = validator.checked
+        with open(os.path.join(self.out_html_folder, 'validation.json'), 'w', encoding='utf-8') as fp:
+            json.dump(invalid, fp, ensure_ascii=False, indent=4)
+        return invalid
+
+    def save_unresolved_report(self, manifest:BuildManifest) -> None:
+        """ Отчёт о неразрешённых ссылках по всей сборке, включая пропущенные файлы """
+        self.unresolved_links = manifest.unresolved_links()
+        with open(os.path.join(self.out_html_folder, 'unresolved_links.json'), 'w', encoding='utf-8') as fp:
+            json.dump(self.unresolved_links, fp, ensure_ascii=False, indent=4)
+
+    def select_changed_files(self, manifest:BuildManifest):
+        """
+        Отбирает файлы, которые нужно пересобрать, и удаляет выходные
+        файлы исходников, которых больше нет.
+        """
+        src_hashes = {f: self.source_digest(f) for f in self.files_pathes}
+
+        stale = manifest.stale_outputs({os.path.basename(f) for f in self.files_pathes})
+        for output_name in stale:
+            output_path = os.path.join(self.out_html_folder, output_name)
+            if os.path.isfile(output_path): os.remove(output_path)
+        self.build_stats['removed'] = len(stale)
+
+        if not self.sets['incremental']:
+            return list(self.files_pathes), src_hashes
+
+        changed = [f for f in self.files_pathes
+                   if not manifest.is_up_to_date(os.path.basename(f), src_hashes[f], self.target_path(f))
+                   or (self.search is not None and not self.is_toc(f)
+                       and not self.search.is_indexed(os.path.basename(self.output_path(f)), src_hashes[f]))]
+        self.build_stats['skipped'] = len(self.files_pathes) - len(changed)
+        return changed, src_hashes
+
+    def read_source(self, file_path:str) -> str:
+        """ Текст исходного html: из корпуса или с диска """
+        if self.corpus is not None:
+            return self.corpus.read_file(file_path).decode('utf-8')
+        return read_file(file_path)
+
+    def source_digest(self, file_path:str) -> str:
+        """ Хэш исходного html; в корпусе он уже посчитан, файлы хэшируются раз за сборку """
+        if self.corpus is not None:
+            return self.corpus.file_hash(file_path)
+        digest = self._source_hashes.get(file_path)
+        if digest is None:
+            digest = self._source_hashes[file_path] = file_digest(file_path)
+        return digest
+
+    def source_size(self, file_path:str) -> int:
+        if self.corpus is not None:
+            return self.corpus.file_size(file_path)
+        return os.path.getsize(file_path)
+
+    def output_path(self, file_path:str) -> str:
+        """ Путь к выходному htm-файлу для исходного html """
         file_name = os.path.splitext(os.path.basename(file_path))[0]
-        output_path = os.path.join(self.out_html_folder, f'{file_name}.htm')
+        return os.path.join(self.out_html_folder, f'{file_name}.htm')
+
+    def is_toc(self, file_path:str) -> bool:
+        """ Страница содержания или указателя: из неё строится qsp.hhc или qsp.hhk """
+        return os.path.basename(self.output_path(file_path)) in self.toc_files
+
+    def target_path(self, file_path:str) -> str:
+        """ Файл, который собирается из исходника: htm-страница, qsp.hhc или qsp.hhk """
+        name = os.path.basename(self.output_path(file_path))
+        if name in self.toc_files:
+            return os.path.join(self.out_html_folder, self.toc_files[name][0])
+        return self.output_path(file_path)
+
+    def prepare_htm(self, file_path:str) -> dict:
+        """
+        Подготовка отдельного htm файла к публикации.
+        Возвращает путь к результату и ключи схемы, по которым разрешались ссылки.
+        """
+
+        if self.fragments is not None:
+            return self.prepare_cached(file_path)
+        if self.is_toc(file_path):
+            return self.prepare_toc(file_path)
+        # извлекаем имена
+        output_path = self.output_path(file_path)
+        self._link_lookups = set()
+        self._unresolved = set()
 
-        soup = BeautifulSoup(read_file(file_path), 'lxml')
         # извлекаем страницу
-        page = soup.select('div.page.group')[0]
+        started = time.perf_counter()
+        html = self.read_source(file_path)
+        page, title = self.parse_page(html)
+        parsed = time.perf_counter()
         # удаляем ненужные элементы
         for el in page.select('div#dw__toc'): el.decompose()
         for el in page.select('dic.docInfo'): el.decompose()
@@ -109,107 +563,392 @@ class ChmPrepare:
 
         # извлекаем изображения
         self.extract_images(page)
+        rewritten = time.perf_counter()
+        search = self.index_page(page, title)
+        indexed = time.perf_counter()
+
+        output = self.render_page(page, title)
+        serialized = time.perf_counter()
+        write_file(output_path, output)
+        finished = time.perf_counter()
+        return {
+            'output': output_path,
+            'search': search,
+            'link_keys': sorted(self._link_lookups),
+            'unresolved': sorted(self._unresolved),
+            'timings': {
+                'parse': parsed - started,
+                'rewrite': rewritten - parsed,
+                'index': indexed - rewritten,
+                'serialize': serialized - indexed,
+                'write': finished - serialized
+            },
+            'bytes_read': self.source_size(file_path),
+            'bytes_written': os.path.getsize(output_path)
+        }
 
-        new_soup = BeautifulSoup(CHM_PAGE, 'lxml')
-        new_soup.body.append(page)
-        new_soup.title.replace_with(soup.title)
-
-        write_file(output_path, str(new_soup))
+    def prepare_toc(self, file_path:str) -> dict:
+        """
+        Страница содержания или указателя: разбор и очистка те же, что у
+        остальных страниц, но вместо htm-файла из дерева её списка
+        пишется qsp.hhc или qsp.hhk (см. finish_deferred).
+        """
+        deferred = self.prepare_deferred(self.read_source(file_path), toc=True)
+        info = self.finish_deferred(deferred, self.output_path(file_path))
+        info['bytes_read'] = self.source_size(file_path)
+        return info
+
+    def prepare_cached(self, file_path:str) -> dict:
+        """
+        prepare_htm через кэш фрагментов. Разбор и очистка выполняются только
+        при промахе, при попадании - заполнение шаблона и подстановка ссылок.
+        Результат совпадает с prepare_htm.
+        """
+        started = time.perf_counter()
+        src_hash = self.source_digest(file_path)
+        toc = self.is_toc(file_path)
+        deferred = self.fragments.get(src_hash)
+        if deferred is not None and toc == ('toc' in deferred):
+            deferred['timings'] = {'cache_read': time.perf_counter() - started}
+        else:
+            deferred = self.prepare_deferred(self.read_source(file_path), toc=toc)
+            self.fragments.put(src_hash, {key: value for key, value in deferred.items() if key != 'timings'})
+        info = self.finish_deferred(deferred, self.output_path(file_path))
+        info['fragment_cache'] = 'hit' if 'cache_read' in deferred['timings'] else 'miss'
+        info['bytes_read'] = 0 if info['fragment_cache'] == 'hit' else self.source_size(file_path)
+        return info
+
+    def fragment_version(self) -> str:
+        """ Версия очистки страниц: код разбора и очистки и настройки, от которых зависит фрагмент """
+        code = [inspect.getsource(method) for method in
+                (ChmPrepare.parse_page, ChmPrepare.prepare_deferred, ChmPrepare.index_page, toc_nodes)]
+        return text_digest(*code, str(INDEX_VERSION), self.sets['engine'], self.base_url,
+                           str(self.sets['search_index']))
+
+    def parse_page(self, html:str, content:str = None):
+        """
+        Разбор страницы DokuWiki: область содержимого и заголовок.
+        content - уже найденный в html фрагмент div.page.group (быстрый движок).
+        """
+        if self.sets['engine'] == 'full':
+            soup = BeautifulSoup(html, 'lxml')
+            return soup.select('div.page.group')[0], soup.title
+
+        # разбираем только div.page.group, заголовок - отдельно по регулярке
+        soup = BeautifulSoup(html if content is None else content, 'lxml', parse_only=CONTENT_STRAINER)
+        page = soup.select('div.page.group')[0]
+        match = TITLE_RE.search(html)
+        title = BeautifulSoup(match.group(0), 'lxml').title if match else None
+        return page, title
+
+    def index_page(self, page:Tag, title:Tag):
+        """ Запись страницы для поискового индекса или None, если индекс не строится """
+        if not self.sets['search_index']:
+            return None
+        return index_text(title.get_text() if title else '', page.get_text(' '))
+
+    def render_page(self, page:Tag, title:Tag) -> str:
+        """ Страница chm: шаблон с заголовком и содержимым """
+        if self.sets['engine'] == 'full':
+            new_soup = BeautifulSoup(CHM_PAGE, 'lxml')
+            new_soup.body.append(page)
+            new_soup.title.replace_with(title)
+            return str(new_soup)
+        return self.page_template.render(str(title) if title else '<title></title>', str(page))
 
     def extract_images(self, el:Tag):
         """ Извлечение изображений """
         for img in el.find_all('img', src=True):
-            src = img['src']
-            if src.startswith('https://wiki.qsp.org'):
-                img['src'] = self.replace_href(src, scheme_type='images')
+            img['src'] = self._resolve(self.link_index.resolve_image(img['src']), 'images')
 
     def replace_links(self, el):
         """ Замена ссылок на внутренние, используя схему """
         for link in el.find_all('a', href=True):
-            href = link['href']
-
-            href = str(urljoin(self.base_url, href))
-            if href.startswith('https://wiki.qsp.org'):
-                href = self.replace_href(href, '#')
-                href = self.replace_href(href, '?')
-                href = href.replace('.html', '.htm')
-            else:
+            href, key, _ = resolved = self.link_index.resolve_link(link['href'])
+            if key is None and not href.startswith('#'):
                 link['target'] = '_blank'
-
-            link['href'] = href
-
-    def replace_href(self, href:str, splitter:str = '', scheme_type:str = 'pages') -> str:
-        """ Замена ссылки на схематозную. """
-        hash_taged = href.split(splitter)
-        if len(hash_taged)>1:      
-            if hash_taged[0] in self.scheme[scheme_type]:
-                hash_taged[0] = os.path.split(self.scheme[scheme_type][hash_taged[0]])[-1]
-                href = f'{hash_taged[0]}{splitter}{hash_taged[1]}'
-        elif href in self.scheme[scheme_type]:
-            href = os.path.split(self.scheme[scheme_type][href])[-1]
-
+            link['href'] = self._resolve(resolved, 'pages')
+
+    def _resolve(self, resolved:tuple, scheme_type:str) -> str:
+        """ Учёт результата разрешения ссылки для манифеста и отчёта """
+        href, key, found = resolved
+        if key is not None:
+            self._link_lookups.add((scheme_type, key))
+            if not found: self._unresolved.add(key)
         return href
 
-    def prepare_hhc(self) -> None:
-        """ Подготовка hhc файла """
-
-        soup = BeautifulSoup(read_file(self.hhc_src_path), 'lxml')
-        ul = soup.select('div.page.group')[0].ul
-
-        self.hhc_ul_rebuild_li(ul, soup)
-        
-        new_soup = BeautifulSoup(HHC_PAGE, 'lxml')
-        new_soup.body.append(ul)
-
-        with open(self.hhc_dst_path, 'w', encoding='windows-1251') as fp:
-            fp.write(str(new_soup))
-        os.remove(self.hhc_src_path)
-
-    def hhc_ul_rebuild_li(self, ul:Tag, soup:BeautifulSoup):
-        """ Перестройка ul """
-        for li in ul.select('li'):
-            del li['class']
-            div = li.div
-            del div['class']
-            div.name = 'OBJECT'
-            div['type'] = 'text/sitemap'
-            for el in div.select('strong'):
-                el.unwrap()
-            anchors = div.select('a')
-            if anchors:
-                a = anchors[0]
-                name = a.string
-                href = a['href']
-                param_name = soup.new_tag('param',  attrs={'name':'Name', 'value':name})
-                param_local = soup.new_tag('param', attrs={'name':'Local', 'value':href})
-                div.clear()
-                div.extend([param_name, param_local])
-            else:
-                name = str(div.text).strip()
-                param_name = soup.new_tag('param',  attrs={'name':'Name', 'value':name})
-                div.clear()
-                div.append(param_name)
-
-    def prepare_hhk(self):
-        """ Подготавливает файл указателя. """
-        soup = BeautifulSoup(read_file(self.hhk_src_path), 'lxml')
-        ul = soup.select('div.page.group')[0].ul
+    def prepare_deferred(self, html:str, content:str = None, toc:bool = False) -> dict:
+        """
+        Подготовка страницы до того, как известна схема: разбор и очистка
+        те же, что в prepare_htm, а href ссылок и src изображений заменяются
+        метками. Подставляет их finish_deferred - без повторного разбора.
+        toc - страница содержания или указателя: из разобранного списка
+        заодно строится дерево пунктов (toc_model.toc_nodes).
+        """
+        started = time.perf_counter()
+        page, title = self.parse_page(html, content)
+        parsed = time.perf_counter()
+        for el in page.select('div#dw__toc'): el.decompose()
+        for el in page.select('dic.docInfo'): el.decompose()
+        for el in page.select('script'): el.decompose()
+        links = []
+        for link in page.find_all('a', href=True):
+            # внешняя ли ссылка, от схемы не зависит
+            href, key, _ = self.link_index.resolve_link(link['href'])
+            if key is None and not href.startswith('#'):
+                link['target'] = '_blank'
+            links.append(('pages', link['href']))
+            link['href'] = LINK_MARK.format(len(links) - 1)
+        for img in page.find_all('img', src=True):
+            links.append(('images', img['src']))
+            img['src'] = LINK_MARK.format(len(links) - 1)
+        if toc:
+            tree = {'toc': [node.to_json() for node in toc_nodes(page)]}
+        else:
+            tree = {}
+        rewritten = time.perf_counter()
+        search = self.index_page(page, title)
+        indexed = time.perf_counter()
+        if self.sets['engine'] == 'fast':
+            # шаблон заполняется в finish_deferred: фрагмент от шаблона не зависит
+            rendered = {'title': str(title) if title else '<title></title>', 'body': str(page)}
+        else:
+            rendered = {'output': self.render_page(page, title)}
+        return {
+            **rendered,
+            **tree,
+            'links': links,
+            'search': search,
+            'timings': {
+                'parse': parsed - started,
+                'rewrite': rewritten - parsed,
+                'index': indexed - rewritten,
+                'serialize': time.perf_counter() - indexed
+            }
+        }
 
-        self.hhc_ul_rebuild_li(ul, soup)
-        
-        new_soup = BeautifulSoup(HHK_PAGE, 'lxml')
-        new_soup.body.append(ul)
+    def finish_deferred(self, deferred:dict, output_path:str, partial:bool = False):
+        """
+        Подставляет в страницу ссылки по текущей схеме и записывает её.
+        partial - не записывать, если какая-то внутренняя ссылка ещё не разрешается
+        (цель может появиться позже); тогда возвращается None.
+        """
+        started = time.perf_counter()
+        self._link_lookups = set()
+        self._unresolved = set()
+        values = []
+        for scheme_type, value in deferred['links']:
+            if scheme_type == 'pages':
+                resolved = self.link_index.resolve_link(value)
+            else:
+                resolved = self.link_index.resolve_image(value)
+            if partial and not resolved[2]:
+                return None
+            values.append(self._resolve(resolved, scheme_type))
+        if 'toc' in deferred:
+            return self.finish_toc(deferred, output_path, values, started)
+        if 'output' in deferred:
+            output = deferred['output']
+        else:
+            output = self.page_template.render(deferred['title'], deferred['body'])
+        output = fill_links(output, values)
+        resolved = time.perf_counter()
+        write_file(output_path, output)
+        return {
+            'output': output_path,
+            'search': deferred['search'],
+            'link_keys': sorted(self._link_lookups),
+            'unresolved': sorted(self._unresolved),
+            'timings': {
+                **deferred['timings'],
+                'link_pass': resolved - started,
+                'write': time.perf_counter() - resolved
+            },
+            'bytes_written': os.path.getsize(output_path)
+        }
 
-        with open(self.hhk_dst_path, 'w', encoding='windows-1251') as fp:
-            fp.write(str(new_soup))
-        os.remove(self.hhk_src_path)
+    def finish_toc(self, deferred:dict, output_path:str, values:list, started:float) -> dict:
+        """
+        Страница содержания или указателя не записывается: её дерево
+        с подставленными адресами сразу пишется в qsp.hhc или qsp.hhk.
+        """
+        name, template = self.toc_files[os.path.basename(output_path)]
+        nodes = [TocNode.from_json(node).resolved(values) for node in deferred['toc']]
+        resolved = time.perf_counter()
+        path = os.path.join(self.out_html_folder, name)
+        replaced = write_navigation(path, template, nodes)
+        self.navigation[name] = nodes
+        self._report_unencodable(name, replaced)
+        return {
+            'output': path,
+            'toc': nodes,
+            'deferred': {key: value for key, value in deferred.items() if key != 'timings'},
+            'unencodable': replaced,
+            'search': deferred['search'],
+            'link_keys': sorted(self._link_lookups),
+            'unresolved': sorted(self._unresolved),
+            'timings': {
+                **deferred['timings'],
+                'link_pass': resolved - started,
+                'write': time.perf_counter() - resolved
+            },
+            'bytes_written': os.path.getsize(path)
+        }
 
+    def prepare_navigation(self) -> None:
+        """
+        Проект qsp.hhp: настройки и список страниц справки - достижимых по ссылкам
+        от стартовой страницы, содержания и указателя (служебные страницы вики и
+        песочница в [FILES] не попадают). qsp.hhc и qsp.hhk к этому времени
+        уже записаны подготовкой их страниц.
+        """
+        started = time.perf_counter()
+        if self.sets['prune']:
+            # сборка уже отобрана по достижимости
+            pages = {os.path.basename(self.output_path(f)) for f in self.files_pathes}
+        else:
+            graph, _ = self.link_graph()
+            pages, _ = graph.reachable(self.help_roots())
+        files = pages - set(self.toc_files)
+        if self.sets['search_index']:
+            # search_index.json загружается скриптом, сам компилятор его не найдёт
+            files |= {'search.htm', 'search.js', 'search_index.json'}
+        contents, index = (self.toc_files[self.sets[key]][0] for key in ('hhc', 'hhk'))
+        options = {
+            'Compatibility': '1.1 or later',
+            'Compiled file': 'qsp.chm',
+            'Contents file': contents,
+            'Default topic': os.path.basename(self.output_path(self.sets['start_file'])),
+            'Display compile progress': 'No',
+            'Full-text search': 'Yes',
+            'Index file': index,
+            'Language': self.sets['language'],
+            'Title': self.sets['title']
+        }
+        replaced = write_project(self.hhp_path, options, sorted(files))
+        self._report_unencodable(os.path.basename(self.hhp_path), replaced)
+        self._record_step('hhp', started)
+
+    def _report_unencodable(self, name:str, replaced:list) -> None:
+        """ Строки файла навигации с символами вне windows-1251 - в build_stats['unencodable'] """
+        unencodable = self.build_stats.setdefault('unencodable', {})
+        if replaced:
+            unencodable[name] = replaced
+        else:
+            unencodable.pop(name, None)
+
+    def _record_step(self, stage:str, started:float) -> None:
+        """ Время шага сборки в метрики """
+        elapsed = time.perf_counter() - started
+        self.metrics.add_time(stage, elapsed)
+        self.metrics.wall_s += elapsed
+
+
+# экземпляр ChmPrepare в процессе пула: схема загружается один раз на процесс
+_worker_preparat:ChmPrepare = None
+
+def _init_worker(settings:dict) -> None:
+    global _worker_preparat
+    _worker_preparat = ChmPrepare(settings)
+
+def _prepare_htm_worker(file_path:str):
+    return _prepare_htm_safe(_worker_preparat, file_path)
+
+def _prepare_htm_safe(preparat:ChmPrepare, file_path:str):
+    """ Подготовка файла с перехватом ошибки: (путь, текст ошибки или None, сведения о результате) """
+    try:
+        return file_path, None, preparat.prepare_htm(file_path)
+    except Exception:
+        return file_path, traceback.format_exc(), None
+
+def parse_args(argv=None):
+    """ Разбор аргументов командной строки """
+    parser = argparse.ArgumentParser(description='Подготовка html-файлов к сборке chm')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='число процессов для обработки файлов (по умолчанию 1)')
+    parser.add_argument('--force', action='store_true',
+                        help='пересобрать все файлы, не глядя на манифест сборки')
+    parser.add_argument('--engine', choices=('fast', 'full'), default='fast',
+                        help='fast - разбор только области содержимого, full - всей страницы')
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='сохранить метрики этапов и файлов в FILE (.json или .csv)')
+    parser.add_argument('--corpus', metavar='FILE',
+                        help='брать исходники и схему из корпуса SQLite загрузчика')
+    parser.add_argument('--prune', action='store_true',
+                        help='собрать только страницы и изображения, достижимые от стартовой страницы, содержания и указателя')
+    parser.add_argument('--optimize-images', action='store_true',
+                        help='оптимизировать изображения (нужен Pillow): PNG без потерь, WEBP -> PNG')
+    parser.add_argument('--max-image-width', type=int, metavar='PX',
+                        help='при --optimize-images уменьшать изображения шире PX пикселей')
+    parser.add_argument('--search', action='store_true',
+                        help='построить поисковый индекс search_index.json и страницу поиска search.htm')
+    parser.add_argument('--fragment-cache', action='store_true',
+                        help='кэшировать очищенные фрагменты страниц между сборками')
+    parser.add_argument('--fragment-cache-size', type=int, default=256, metavar='MB',
+                        help='предельный размер кэша фрагментов в мегабайтах')
+    parser.add_argument('--validate', action='store_true',
+                        help='после сборки проверить ссылки, изображения, якоря, qsp.hhc и qsp.hhk')
+    parser.add_argument('--watch', action='store_true',
+                        help='следить за html_src и пересобирать только изменившиеся файлы')
+    parser.add_argument('--profile', metavar='FILE', nargs='?', const='prepare.prof',
+                        help='выполнить сборку под cProfile и сохранить статистику (по умолчанию prepare.prof)')
+    return parser.parse_args(argv)
+
+def build(preparat:ChmPrepare, jobs:int) -> dict:
+    """ Полная сборка: страницы, содержание и указатель, проект qsp.hhp """
+    errors = preparat.prepare_html_files(jobs=jobs)
+    stats = preparat.build_stats
+    print(f"Собрано: {stats['built']}, без изменений: {stats['skipped']}, удалено устаревших: {stats['removed']}")
+    if preparat.sets['prune']:
+        print(f"Недостижимо и не собрано: страниц {stats['pruned']}, изображений {len(preparat.pruned['images'])} (см. pruned.json)")
+    if 'fragment_cache' in stats:
+        cache = stats['fragment_cache']
+        print(f"Кэш фрагментов: попаданий {cache['hit']}, промахов {cache['miss']}, "
+              f"записей {cache['entries']} ({cache['bytes'] // 1024} КБ), вытеснено {cache['evicted']}")
+    if preparat.images_report:
+        report = preparat.images_report
+        print(f"Изображений: {report['images']}, обработано: {report['processed']}, из кэша: {report['cached']}, "
+              f"сэкономлено байт: {report['bytes_saved']} (см. images_report.json)")
+    if preparat.unresolved_links:
+        print(f'Неразрешённых внутренних ссылок: {len(preparat.unresolved_links)} (см. unresolved_links.json)')
+    preparat.prepare_navigation()
+    for name, lines in preparat.build_stats.get('unencodable', {}).items():
+        print(f"{name}: символы вне windows-1251 записаны числовыми ссылками или '?': {', '.join(lines[:5])}")
+    return errors
 
 def main():
-    preparat = ChmPrepare()
-    preparat.prepare_html_files()
-    preparat.prepare_hhc()
-    preparat.prepare_hhk()
+    args = parse_args()
+    preparat = ChmPrepare({'incremental': not args.force, 'engine': args.engine, 'corpus': args.corpus,
+                           'prune': args.prune, 'optimize_images': args.optimize_images,
+                           'max_image_width': args.max_image_width, 'search_index': args.search,
+                           'fragment_cache': args.fragment_cache,
+                           'fragment_cache_size': args.fragment_cache_size * 2**20})
+    if args.watch:
+        try:
+            BuildWatcher(preparat).run()
+        except KeyboardInterrupt:
+            print('\nСлежение остановлено')
+        return
+    if args.profile:
+        # при --jobs > 1 в профиль попадает только основной процесс
+        errors = run_profiled(lambda: build(preparat, args.jobs), args.profile)
+    else:
+        errors = build(preparat, args.jobs)
+    invalid = {}
+    if args.validate:
+        invalid = preparat.validate(args.jobs)
+        print_report(invalid, preparat.build_stats['validated_refs'])
+    if args.metrics:
+        preparat.metrics.save(args.metrics)
+        print(f'Метрики сохранены в {args.metrics}')
+
+    if errors:
+        print(f'Не удалось подготовить файлов: {len(errors)}')
+        for file_path, error in errors.items():
+            print(f'--- {file_path}')
+            print(error)
+    if errors or invalid:
+        raise SystemExit(1)
 
 if __name__=="__main__":
     main()
\ No newline at end of file
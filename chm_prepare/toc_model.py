@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Модель содержания и указателя справки и запись qsp.hhc, qsp.hhk и qsp.hhp.
+Дерево строится из страниц содержания и указателя во время их обычной
+подготовки (ChmPrepare.prepare_deferred), файлы навигации пишутся из него
+потоково: без промежуточных htm-файлов и повторного разбора.
+"""
+
+import re
+import html
+
+from bs4 import Tag
+
+# кодировка файлов навигации: её ждёт компилятор HTML Help для русской справки
+NAVIGATION_ENCODING = 'windows-1251'
+LINK_MARK_RE = re.compile(r'\x00(\d+)\x00')
+
+class TocNode:
+    """
+    Пункт содержания или указателя: название, ссылка и вложенные пункты.
+    link - номер ссылки в странице-источнике до подстановки ссылок
+    (ChmPrepare.finish_deferred) и адрес в справке после неё.
+    """
+
+    def __init__(self, name:str, link = None, children:list = None) -> None:
+        self.name = name
+        self.link = link
+        self.children:list[TocNode] = children or []
+
+    def to_json(self) -> list:
+        return [self.name, self.link, [child.to_json() for child in self.children]]
+
+    @classmethod
+    def from_json(cls, data:list) -> 'TocNode':
+        name, link, children = data
+        return cls(name, link, [cls.from_json(child) for child in children])
+
+    def resolved(self, values:list) -> 'TocNode':
+        """ Копия дерева с адресами вместо номеров ссылок """
+        return TocNode(self.name, None if self.link is None else values[self.link],
+                       [child.resolved(values) for child in self.children])
+
+def toc_nodes(page:Tag) -> list:
+    """
+    Дерево первого списка ul области содержимого. Ссылки страницы
+    уже заменены метками LINK_MARK, поэтому пункт хранит номер ссылки.
+    """
+    def walk(ul:Tag) -> list:
+        nodes = []
+        for li in ul.children:
+            if li.name != 'li':
+                continue
+            # пункт DokuWiki: <li><div class="li">...</div><ul>...</ul></li>, один проход по детям
+            div = child = None
+            for el in li.children:
+                if el.name == 'div' and div is None:
+                    div = el
+                elif el.name == 'ul' and child is None:
+                    child = el
+            anchor = div.find('a') if div is not None else None
+            if anchor is not None:
+                mark = LINK_MARK_RE.fullmatch(anchor.get('href', ''))
+                text = anchor.string
+                node = TocNode(str(text) if text is not None else anchor.get_text(),
+                               int(mark.group(1)) if mark else None)
+            else:
+                node = TocNode((div or li).get_text().strip())
+            if child is not None:
+                node.children = walk(child)
+            nodes.append(node)
+        return nodes
+
+    ul = page.find('ul')
+    return walk(ul) if ul is not None else []
+
+def encodable(text:str) -> bool:
+    try:
+        text.encode(NAVIGATION_ENCODING)
+    except UnicodeEncodeError:
+        return False
+    return True
+
+def write_navigation(path:str, template:str, nodes:list) -> list:
+    """
+    Файл содержания или указателя: шаблон (HHC_PAGE, HHK_PAGE), в конец
+    которого перед </BODY> пишется список пунктов. Символы вне windows-1251
+    записываются числовыми ссылками &#NNNN;, которые понимает HTML Help.
+    Возвращает названия и адреса, где такие символы встретились.
+    """
+    head, tail = template.rsplit('</BODY>', 1)
+    replaced = []
+
+    def write_list(fp, nodes:list, indent:str) -> None:
+        fp.write(f'{indent}<UL>\n')
+        for node in nodes:
+            fp.write(f'{indent}\t<LI> <OBJECT type="text/sitemap">\n')
+            fp.write(f'{indent}\t\t<param name="Name" value="{html.escape(node.name)}">\n')
+            if node.link is not None:
+                fp.write(f'{indent}\t\t<param name="Local" value="{html.escape(node.link)}">\n')
+            fp.write(f'{indent}\t\t</OBJECT>\n')
+            for text in (node.name, node.link or ''):
+                if not encodable(text): replaced.append(text)
+            if node.children:
+                write_list(fp, node.children, indent + '\t')
+        fp.write(f'{indent}</UL>\n')
+
+    with open(path, 'w', encoding=NAVIGATION_ENCODING, errors='xmlcharrefreplace') as fp:
+        fp.write(head.rstrip('\n') + '\n')
+        if nodes:
+            write_list(fp, nodes, '')
+        fp.write('</BODY>' + tail)
+    return replaced
+
+def write_project(path:str, options:dict, files:list) -> list:
+    """
+    Проект qsp.hhp: [OPTIONS], страницы справки [FILES] и пустой [INFOTYPES].
+    Непредставимые в windows-1251 символы заменяются '?'; возвращает такие строки.
+    """
+    lines = ['[OPTIONS]', *(f'{key}={value}' for key, value in sorted(options.items())), '', '',
+             '[FILES]', *files, '', '[INFOTYPES]', '']
+    with open(path, 'w', encoding=NAVIGATION_ENCODING, errors='replace') as fp:
+        fp.write('\n'.join(lines) + '\n')
+    return [line for line in lines if not encodable(line)]
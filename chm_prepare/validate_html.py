@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка собранной справки: href и src страниц html_out указывают на
+существующие файлы, якоря #... есть на целевых страницах, записи qsp.hhc
+и qsp.hhk ведут на существующие страницы, а внутренние ссылки вики
+не остались абсолютными. Страницы разбираются параллельно в пуле процессов,
+проверка идёт по индексу файлов и якорей, построенному один раз.
+"""
+
+import os, re, sys, json
+import html
+import argparse
+import posixpath
+from urllib.parse import unquote, urlsplit
+from concurrent.futures import ProcessPoolExecutor
+
+# типы ошибок в порядке вывода
+ERROR_TYPES = {
+    'missing_file': 'ссылка на несуществующий файл',
+    'case_mismatch': 'имя файла отличается регистром',
+    'missing_anchor': 'якоря нет на целевой странице',
+    'absolute_link': 'внутренняя ссылка вики осталась абсолютной',
+    'toc_missing_file': 'запись содержания или указателя ведёт на несуществующий файл',
+    'toc_missing_anchor': 'запись содержания или указателя ведёт на несуществующий якорь',
+}
+PAGE_EXTENSIONS = ('.htm', '.html')
+TOC_FILES = {'qsp.hhc': 'windows-1251', 'qsp.hhk': 'windows-1251'}
+# ссылающиеся атрибуты: тег -> атрибут
+REF_ATTRS = {'a': 'href', 'area': 'href', 'link': 'href', 'img': 'src', 'script': 'src', 'frame': 'src', 'iframe': 'src'}
+
+# страницы сериализованы BeautifulSoup: текст экранирован, поэтому теги
+# и атрибуты находятся регулярками быстрее, чем разбором HTMLParser
+TAG_RE = re.compile(r'<([a-zA-Z][a-zA-Z0-9]*)(\s[^>]*)?>')
+ATTR_RE = re.compile(r'([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+)))?')
+COMMENT_RE = re.compile(r'<!--.*?-->', re.S)
+
+def scan_text(text:str) -> tuple:
+    """ Якоря (id, <a name>) и ссылки страницы: (множество якорей, [(тег, ссылка)]) """
+    anchors, refs = set(), []
+    for match in TAG_RE.finditer(COMMENT_RE.sub('', text)):
+        if not match.group(2):
+            continue
+        tag = match.group(1).lower()
+        attrs = {}
+        for name, double, single, bare in ATTR_RE.findall(match.group(2)):
+            # при повторе атрибута действует первое значение, как в браузере
+            attrs.setdefault(name.lower(), html.unescape(double or single or bare))
+        if attrs.get('id'):
+            anchors.add(attrs['id'])
+        if tag == 'a' and attrs.get('name'):
+            anchors.add(attrs['name'])
+        if tag == 'param' and attrs.get('name', '').lower() == 'local' and attrs.get('value'):
+            # запись содержания или указателя
+            refs.append(('toc', attrs['value']))
+            continue
+        name = REF_ATTRS.get(tag)
+        if name and attrs.get(name):
+            refs.append((tag, attrs[name]))
+    return anchors, refs
+
+def scan_file(args) -> tuple:
+    """ Задача пула: (путь, имя, кодировка) -> (имя, якоря, ссылки) """
+    path, name, encoding = args
+    with open(path, 'r', encoding=encoding, errors='replace') as fp:
+        anchors, refs = scan_text(fp.read())
+    return name, anchors, refs
+
+class HtmlValidator:
+    """ Проверка папки собранной справки """
+
+    def __init__(self, folder:str, base_url:str = 'https://wiki.qsp.org', jobs:int = 1) -> None:
+        self.folder = os.path.abspath(folder)
+        self.base_url = base_url
+        self.jobs = max(1, jobs)
+        # относительный путь (posix) -> якоря страницы; у остальных файлов None
+        self.files:dict[str, set] = {}
+        self.lower_files:dict[str, str] = {}
+        self.checked = 0
+
+    def list_files(self) -> list:
+        """ Файлы справки; служебные папки (.image_cache и т. п.) пропускаются """
+        names = []
+        for root, dirs, files in os.walk(self.folder):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for file_name in files:
+                if not file_name.startswith('.'):
+                    names.append(os.path.relpath(os.path.join(root, file_name), self.folder).replace(os.sep, '/'))
+        return sorted(names)
+
+    def scan(self) -> dict:
+        """ Разбор страниц, содержания и указателя: имя -> (якоря, ссылки) """
+        names = self.list_files()
+        self.files = {name: None for name in names}
+        self.lower_files = {name.lower(): name for name in names}
+        tasks = [(os.path.join(self.folder, name), name, TOC_FILES.get(name, 'utf-8')) for name in names
+                 if name.lower().endswith(PAGE_EXTENSIONS) or name in TOC_FILES]
+        if self.jobs > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+                scanned = list(pool.map(scan_file, tasks, chunksize=max(1, len(tasks) // (self.jobs * 4))))
+        else:
+            scanned = [scan_file(task) for task in tasks]
+        pages = {}
+        for name, anchors, refs in scanned:
+            pages[name] = refs
+            self.files[name] = anchors
+        return pages
+
+    def run(self) -> dict:
+        """ Ошибки по типам: тип -> [{'page', 'ref', 'target'}] """
+        errors = {error_type: [] for error_type in ERROR_TYPES}
+        for page, refs in self.scan().items():
+            for tag, ref in refs:
+                self.checked += 1
+                error = self.check_ref(page, tag, ref)
+                if error:
+                    error_type, target = error
+                    errors[error_type].append({'page': page, 'ref': ref, 'target': target})
+        return {error_type: found for error_type, found in errors.items() if found}
+
+    def check_ref(self, page:str, tag:str, ref:str):
+        """ None или (тип ошибки, проверенная цель) """
+        ref = ref.strip()
+        if ref.startswith(self.base_url):
+            return 'absolute_link', ref
+        parts = urlsplit(ref)
+        if parts.scheme or parts.netloc or ref.startswith('//'):
+            # внешние ссылки, mailto:, javascript:
+            return None
+        toc = tag == 'toc'
+        if parts.path:
+            # пути в содержании и указателе могут быть виндовыми
+            path = unquote(parts.path.replace('\\', '/'))
+            target = posixpath.normpath(posixpath.join(posixpath.dirname(page), path))
+        else:
+            target = page
+        if target not in self.files:
+            if target.lower() in self.lower_files:
+                return ('toc_missing_file' if toc else 'case_mismatch'), target
+            return ('toc_missing_file' if toc else 'missing_file'), target
+        if parts.fragment and tag in ('a', 'area', 'toc'):
+            anchors = self.files[target]
+            if anchors is not None and unquote(parts.fragment) not in anchors:
+                return ('toc_missing_anchor' if toc else 'missing_anchor'), f'{target}#{parts.fragment}'
+        return None
+
+def print_report(errors:dict, checked:int, limit:int = 20) -> None:
+    """ Сводка ошибок по типам с первыми примерами """
+    if not errors:
+        print(f'Проверено ссылок: {checked}, ошибок нет')
+        return
+    print(f'Проверено ссылок: {checked}, ошибок: {sum(len(found) for found in errors.values())}')
+    for error_type, found in errors.items():
+        print(f'--- {ERROR_TYPES[error_type]} ({error_type}): {len(found)}')
+        for error in found[:limit]:
+            print(f"    {error['page']}: {error['ref']}")
+        if len(found) > limit:
+            print(f'    ... и ещё {len(found) - limit}')
+
+def parse_args(argv=None):
+    """ Разбор аргументов командной строки """
+    parser = argparse.ArgumentParser(description='Проверка ссылок, изображений и якорей собранной справки')
+    parser.add_argument('folder', nargs='?', default=os.path.join('..', 'html_out'))
+    parser.add_argument('--base-url', default='https://wiki.qsp.org')
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1,
+                        help='число процессов разбора страниц')
+    parser.add_argument('--report', metavar='FILE',
+                        help='сохранить ошибки по типам в json')
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    validator = HtmlValidator(args.folder, args.base_url, args.jobs)
+    errors = validator.run()
+    print_report(errors, validator.checked)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as fp:
+            json.dump(errors, fp, ensure_ascii=False, indent=4)
+    if errors:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
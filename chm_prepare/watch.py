@@ -0,0 +1,181 @@
+""" Режим --watch: слежение за html_src и пересборка только изменившихся файлов """
+
+import os
+import time
+import threading
+import traceback
+
+class BuildWatcher:
+    """
+    Долгоживущая сборка. Схема, таблица ссылок, манифест и разобранные
+    страницы содержания и указателя держатся в памяти, а папка html_src
+    и используемая страницами таблица стилей default.css в out_html_folder
+    опрашиваются раз в interval секунд (опрос не зависит от ОС и работает
+    на сетевых дисках). Серия записей (например, обновление загрузчиком)
+    собирается в одну пересборку: она начинается, когда изменений нет
+    debounce секунд, но не позже max_wait секунд от первого изменения.
+    """
+
+    def __init__(self, preparat, interval:float = 0.1, debounce:float = 0.2, max_wait:float = 2.0,
+                 log=print) -> None:
+        if preparat.corpus is not None:
+            raise ValueError('--watch следит за папкой html_src, а не за корпусом')
+        self.preparat = preparat
+        self.interval = interval
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self.log = log
+        self.scheme_path = os.path.abspath(preparat.sets['scheme'])
+        # стили, на которые ссылается шаблон страницы (CHM_PAGE), лежат в папке справки
+        self.css_path = os.path.join(preparat.out_html_folder, 'default.css')
+        # страницы, из которых строятся qsp.hhc и qsp.hhk (имена выходных файлов)
+        self.toc_names = set(preparat.toc_files)
+        # все страницы html_src: при 'prune' в сборку идут только достижимые из них
+        self.sources:list[str] = []
+        self.manifest = None
+        self.state:dict[str, tuple] = {}
+        self.rebuilds = 0
+
+    def scan(self) -> dict:
+        """ Путь -> (mtime, размер) для страниц html_src, файла схемы и default.css """
+        state = {}
+        for entry in os.scandir(self.preparat.src_html_folder):
+            if entry.name.endswith('.html') and entry.is_file():
+                stat = entry.stat()
+                state[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        for path in (self.scheme_path, self.css_path):
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                state[path] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    def start(self) -> dict:
+        """ Начальная инкрементальная сборка; возвращает ошибки подготовки """
+        preparat = self.preparat
+        self.state = self.scan()
+        self.sources = list(preparat.files_pathes)
+        # разобранные содержание и указатель остаются в preparat.toc_deferred
+        errors = preparat.prepare_html_files()
+        self.manifest = preparat.open_manifest()
+        preparat.prepare_navigation()
+        return errors
+
+    def wait_changes(self, stop:threading.Event):
+        """ Ждёт изменений и затихания записи: (изменённые пути, удалённые пути, время первого изменения) """
+        touched, first, last = set(), None, None
+        while not stop.wait(self.interval):
+            state = self.scan()
+            now = time.perf_counter()
+            changed = {path for path, stat in state.items() if self.state.get(path) != stat}
+            changed |= self.state.keys() - state.keys()
+            self.state = state
+            if changed:
+                touched |= changed
+                first = first or now
+                last = now
+            if first is not None and (now - last >= self.debounce or now - first >= self.max_wait):
+                return {path for path in touched if path in state}, {path for path in touched if path not in state}, first
+        return None
+
+    def rebuild(self, changed:set, removed:set) -> dict:
+        """ Пересборка по изменениям; возвращает пересобранные выходные файлы и ошибки """
+        preparat = self.preparat
+        # хэши исходников кэшируются на одну сборку
+        preparat._source_hashes = {}
+        built, errors, toc = [], {}, set()
+
+        if self.css_path in changed:
+            # страницы только ссылаются на стили: пересобирать нечего
+            built.append(os.path.basename(self.css_path))
+
+        pages = {path for path in changed if path.endswith('.html')}
+        if self.scheme_path in changed:
+            # новая схема: пересобираются страницы, у которых поменялось разрешение ссылок,
+            # а содержание и указатель - из разобранных фрагментов
+            preparat.load_scheme()
+            self.manifest = preparat.open_manifest()
+            pages |= {f for f in preparat.files_pathes
+                      if not preparat.is_toc(f)
+                      and not self.manifest.is_up_to_date(os.path.basename(f), preparat.source_digest(f),
+                                                          preparat.output_path(f))}
+            toc = set(self.toc_names)
+
+        self.sources = [f for f in self.sources if f not in removed] + sorted(pages - set(self.sources))
+        included = set(preparat.files_pathes)
+        if preparat.sets['prune']:
+            # новые и изменённые страницы проходят тот же отбор по достижимости, что и сборка
+            preparat.files_pathes = list(self.sources)
+            preparat.prune_unreachable()
+            pages = (pages | set(preparat.files_pathes) - included) & set(preparat.files_pathes)
+        else:
+            preparat.files_pathes = list(self.sources)
+
+        for path in sorted(included - set(preparat.files_pathes)):
+            # удалённые и ставшие недостижимыми страницы
+            output_path = preparat.output_path(path)
+            if os.path.isfile(output_path): os.remove(output_path)
+            self.manifest.forget(os.path.basename(path))
+            preparat.toc_deferred.pop(os.path.basename(output_path), None)
+            built.append(os.path.basename(output_path))
+
+        for path in sorted(pages):
+            name = os.path.basename(preparat.output_path(path))
+            try:
+                if name in self.toc_names:
+                    preparat.toc_deferred[name] = preparat.prepare_deferred(preparat.read_source(path), toc=True)
+                    toc.add(name)
+                    continue
+                info = preparat.prepare_htm(path)
+            except Exception:
+                errors[path] = traceback.format_exc()
+                self.manifest.forget(os.path.basename(path))
+                continue
+            self.manifest.update(os.path.basename(path), preparat.source_digest(path), name,
+                                 info['link_keys'], info['unresolved'])
+            if preparat.search is not None:
+                preparat.search.update(name, preparat.source_digest(path), info['search'])
+            built.append(name)
+
+        for file_path in preparat.files_pathes:
+            name = os.path.basename(preparat.output_path(file_path))
+            if name not in toc:
+                continue
+            deferred = preparat.toc_deferred.get(name)
+            if deferred is None:
+                # страница не пересобиралась с запуска: разбирается один раз и остаётся в памяти
+                deferred = preparat.toc_deferred[name] = preparat.prepare_deferred(
+                    preparat.read_source(file_path), toc=True)
+            # дерево страницы записывается в qsp.hhc или qsp.hhk
+            info = preparat.finish_deferred(deferred, preparat.output_path(file_path))
+            self.manifest.update(os.path.basename(file_path), preparat.source_digest(file_path),
+                                 os.path.basename(info['output']), info['link_keys'], info['unresolved'])
+            built.append(os.path.basename(info['output']))
+
+        if pages or removed or set(preparat.files_pathes) != included:
+            # список страниц qsp.hhp зависит от ссылок между ними
+            preparat.prepare_navigation()
+        self.manifest.save()
+        preparat.save_unresolved_report(self.manifest)
+        if preparat.search is not None:
+            preparat.save_search_index(preparat.files_pathes)
+        preparat.errors.update(errors)
+        self.rebuilds += 1
+        return {'built': built, 'errors': errors}
+
+    def run(self, stop:threading.Event = None) -> None:
+        """ Цикл слежения до stop или Ctrl+C """
+        stop = stop or threading.Event()
+        errors = self.start()
+        self.log(f'Сборка готова (ошибок: {len(errors)}), слежение за {self.preparat.src_html_folder}')
+        while True:
+            changes = self.wait_changes(stop)
+            if changes is None:
+                return
+            changed, removed, first = changes
+            result = self.rebuild(changed, removed)
+            latency = time.perf_counter() - first
+            self.log(f"[{time.strftime('%H:%M:%S')}] пересобрано {len(result['built'])}: "
+                     f"{', '.join(result['built'][:10])} ({latency:.2f} с)")
+            for file_path, error in result['errors'].items():
+                self.log(f'--- {file_path}')
+                self.log(error)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Общее для проверок загрузчика: локальная копия вики (html_src), сервер
+с ней и обход с чтением результата
+"""
+
+import os, json
+
+import pytest
+
+from qsp_wiki_downloader import WikiDownloader
+from local_wiki_server import LocalWikiServer, routes_from_scheme
+
+HTML_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'html_src')
+
+def crawl_wiki(base_url, output_dir, **kwargs):
+    """Скачивает локальную вики и возвращает загрузчик, содержимое папки и схему"""
+    downloader = WikiDownloader(base_url=base_url, output_dir=str(output_dir), rate=0, **kwargs)
+    downloader.download_wiki()
+    downloader.save_urls_link_files()
+    return (downloader, *read_wiki_output(output_dir))
+
+def read_wiki_output(output_dir):
+    """Содержимое папки выгрузки и схема с относительными путями"""
+    files = {}
+    for root, _, names in os.walk(output_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            with open(path, 'rb') as fp:
+                files[os.path.relpath(path, output_dir)] = fp.read()
+
+    scheme = json.loads(files.pop('urls_links_to_files.json'))
+    # манифест кэша содержит время загрузки и у каждого запуска свой
+    files.pop('urls_cache.json', None)
+    for section in scheme.values():
+        for url, path in section.items():
+            section[url] = os.path.relpath(path, output_dir)
+    return files, scheme
+
+@pytest.fixture(scope='session')
+def html_src():
+    """Папка локальной копии вики"""
+    return HTML_SRC
+
+@pytest.fixture
+def wiki_routes(html_src):
+    """Маршруты сервера по схеме html_src; тест может их дополнить и после запуска сервера"""
+    return routes_from_scheme(os.path.join(html_src, 'urls_links_to_files.json'), html_src)
+
+@pytest.fixture
+def wiki_server(wiki_routes):
+    """Локальная вики, работающая до конца теста"""
+    with LocalWikiServer(wiki_routes) as server:
+        yield server
+
+@pytest.fixture
+def crawl():
+    """crawl(base_url, output_dir, **настройки) -> (загрузчик, файлы, схема)"""
+    return crawl_wiki
+
+@pytest.fixture
+def read_output():
+    """read_output(output_dir) -> (файлы, схема)"""
+    return read_wiki_output
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Загрузка только содержимого страниц: DokuWiki отдаёт по ?do=export_xhtml
+текст статьи без шапки, боковой панели, панелей инструментов и подвала.
+Выгрузка переводится в минимальную страницу с div.page.group и заголовком,
+которую ChmPrepare разбирает так же, как полную.
+"""
+
+import re
+from urllib.parse import urlsplit, parse_qsl, urlencode, quote
+
+from link_extractor import ContentLinkParser, EXPORT_CLASSES
+
+EXPORT_QUERY = ('do', 'export_xhtml')
+HEADING_RE = re.compile(r'<h([1-6])\b[^>]*>(.*?)</h\1\s*>', re.S | re.I)
+TITLE_RE = re.compile(r'<title\b[^>]*>(.*?)</title\s*>', re.S | re.I)
+TAG_RE = re.compile(r'<[^>]+>')
+# оглавление статьи: его заголовок «Содержание» - не заголовок страницы
+TOC_RE = re.compile(r'<!-- TOC START -->.*?<!-- TOC END -->', re.S)
+
+CONTENT_PAGE = '''<!DOCTYPE html>
+<html lang="ru">
+<head>
+<meta charset="utf-8" />
+<title>{title}</title>
+</head>
+<body>
+<div class="page group">
+{content}
+</div>
+</body>
+</html>
+'''
+
+def export_url(url:str) -> str:
+    """ Адрес выгрузки содержимого страницы """
+    parts = urlsplit(url)
+    query = [item for item in parse_qsl(parts.query, keep_blank_values=True) if item[0] != 'do']
+    query.append(EXPORT_QUERY)
+    return parts._replace(path=parts.path or '/', query=urlencode(query, quote_via=quote, safe=':'),
+                          fragment='').geturl()
+
+def content_page(export_html:str, site_title:str) -> str:
+    """
+    Страница для html_src из выгрузки export_xhtml. Заголовок - как в полной
+    вёрстке DokuWiki: первый заголовок статьи, а без него id страницы
+    (его выгрузка пишет в <title>), и название вики в квадратных скобках.
+    None - выгрузка пуста: страницы не существует.
+    """
+    parser = ContentLinkParser(export_html, EXPORT_CLASSES)
+    parser.feed(export_html)
+    parser.close()
+    if parser.content_span is None:
+        raise ValueError('в выгрузке нет div.dokuwiki.export')
+    start, end = parser.content_span
+    block = export_html[start:end]
+    content = block[block.index('>') + 1:block.rindex('</')]
+    if not content.strip():
+        return None
+
+    heading = HEADING_RE.search(TOC_RE.sub('', content))
+    if heading:
+        title = TAG_RE.sub('', heading.group(2)).strip()
+    else:
+        match = TITLE_RE.search(export_html[:start])
+        title = match.group(1).strip() if match else ''
+    return CONTENT_PAGE.format(title=f'{title} [{site_title}]', content=content.strip('\n'))
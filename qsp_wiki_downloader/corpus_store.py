@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Корпус вики в одном файле SQLite вместо папки html_src.
+Хранит то же, что и папка: файлы страниц и изображений (содержимое - по хэшу),
+схему urls_links_to_files.json и манифест кэша urls_cache.json.
+Пути файлов хранятся относительно корня (как внутри html_src).
+"""
+
+import os, json
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import threading
+from typing import Optional
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL REFERENCES blobs(sha256)
+);
+CREATE INDEX IF NOT EXISTS files_sha256 ON files(sha256);
+CREATE TABLE IF NOT EXISTS scheme (
+    section TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (section, url)
+);
+CREATE TABLE IF NOT EXISTS fetch_meta (
+    url TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched REAL
+);
+'''
+
+# файлы схемы и кэша в папке html_src
+SCHEME_FILE = 'urls_links_to_files.json'
+CACHE_FILE = 'urls_cache.json'
+
+class CorpusStore:
+    """
+    Доступ к корпусу. root - папка, относительно которой пишутся пути
+    (у загрузчика - output_dir, у ChmPrepare - src_html_folder).
+    Запись идёт транзакциями; соединение общее для потоков, под замком.
+    """
+
+    def __init__(self, path:str, root:str = '.', readonly:bool = False, commit_every:int = 200) -> None:
+        self.path = path
+        self.root = root
+        self.readonly = readonly
+        self.commit_every = commit_every
+        self._lock = threading.RLock()
+        self._uncommitted = 0
+        if readonly:
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f'корпус не найден: {path}')
+            self.db = sqlite3.connect(f'file:{os.path.abspath(path)}?mode=ro', uri=True,
+                                      check_same_thread=False)
+        else:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute('PRAGMA synchronous = NORMAL')
+            self.db.executescript(SCHEMA)
+            self.db.commit()
+
+    # пути: абсолютный или относительный к рабочей папке путь <-> ключ внутри корпуса
+
+    def key(self, path:str) -> str:
+        return os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def full_path(self, key:str) -> str:
+        return os.path.join(self.root, *key.split('/'))
+
+    # файлы
+
+    def write_file(self, path:str, data:bytes, digest:str = None) -> str:
+        """ Записывает файл; одинаковое содержимое хранится один раз. Возвращает хэш. """
+        digest = digest or hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self.db.execute('INSERT OR IGNORE INTO blobs (sha256, size, data) VALUES (?, ?, ?)',
+                            (digest, len(data), sqlite3.Binary(data)))
+            self.db.execute('INSERT OR REPLACE INTO files (path, sha256) VALUES (?, ?)',
+                            (self.key(path), digest))
+            self._written()
+        return digest
+
+    def write_stream(self, path:str, fp, size:int, digest:str, chunk_size:int = 1 << 16) -> str:
+        """
+        Записывает файл из открытого потока по частям, не читая его в память целиком:
+        место под содержимое резервируется zeroblob и заполняется через blobopen.
+        size и digest - размер и хэш содержимого, посчитанные при загрузке.
+        """
+        with self._lock:
+            cursor = self.db.execute('INSERT OR IGNORE INTO blobs (sha256, size, data) VALUES (?, ?, zeroblob(?))',
+                                     (digest, size, size))
+            if cursor.rowcount:
+                with self.db.blobopen('blobs', 'data', cursor.lastrowid) as blob:
+                    for chunk in iter(lambda: fp.read(chunk_size), b''):
+                        blob.write(chunk)
+            self.db.execute('INSERT OR REPLACE INTO files (path, sha256) VALUES (?, ?)',
+                            (self.key(path), digest))
+            self._written()
+        return digest
+
+    def has_blob(self, digest:str) -> bool:
+        with self._lock:
+            return self.db.execute('SELECT 1 FROM blobs WHERE sha256 = ?', (digest,)).fetchone() is not None
+
+    def file_hash(self, path:str) -> Optional[str]:
+        """ Хэш файла или None, если его нет (как response_cache.file_hash) """
+        with self._lock:
+            row = self.db.execute('SELECT sha256 FROM files WHERE path = ?', (self.key(path),)).fetchone()
+        return row[0] if row else None
+
+    def exists(self, path:str) -> bool:
+        return self.file_hash(path) is not None
+
+    def read_file(self, path:str) -> bytes:
+        with self._lock:
+            row = self.db.execute(
+                'SELECT b.data FROM files f JOIN blobs b ON b.sha256 = f.sha256 WHERE f.path = ?',
+                (self.key(path),)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f'нет в корпусе: {path}')
+        return bytes(row[0])
+
+    def file_size(self, path:str) -> int:
+        with self._lock:
+            row = self.db.execute(
+                'SELECT b.size FROM files f JOIN blobs b ON b.sha256 = f.sha256 WHERE f.path = ?',
+                (self.key(path),)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f'нет в корпусе: {path}')
+        return row[0]
+
+    def list_files(self, folder:str = None) -> list:
+        """ Пути файлов папки корпуса (без вложенных), по умолчанию - корня """
+        prefix = '' if folder is None else self.key(folder).rstrip('/') + '/'
+        if prefix == './':
+            prefix = ''
+        with self._lock:
+            keys = [row[0] for row in self.db.execute('SELECT path FROM files ORDER BY path')]
+        return [self.full_path(key) for key in keys
+                if key.startswith(prefix) and '/' not in key[len(prefix):]]
+
+    # схема и манифест кэша
+
+    def save_scheme(self, scheme:dict) -> None:
+        """ Схема url -> файл (urls_links_to_files.json); порядок сохраняется """
+        with self._lock:
+            self.db.execute('DELETE FROM scheme')
+            self.db.executemany(
+                'INSERT INTO scheme (section, seq, url, path) VALUES (?, ?, ?, ?)',
+                [(section, seq, url, self.key(path))
+                 for section, entries in scheme.items()
+                 for seq, (url, path) in enumerate(entries.items())])
+            self._written()
+
+    def load_scheme(self) -> dict:
+        scheme = {'images': {}, 'pages': {}}
+        with self._lock:
+            rows = self.db.execute('SELECT section, url, path FROM scheme ORDER BY section, seq').fetchall()
+        for section, url, key in rows:
+            scheme.setdefault(section, {})[url] = self.full_path(key)
+        return scheme
+
+    def scheme_digest(self) -> str:
+        """ Хэш схемы: меняется вместе с её содержимым """
+        return hashlib.sha256(
+            json.dumps(self.load_scheme(), ensure_ascii=False, sort_keys=True).encode('utf-8')
+        ).hexdigest()
+
+    def save_fetch_meta(self, entries:dict) -> None:
+        """ Манифест кэша ответов (urls_cache.json) """
+        with self._lock:
+            self.db.execute('DELETE FROM fetch_meta')
+            self.db.executemany(
+                'INSERT INTO fetch_meta (url, path, sha256, etag, last_modified, fetched) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [(url, self.key(e['path']), e['sha256'], e.get('etag'), e.get('last_modified'), e.get('fetched'))
+                 for url, e in entries.items()])
+            self._written()
+
+    def load_fetch_meta(self) -> dict:
+        with self._lock:
+            rows = self.db.execute(
+                'SELECT url, path, sha256, etag, last_modified, fetched FROM fetch_meta ORDER BY rowid').fetchall()
+        return {
+            url: {'etag': etag, 'last_modified': last_modified, 'sha256': sha256,
+                  'fetched': fetched, 'path': self.full_path(key)}
+            for url, key, sha256, etag, last_modified, fetched in rows
+        }
+
+    # транзакции
+
+    def _written(self) -> None:
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.commit()
+
+    def commit(self) -> None:
+        with self._lock:
+            if not self.readonly:
+                self.db.commit()
+            self._uncommitted = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self.commit()
+            self.db.close()
+
+    # обмен с папкой html_src
+
+    def import_folder(self, src_dir:str) -> None:
+        """ Переносит в корпус папку html_src: файлы, схему и манифест кэша """
+        for folder, _, names in os.walk(src_dir):
+            for name in names:
+                path = os.path.join(folder, name)
+                if os.path.relpath(path, src_dir) in (SCHEME_FILE, CACHE_FILE):
+                    continue
+                with open(path, 'rb') as fp:
+                    self.write_file(self.full_path(os.path.relpath(path, src_dir).replace(os.sep, '/')), fp.read())
+        scheme_path = os.path.join(src_dir, SCHEME_FILE)
+        if os.path.isfile(scheme_path):
+            with open(scheme_path, 'r', encoding='utf-8') as fp:
+                scheme = json.load(fp)
+            self.save_scheme({section: {url: self._import_path(path, src_dir) for url, path in entries.items()}
+                              for section, entries in scheme.items()})
+        cache_path = os.path.join(src_dir, CACHE_FILE)
+        if os.path.isfile(cache_path):
+            with open(cache_path, 'r', encoding='utf-8') as fp:
+                entries = json.load(fp)
+            for entry in entries.values():
+                entry['path'] = self._import_path(entry['path'], src_dir)
+            self.save_fetch_meta(entries)
+        self.commit()
+
+    def _import_path(self, path:str, src_dir:str) -> str:
+        """ Путь из схемы (возможно, виндовый) -> путь в корпусе """
+        parts = path.replace('\\', '/').split('/')
+        # в схеме путь вида ..\\html_src\\images\\x.png: берём часть внутри html_src
+        name = parts[-1]
+        if len(parts) > 1 and parts[-2] == 'images':
+            name = f'images/{name}'
+        return self.full_path(name)
+
+    def export_folder(self, dst_dir:str) -> None:
+        """ Разворачивает корпус в папку формата html_src """
+        with self._lock:
+            keys = [row[0] for row in self.db.execute('SELECT path FROM files ORDER BY path')]
+        for key in keys:
+            target = os.path.join(dst_dir, *key.split('/'))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as fp:
+                fp.write(self.read_file(self.full_path(key)))
+
+        def relocate(path:str) -> str:
+            return os.path.join(dst_dir, *self.key(path).split('/'))
+
+        scheme = self.load_scheme()
+        with open(os.path.join(dst_dir, SCHEME_FILE), 'w', encoding='utf-8') as fp:
+            json.dump({section: {url: relocate(path) for url, path in entries.items()}
+                       for section, entries in scheme.items()}, fp, ensure_ascii=False, indent=4)
+        entries = self.load_fetch_meta()
+        if entries:
+            for entry in entries.values():
+                entry['path'] = relocate(entry['path'])
+            with open(os.path.join(dst_dir, CACHE_FILE), 'w', encoding='utf-8') as fp:
+                json.dump(entries, fp, ensure_ascii=False, indent=4)
+
+    def stats(self) -> dict:
+        with self._lock:
+            files, size = self.db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(b.size), 0) FROM files f JOIN blobs b ON b.sha256 = f.sha256'
+            ).fetchone()
+            blobs, stored = self.db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs').fetchone()
+            sections = dict(self.db.execute('SELECT section, COUNT(*) FROM scheme GROUP BY section').fetchall())
+        return {'files': files, 'bytes': size, 'blobs': blobs, 'stored_bytes': stored,
+                'pages': sections.get('pages', 0), 'images': sections.get('images', 0)}
+
+class CorpusWriter(CorpusStore):
+    """
+    Корпус для записи без частичных состояний: работа идёт с копией
+    <path>.part, и только publish() атомарно заменяет ею основной файл.
+    При прерывании основной корпус остаётся прежним, а .part - продолжением.
+    """
+
+    def __init__(self, path:str, root:str = '.', resume:bool = False, commit_every:int = 200) -> None:
+        self.final_path = path
+        part_path = f'{path}.part'
+        if not (resume and os.path.isfile(part_path)):
+            if os.path.isfile(path):
+                # прошлый корпус - основа для условных запросов
+                shutil.copyfile(path, part_path)
+            elif os.path.isfile(part_path):
+                os.remove(part_path)
+        super().__init__(part_path, root, commit_every=commit_every)
+
+    def publish(self) -> None:
+        """ Фиксирует транзакцию и атомарно заменяет основной корпус """
+        self.close()
+        os.replace(self.path, self.final_path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Корпус вики в одном файле SQLite')
+    commands = parser.add_subparsers(dest='command', required=True)
+    pack = commands.add_parser('pack', help='упаковать папку html_src в корпус')
+    pack.add_argument('src_dir')
+    pack.add_argument('corpus')
+    unpack = commands.add_parser('unpack', help='развернуть корпус в папку html_src')
+    unpack.add_argument('corpus')
+    unpack.add_argument('dst_dir')
+    info = commands.add_parser('info', help='сводка по корпусу')
+    info.add_argument('corpus')
+    args = parser.parse_args()
+
+    if args.command == 'pack':
+        writer = CorpusWriter(args.corpus, root=args.src_dir)
+        writer.import_folder(args.src_dir)
+        writer.publish()
+        corpus = CorpusStore(args.corpus, readonly=True)
+    else:
+        corpus = CorpusStore(args.corpus, readonly=True)
+        if args.command == 'unpack':
+            corpus.export_folder(args.dst_dir)
+    stats = corpus.stats()
+    print(f"Страниц в схеме: {stats['pages']}, изображений: {stats['images']}, файлов: {stats['files']} "
+          f"({stats['bytes'] / 1024 / 1024:.1f} МБ, хранится {stats['stored_bytes'] / 1024 / 1024:.1f} МБ)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Очередь обхода вики: дек и множество уже виденных url.
+Дубликаты отсекаются при постановке в очередь, url приводятся
+к каноническому виду один раз.
+"""
+
+from collections import deque
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit, parse_qs, quote, unquote
+
+# символы, которые DokuWiki оставляет в pretty-url без кодирования
+SAFE_PATH_CHARS = "/:@!$&'()*+,;=-._~"
+DEFAULT_PORTS = {'http': '80', 'https': '443'}
+
+@lru_cache(maxsize=65536)
+def canonicalize_url(url:str) -> str:
+    """
+    Канонический вид url страницы DokuWiki:
+    - схема и хост в нижнем регистре, порт по умолчанию убран;
+    - doku.php?id=ns:page приводится к pretty-url /ns:page;
+    - %-кодирование нормализовано, id страницы в нижнем регистре;
+    - без завершающего слэша, query и якоря.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and str(parts.port) != DEFAULT_PORTS.get(scheme):
+        host = f'{host}:{parts.port}'
+
+    path = parts.path
+    if path.endswith('/doku.php') or path == '/doku.php':
+        page_id = parse_qs(parts.query).get('id')
+        if page_id:
+            path = path[:-len('doku.php')] + page_id[0]
+    elif '/doku.php/' in path:
+        path = path.replace('/doku.php/', '/', 1)
+
+    # DokuWiki не различает регистр в id страниц
+    path = quote(unquote(path).lower(), safe=SAFE_PATH_CHARS)
+    path = path.rstrip('/')
+    return urlunsplit((scheme, host, path, '', ''))
+
+class CrawlFrontier:
+    """ Очередь обхода с проверкой на дубликаты при постановке """
+
+    def __init__(self, urls=(), seen=()) -> None:
+        self._queue = deque()
+        self._seen = set(seen)
+        self.enqueued = 0
+        self.duplicates_avoided = 0
+        for url in urls:
+            self.push(url)
+
+    def push(self, url:str) -> bool:
+        """ Ставит url в очередь; False, если он уже встречался """
+        url = canonicalize_url(url)
+        if url in self._seen:
+            self.duplicates_avoided += 1
+            return False
+        self._seen.add(url)
+        self._queue.append(url)
+        self.enqueued += 1
+        return True
+
+    def mark_seen(self, url:str) -> None:
+        """ Помечает url как уже обработанный, не ставя его в очередь """
+        self._seen.add(canonicalize_url(url))
+
+    def requeue(self, url:str) -> None:
+        """ Повторно ставит в очередь уже встречавшийся url (повтор после сбоя) """
+        self._queue.append(canonicalize_url(url))
+
+    def pop(self) -> str:
+        return self._queue.popleft()
+
+    def __contains__(self, url:str) -> bool:
+        return canonicalize_url(url) in self._seen
+
+    def __iter__(self):
+        return iter(self._queue)
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def get_stats(self) -> dict:
+        return {
+            'enqueued': self.enqueued,
+            'duplicates_avoided': self.duplicates_avoided
+        }
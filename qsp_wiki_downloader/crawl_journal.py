@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Журнал обхода вики для продолжения прерванной выгрузки.
+Каждое событие - одна строка JSON, дописываемая в конец файла,
+поэтому стоимость контрольной точки не зависит от размера обхода.
+"""
+
+import os, json
+import threading
+
+class CrawlJournal:
+    """ Журнал событий обхода: страницы, ошибки, изображения """
+
+    def __init__(self, path:str, sync_every:int = 20) -> None:
+        self.path = path
+        # через сколько событий данные принудительно сбрасываются на диск
+        self.sync_every = max(1, sync_every)
+        self._fp = None
+        self._unsynced = 0
+        self._lock = threading.Lock()
+
+    def open(self, resume:bool = False) -> dict:
+        """
+        Открывает журнал. При resume возвращает восстановленное состояние,
+        иначе начинает журнал заново.
+        """
+        state = self.replay() if resume else self.empty_state()
+        self._fp = open(self.path, 'a' if resume else 'w', encoding='utf-8')
+        return state
+
+    @staticmethod
+    def empty_state() -> dict:
+        return {
+            'pages': {},
+            'failed_pages': set(),
+            'frontier': [],
+            'images': {},
+            'failed_images': set(),
+            'pending_images': []
+        }
+
+    def replay(self) -> dict:
+        """ Восстанавливает состояние обхода по журналу """
+        state = self.empty_state()
+        if not os.path.isfile(self.path):
+            return state
+
+        enqueued = []
+        found_images = []
+        with open(self.path, 'r', encoding='utf-8') as fp:
+            for line in fp:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # недописанная строка при аварийном завершении
+                    break
+                op = event['op']
+                if op == 'start':
+                    enqueued.append(event['url'])
+                elif op == 'page':
+                    state['pages'][event['url']] = event['path']
+                    state['failed_pages'].discard(event['url'])
+                    enqueued.extend(event['links'])
+                    found_images.extend(event['images'])
+                elif op == 'page_failed':
+                    state['failed_pages'].add(event['url'])
+                elif op == 'image':
+                    state['images'][event['url']] = event['path']
+                    state['failed_images'].discard(event['url'])
+                elif op == 'image_failed':
+                    state['failed_images'].add(event['url'])
+
+        # неудачные страницы и изображения повторяются при продолжении
+        state['frontier'] = [url for url in enqueued if url not in state['pages']]
+        seen = set(state['images'])
+        for url in found_images:
+            if url not in seen:
+                seen.add(url)
+                state['pending_images'].append(url)
+        return state
+
+    def _write(self, event:dict) -> None:
+        if self._fp is None:
+            return
+        with self._lock:
+            self._fp.write(json.dumps(event, ensure_ascii=False) + '\n')
+            self._fp.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every:
+                os.fsync(self._fp.fileno())
+                self._unsynced = 0
+
+    def start(self, url:str) -> None:
+        self._write({'op': 'start', 'url': url})
+
+    def page(self, url:str, path:str, links:list, images:list) -> None:
+        """ Страница сохранена; вместе с ней пишутся найденные на ней ссылки """
+        self._write({'op': 'page', 'url': url, 'path': path, 'links': links, 'images': images})
+
+    def page_failed(self, url:str) -> None:
+        self._write({'op': 'page_failed', 'url': url})
+
+    def image(self, url:str, path:str) -> None:
+        self._write({'op': 'image', 'url': url, 'path': path})
+
+    def image_failed(self, url:str) -> None:
+        self._write({'op': 'image_failed', 'url': url})
+
+    def close(self, remove:bool = False) -> None:
+        """ Закрывает журнал; remove - обход завершён и журнал больше не нужен """
+        with self._lock:
+            if self._fp is not None:
+                self._fp.flush()
+                os.fsync(self._fp.fileno())
+                self._fp.close()
+                self._fp = None
+        if remove and os.path.isfile(self.path):
+            os.remove(self.path)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Извлечение ссылок со страницы для обхода вики.
+Обходу нужны только атрибуты <a href> и <img src>, поэтому дерево
+документа строить не обязательно.
+"""
+
+import re
+from html.parser import HTMLParser
+from bs4 import BeautifulSoup
+
+# область содержимого страницы DokuWiki
+CONTENT_CLASSES = frozenset(('page', 'group'))
+# она же в выгрузке ?do=export_xhtml
+EXPORT_CLASSES = frozenset(('dokuwiki', 'export'))
+
+class LinkAttrParser(HTMLParser):
+    """ Потоковый разбор: собирает href ссылок и src изображений без построения DOM """
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.hrefs:list[str] = []
+        self.srcs:list[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            target = self.hrefs
+            name = 'href'
+        elif tag == 'img':
+            target = self.srcs
+            name = 'src'
+        else:
+            return
+        # при повторе атрибута действует последнее значение, как в BeautifulSoup
+        value = dict(attrs).get(name, False)
+        if value is not False:
+            target.append(value or '')
+
+class ContentLinkParser(LinkAttrParser):
+    """
+    Тот же потоковый разбор, который заодно находит в исходном тексте
+    границы области содержимого div.page.group: подготовке страницы
+    достаточно разобрать только этот фрагмент. Ссылки и изображения самой
+    области собираются отдельно (content_hrefs, content_srcs).
+    classes - классы div области содержимого.
+    """
+
+    def __init__(self, html_content:str, classes:frozenset = CONTENT_CLASSES) -> None:
+        super().__init__()
+        self._html = html_content
+        self._classes = classes
+        self._line_starts = [0] + [m.end() for m in re.finditer('\n', html_content)]
+        self._start = None
+        self._depth = 0
+        self.content_span = None
+        self.content_hrefs:list[str] = []
+        self.content_srcs:list[str] = []
+
+    def _offset(self) -> int:
+        """ Смещение начала текущего тега в исходном тексте """
+        line, column = self.getpos()
+        return self._line_starts[line - 1] + column
+
+    def handle_starttag(self, tag, attrs):
+        if self._start is not None and self.content_span is None:
+            hrefs, srcs = len(self.hrefs), len(self.srcs)
+            super().handle_starttag(tag, attrs)
+            self.content_hrefs.extend(self.hrefs[hrefs:])
+            self.content_srcs.extend(self.srcs[srcs:])
+        else:
+            super().handle_starttag(tag, attrs)
+        if tag != 'div' or self.content_span is not None:
+            return
+        if self._start is not None:
+            self._depth += 1
+        elif self._classes <= set((dict(attrs).get('class') or '').split()):
+            self._start = self._offset()
+            self._depth = 1
+
+    def handle_endtag(self, tag):
+        if tag != 'div' or self._start is None or self.content_span is not None:
+            return
+        self._depth -= 1
+        if self._depth == 0:
+            self.content_span = (self._start, self._html.index('>', self._offset()) + 1)
+
+def extract_stream(html_content:str):
+    """ (href ссылок, src изображений) потоковым разбором """
+    parser = LinkAttrParser()
+    parser.feed(html_content)
+    parser.close()
+    return parser.hrefs, parser.srcs
+
+def extract_soup(html_content:str):
+    """ (href ссылок, src изображений) через дерево BeautifulSoup """
+    soup = BeautifulSoup(html_content, 'html.parser')
+    hrefs = [link['href'] for link in soup.find_all('a', href=True)]
+    srcs = [img['src'] for img in soup.find_all('img', src=True)]
+    return hrefs, srcs
+
+def extract_stream_content(html_content:str):
+    """ (href ссылок, src изображений, границы div.page.group или None) """
+    parser = ContentLinkParser(html_content)
+    parser.feed(html_content)
+    parser.close()
+    return parser.hrefs, parser.srcs, parser.content_span
+
+EXTRACTORS = {
+    'stream': extract_stream,
+    'soup': extract_soup,
+}
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Локальный HTTP-сервер, подменяющий wiki.qsp.org.
+Отдаёт ранее скачанные страницы и изображения по их исходным url.
+"""
+
+import os, json
+import time
+import hashlib
+import threading
+import mimetypes
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, unquote
+
+from link_extractor import extract_stream_content
+
+EXPORT_PARAM = 'do=export_xhtml'
+EXPORT_PAGE = '''<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="ru" lang="ru" dir="ltr">
+<head>
+  <meta http-equiv="Content-Type" content="text/html; charset=utf-8" />
+  <title>{page_id}</title>
+  <link rel="stylesheet" href="/lib/exe/css.php" type="text/css" />
+</head>
+<body>
+<div class="dokuwiki export">
+{content}
+</div>
+</body>
+</html>
+'''
+
+def routes_from_scheme(scheme_path:str, src_dir:str = None) -> dict:
+    """
+    Строит маршруты сервера по схеме urls_links_to_files.json:
+    путь url (с query) -> локальный файл.
+    """
+    with open(scheme_path, 'r', encoding='utf-8') as fp:
+        scheme = json.load(fp)
+    src_dir = src_dir or os.path.dirname(os.path.abspath(scheme_path))
+
+    routes = {}
+    for section, subdir in (('pages', ''), ('images', 'images')):
+        for url, file_path in scheme[section].items():
+            # пути в схеме сохранены под Windows
+            file_name = file_path.replace('\\', '/').split('/')[-1]
+            local_path = os.path.join(src_dir, subdir, file_name)
+            if os.path.isfile(local_path):
+                routes[route_key(url)] = local_path
+    return routes
+
+def export_xhtml(body:bytes, path:str) -> bytes:
+    """ Выгрузка ?do=export_xhtml, как её отдаёт DokuWiki: содержимое div.page.group без вёрстки """
+    html_content = body.decode('utf-8')
+    span = extract_stream_content(html_content)[2]
+    if span is None:
+        return None
+    block = html_content[span[0]:span[1]]
+    content = block[block.index('>') + 1:block.rindex('</')]
+    # у несуществующей страницы docInfo пуст, а выгрузка DokuWiki - пустая
+    if '<div class="docInfo"></div>' in html_content:
+        content = ''
+    page_id = unquote(path.strip('/')) or 'start'
+    return EXPORT_PAGE.format(page_id=page_id, content=content).encode('utf-8')
+
+def route_key(url:str) -> str:
+    """Ключ маршрута: путь и query, как их видит сервер"""
+    parsed = urlparse(url)
+    path = parsed.path or '/'
+    return f'{path}?{parsed.query}' if parsed.query else path
+
+class LocalWikiServer:
+    """
+    Сервер в отдельном потоке. Используется как контекстный менеджер.
+    faults - сбои для проверки повторов: путь запроса -> коды ответов,
+    которые отдаются по одному на первые запросы к этому пути.
+    """
+
+    def __init__(self, routes:dict, latency:float = 0.0, host:str = '127.0.0.1', port:int = 0,
+                 faults:dict = None, retry_after:str = None) -> None:
+        self.routes = routes
+        self.latency = latency
+        self.faults = {path: list(statuses) for path, statuses in (faults or {}).items()}
+        self.retry_after = retry_after
+        self.faults_served = 0
+        self.requests_count = 0
+        self.not_modified_count = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _handle(self, handler:BaseHTTPRequestHandler) -> None:
+        """ Обработка одного запроса """
+        with self._lock:
+            self.requests_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self._lock:
+            pending = self.faults.get(handler.path)
+            fault = pending.pop(0) if pending else None
+            if fault:
+                self.faults_served += 1
+        if fault:
+            handler.send_response(fault)
+            if self.retry_after is not None:
+                handler.send_header('Retry-After', self.retry_after)
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+            return
+
+        request_path = handler.path
+        path, _, query = request_path.partition('?')
+        params = query.split('&') if query else []
+        export = EXPORT_PARAM in params
+        if export:
+            params.remove(EXPORT_PARAM)
+            request_path = f"{path}?{'&'.join(params)}" if params else path
+
+        local_path = self.routes.get(request_path)
+        if local_path is None:
+            local_path = self.routes.get(path)
+        if local_path is None:
+            handler.send_error(404)
+            return
+
+        with open(local_path, 'rb') as fp:
+            body = fp.read()
+        if export:
+            body = export_xhtml(body, path)
+            if body is None:
+                handler.send_error(404)
+                return
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        last_modified = formatdate(os.path.getmtime(local_path), usegmt=True)
+        if handler.headers.get('If-None-Match') == etag:
+            with self._lock:
+                self.not_modified_count += 1
+            handler.send_response(304)
+            handler.send_header('ETag', etag)
+            handler.end_headers()
+            return
+
+        content_type = 'text/html' if export else mimetypes.guess_type(local_path)[0] or 'application/octet-stream'
+        if content_type == 'text/html':
+            content_type += '; charset=utf-8'
+        handler.send_response(200)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        handler.send_header('ETag', etag)
+        handler.send_header('Last-Modified', last_modified)
+        handler.end_headers()
+        handler.wfile.write(body)
+        with self._lock:
+            self.bytes_sent += len(body)
+
+    def start(self) -> 'LocalWikiServer':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> 'LocalWikiServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+def main():
+    """ Запуск сервера поверх папки html_src """
+    import argparse
+    parser = argparse.ArgumentParser(description='Локальная копия wiki.qsp.org')
+    parser.add_argument('--src', default=os.path.join('..', 'html_src'))
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0)
+    args = parser.parse_args()
+
+    routes = routes_from_scheme(os.path.join(args.src, 'urls_links_to_files.json'), args.src)
+    server = LocalWikiServer(routes, args.latency, port=args.port)
+    print(f'Сервер запущен: {server.base_url}')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Полный список страниц вики до начала обхода: по указателю DokuWiki
+(?do=index, по пространствам имён) и карте сайта (?do=sitemap).
+Обход по ссылкам находит страницы только через ссылки с главной,
+а страницы, на которые никто не ссылается, не находит совсем.
+"""
+
+import re
+import gzip
+import logging
+import threading
+from html.parser import HTMLParser
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit, parse_qs, urlencode, quote
+from xml.etree import ElementTree
+
+from crawl_frontier import canonicalize_url
+
+# источники списка страниц в порядке опроса
+SOURCES = ('index', 'sitemap')
+# служебные адреса DokuWiki, не являющиеся страницами
+SKIP_PATH_RE = re.compile(r'(\.php$|^/_media/|^/_detail/|^/_export/|^/lib/)')
+
+class IndexParser(HTMLParser):
+    """
+    Разбор страницы указателя: ссылки дерева div#index__tree.
+    Ссылки с классом idx_dir ведут на пространства имён, остальные - на страницы.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.pages:list[str] = []
+        self.namespaces:list[str] = []
+        self._depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if self._depth:
+            if tag == 'div':
+                self._depth += 1
+            elif tag == 'a' and attrs.get('href'):
+                if 'idx_dir' in (attrs.get('class') or '').split() or 'idx=' in attrs['href']:
+                    self.namespaces.append(attrs['href'])
+                else:
+                    self.pages.append(attrs['href'])
+        elif tag == 'div' and attrs.get('id') == 'index__tree':
+            self._depth = 1
+
+    def handle_endtag(self, tag):
+        if tag == 'div' and self._depth:
+            self._depth -= 1
+
+def parse_index(html_content:str) -> tuple:
+    """ (href страниц, href пространств имён) страницы указателя """
+    parser = IndexParser()
+    parser.feed(html_content)
+    parser.close()
+    return parser.pages, parser.namespaces
+
+def parse_sitemap(data:bytes) -> list:
+    """ Адреса <loc> карты сайта; DokuWiki может отдавать её сжатой gzip """
+    if data[:2] == b'\x1f\x8b':
+        data = gzip.decompress(data)
+    root = ElementTree.fromstring(data)
+    return [loc.text.strip() for loc in root.iter() if loc.tag.rsplit('}', 1)[-1] == 'loc' and loc.text]
+
+def index_url(url:str) -> str:
+    """ Адрес указателя: ссылки пространств имён ведут на ?idx=ns, do=index добавляется явно """
+    parts = urlsplit(url)
+    query = parse_qs(parts.query)
+    query['do'] = ['index']
+    return parts._replace(query=urlencode(query, doseq=True, quote_via=quote, safe=':'), fragment='').geturl()
+
+class PageEnumerator:
+    """
+    Перечисление страниц. fetch(url) -> bytes или None - загрузка служебной
+    страницы (ограничение частоты и повторы - на стороне загрузчика).
+    Пространства имён указателя загружаются по уровням, уровень - параллельно.
+    """
+
+    def __init__(self, fetch, base_url:str, workers:int = 1) -> None:
+        self.fetch = fetch
+        self.base_url = base_url
+        self.base_root = canonicalize_url(urljoin(base_url, '/'))
+        self.workers = max(1, workers)
+        self.listings = 0
+        # счётчик пополняют потоки пула указателя
+        self._lock = threading.Lock()
+
+    def _count_listing(self) -> None:
+        with self._lock:
+            self.listings += 1
+
+    def page_url(self, href:str, page_url:str):
+        """ Канонический url страницы вики или None для служебных и чужих адресов """
+        url = canonicalize_url(str(urljoin(page_url, href)))
+        if not (url == self.base_root or url.startswith(self.base_root + '/')):
+            return None
+        if SKIP_PATH_RE.search(urlsplit(url).path):
+            return None
+        return url
+
+    def _fetch_text(self, url:str):
+        data = self.fetch(url)
+        self._count_listing()
+        return None if data is None else data.decode('utf-8', errors='replace')
+
+    def from_index(self) -> set:
+        """ Страницы указателя со всеми пространствами имён; None, если указатель недоступен """
+        start = index_url(urljoin(self.base_url, '/doku.php?id=start'))
+        level, visited, pages = [start], {start}, set()
+        found = False
+        with ThreadPoolExecutor(self.workers, thread_name_prefix='index') as pool:
+            while level:
+                next_level = []
+                for url, html_content in zip(level, pool.map(self._fetch_text, level)):
+                    if html_content is None:
+                        continue
+                    hrefs, namespaces = parse_index(html_content)
+                    found = found or bool(hrefs or namespaces)
+                    for href in hrefs:
+                        page = self.page_url(href, url)
+                        if page:
+                            pages.add(page)
+                    for href in namespaces:
+                        namespace = index_url(str(urljoin(url, href)))
+                        if namespace not in visited:
+                            visited.add(namespace)
+                            next_level.append(namespace)
+                level = next_level
+        return pages if found else None
+
+    def from_sitemap(self):
+        """ Страницы карты сайта; None, если карта недоступна """
+        data = self.fetch(urljoin(self.base_url, '/doku.php?do=sitemap'))
+        self._count_listing()
+        if data is None:
+            return None
+        try:
+            locs = parse_sitemap(data)
+        except (ElementTree.ParseError, OSError, EOFError) as e:
+            logging.warning(f'Не удалось разобрать карту сайта: {e}')
+            return None
+        return {page for page in (self.page_url(loc, self.base_url) for loc in locs) if page}
+
+    def run(self, sources=SOURCES) -> dict:
+        """ Источник -> множество url страниц; недоступные источники пропускаются """
+        found = {}
+        for source in sources:
+            pages = self.from_index() if source == 'index' else self.from_sitemap()
+            if pages is None:
+                logging.warning(f'Список страниц недоступен: {source}')
+                continue
+            found[source] = pages
+            logging.info(f'Список страниц {source}: {len(pages)}')
+        return found
+
+def diff_report(found:dict) -> dict:
+    """
+    Сравнение способов поиска страниц: found - способ -> множество url
+    (в том числе 'links' - обход по ссылкам). Для каждого способа - страницы,
+    найденные только им.
+    """
+    report = {'pages': {method: len(pages) for method, pages in found.items()}, 'only': {}}
+    for method, pages in found.items():
+        others = set().union(*(other for name, other in found.items() if name != method))
+        report['only'][method] = sorted(pages - others)
+    return report
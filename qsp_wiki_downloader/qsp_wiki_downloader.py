@@ -9,10 +9,26 @@ import requests
 import os, json
 import time
 import re
+import argparse
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 from urllib.parse import urljoin, urlparse, ParseResult
-from bs4 import BeautifulSoup
 import logging
 
+from response_cache import ResponseCache
+from corpus_store import CorpusWriter
+from crawl_journal import CrawlJournal
+from crawl_frontier import CrawlFrontier, canonicalize_url
+from link_extractor import EXTRACTORS
+from page_enumerator import PageEnumerator, SOURCES, diff_report
+from content_export import export_url, content_page
+from run_metrics import RunMetrics, run_profiled
+from rate_limiter import TokenBucket, RETRY_STATUSES, THROTTLE_STATUSES, retry_after, backoff_delay
+
 # Настройка логирования
 logging.basicConfig(
     level=logging.DEBUG,  # Изменено на DEBUG для более детального логирования
@@ -23,35 +39,109 @@ logging.basicConfig(
     ]
 )
 
+USER_AGENT = ' '.join([
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64)',
+    'AppleWebKit/537.36 (KHTML, like Gecko)',
+    'Chrome/91.0.4472.124 Safari/537.36'
+])
+
+# изображения пишутся на диск кусками этого размера
+IMAGE_CHUNK_SIZE = 64 * 1024
+# число символов хэша в имени файла изображения
+IMAGE_HASH_LENGTH = 16
+
 class WikiDownloader:
-    def __init__(self, base_url="https://wiki.qsp.org", output_dir="..\\html_src"):
+    def __init__(self, base_url="https://wiki.qsp.org", output_dir="..\\html_src",
+                 workers=1, per_host_limit=4, rate=4.0, burst=2, retries=3, backoff=1.0,
+                 max_backoff=60.0, retry_rounds=1, use_cache=True, offline=False,
+                 resume=False, checkpoint_every=20, extractor='stream', corpus=None,
+                 enumerate_sources=(), content_only=False, site_title='Документация QSP'):
         self.base_url = base_url
         self.output_dir = output_dir
 
-        self.session = requests.Session()
-        user_agent = ' '.join([
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64)',
-            'AppleWebKit/537.36 (KHTML, like Gecko)',
-            'Chrome/91.0.4472.124 Safari/537.36'
-        ])
-        self.session.headers.update({
-            'User-Agent': user_agent
-        })
+        # параметры параллельного обхода
+        self.workers = max(1, workers)
+        self.per_host_limit = max(1, per_host_limit)
+
+        # частота запросов к хосту (0 - без ограничения) и повторы при сбоях
+        self.rate = rate
+        self.burst = burst
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # сколько раз в конце обхода повторяются неудачные url
+        self.retry_rounds = max(0, retry_rounds)
+
+        # requests.Session не потокобезопасна, поэтому у каждого потока своя
+        self._local = threading.local()
+        self.session = self._session()
+
+        # защищает общие множества и схему при параллельной загрузке
+        self._lock = threading.RLock()
+        self._host_slots = {}
+        self._host_limiters = {}
+        # порядок обнаружения изображений: в нём они попадают в схему
+        self._image_order = {}
+        self._image_pool = None
+        self._image_futures = {}
 
         self.downloaded_urls = set()
         self.failed_urls = set()
         self.downloaded_images = set()
         self.failed_images = set()
+        # url с окончательным отказом сервера (404 и т.п.): повторять их бесполезно
+        self.permanent_failures = set()
 
         self.urls_link_file = {
             'images': {},
             'pages': {}
         }
+        self.frontier = CrawlFrontier()
+        # источники полного списка страниц (page_enumerator.SOURCES): страницы из них
+        # ставятся в очередь до начала обхода, а обход по ссылкам дополняет список
+        self.enumerate_sources = tuple(enumerate_sources)
+        # способ поиска -> найденные им url страниц, для отчёта о различиях
+        self.found_pages = {}
+        # страницы загружаются выгрузкой ?do=export_xhtml, без вёрстки вики;
+        # site_title - название вики в заголовках страниц, как в полной вёрстке
+        self.content_only = content_only
+        self.site_title = site_title
+        # 'stream' - потоковый разбор атрибутов, 'soup' - дерево BeautifulSoup.
+        # Возвращает (hrefs, srcs, ...): остальные элементы получает on_page
+        self.extract_page_links = EXTRACTORS[extractor]
+        # обработчики для конвейера обхода и сборки (crawl_pipeline.py):
+        # on_page(url, html, результат разбора) - страница сохранена и разобрана,
+        # on_stored(раздел схемы, url, путь) - в схему добавлен файл
+        self.on_page = None
+        self.on_stored = None
+        # время этапов, задержки запросов, переданные байты
+        self.metrics = RunMetrics()
         
         # Создаем папку для сохранения файлов
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
             logging.info(f"Создана папка: {output_dir}")
+
+        # Корпус SQLite вместо отдельных файлов в output_dir (None - писать файлы);
+        # до save_urls_link_files запись идёт в копию <corpus>.part
+        self.corpus = CorpusWriter(corpus, root=output_dir, resume=resume) if corpus else None
+
+        # Кэш ответов: условные запросы и сборка без сети
+        self.offline = offline
+        self.cache = ResponseCache(
+            os.path.join(output_dir, 'urls_cache.json'),
+            enabled=use_cache or offline,
+            corpus=self.corpus
+        )
+        self.not_modified = 0
+
+        # Журнал обхода: позволяет продолжить прерванную выгрузку
+        self.resume = resume
+        self.journal = CrawlJournal(
+            os.path.join(output_dir, 'crawl_journal.jsonl'),
+            sync_every=checkpoint_every
+        )
+        self._pending_images = []
         
         # Создаем папку для изображений
         self.images_dir = os.path.join(output_dir, "images")
@@ -59,24 +149,129 @@ class WikiDownloader:
             os.makedirs(self.images_dir)
             logging.info(f"Создана папка для изображений: {self.images_dir}")
     
-    def get_page_content(self, url):
-        """Получает содержимое страницы"""
+    def _session(self) -> requests.Session:
+        """Возвращает сессию текущего потока"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({
+                'User-Agent': USER_AGENT
+            })
+            self._local.session = session
+        return session
+
+    def _host_slot(self, url) -> threading.BoundedSemaphore:
+        """Семафор, ограничивающий число одновременных запросов к хосту"""
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_slots[host]
+
+    def _host_limiter(self, url) -> TokenBucket:
+        """Ограничитель частоты запросов к хосту"""
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_limiters:
+                self._host_limiters[host] = TokenBucket(self.rate, self.burst)
+            return self._host_limiters[host]
+
+    @contextmanager
+    def _request(self, url, kind='page', **kwargs):
+        """
+        GET-запрос с ограничением частоты и параллельности на хост.
+        Ответы 429/5xx и сетевые сбои повторяются: по Retry-After, если сервер
+        его прислал, иначе с экспоненциальной задержкой. Ответ отдаётся блоку
+        with, пока занят слот хоста, поэтому тело можно читать потоком.
+        """
+        limiter = self._host_limiter(url)
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            with self.metrics.timer('throttle'):
+                limiter.acquire()
+
+            with self._host_slot(url):
+                try:
+                    with self.metrics.fetch(kind) as fetched:
+                        response = self._session().get(url, timeout=30, **kwargs)
+                        fetched['status'] = response.status_code
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    if last_attempt:
+                        raise
+                    reason = str(e)
+                    wait = backoff_delay(attempt, self.backoff, self.max_backoff)
+                else:
+                    if response.status_code not in RETRY_STATUSES or last_attempt:
+                        if response.status_code < 400:
+                            limiter.on_success()
+                        with response:
+                            yield response
+                        return
+                    response.close()
+                    reason = f'HTTP {response.status_code}'
+                    if response.status_code in THROTTLE_STATUSES:
+                        # сервер просит снизить нагрузку
+                        limiter.on_throttle()
+                    wait = retry_after(response.headers.get('Retry-After'))
+                    if wait is None:
+                        wait = backoff_delay(attempt, self.backoff, self.max_backoff)
+                    wait = min(wait, self.max_backoff)
+
+            # ждут все запросы к хосту, а не только этот поток
+            limiter.pause(wait)
+            self.metrics.count('retries')
+            logging.warning(f"{reason}, повтор {attempt + 1}/{self.retries} через {wait:.1f} с: {url}")
+
+    def get_page_content(self, url, content_only=None):
+        """Получает содержимое страницы (content_only - только содержимое, по умолчанию по настройке)"""
+        if content_only is None:
+            content_only = self.content_only
+        if self.offline:
+            if self.cache.get(url) is None:
+                logging.error(f"Страница отсутствует в кэше: {url}")
+                return None
+            return self.cache.read(url).decode('utf-8')
+        # кэш и схема ведутся по адресу страницы, а не выгрузки
+        fetch_url = export_url(url) if content_only else url
         try:
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
-            response.encoding = 'utf-8'
-            return response.text
+            with self._request(fetch_url, headers=self.cache.conditional_headers(url)) as response:
+                if response.status_code == 304:
+                    # Страница не изменилась, берём локальную копию
+                    logging.debug(f"Не изменилась: {url}")
+                    self.cache.touch(url)
+                    with self._lock:
+                        self.not_modified += 1
+                    return self.cache.read(url).decode('utf-8')
+                response.raise_for_status()
+                self.metrics.count('bytes_pages', len(response.content))
+                response.encoding = 'utf-8'
+                text = content_page(response.text, self.site_title) if content_only else response.text
+                if text is not None:
+                    self.cache.remember_validators(url, response.headers)
+                    return text
         except requests.RequestException as e:
             logging.error(f"Ошибка при загрузке {url}: {e}")
+            self._note_failure(url, e)
             return None
-    
-    def extract_links(self, soup:BeautifulSoup, base_url):
-        """Извлекает все ссылки со страницы"""
+        except ValueError as e:
+            logging.error(f"Ошибка разбора выгрузки {fetch_url}: {e}")
+            return None
+        # выгрузка несуществующей страницы пуста, а полная вёрстка показывает
+        # заглушку с заголовком и якорем - для совпадения с полной загрузкой берётся она
+        logging.debug(f"Пустая выгрузка, загружаю страницу целиком: {url}")
+        return self.get_page_content(url, content_only=False)
+
+    def extract_links(self, hrefs, base_url, found=None):
+        """
+        Извлекает все ссылки со страницы (по значениям атрибутов href);
+        новые изображения добавляются в список found
+        """
         links = set()
+        # корень сайта считается один раз на страницу, а не на каждую ссылку
+        base_root = canonicalize_url(urljoin(base_url, '/'))
 
         # Ищем все ссылки
-        for link in soup.find_all('a', href=True):
-            href = link['href']
+        for href in hrefs:
             
             # Пропускаем внешние ссылки и якоря
             if href.startswith('http') or href.startswith('#') or href.startswith('mailto:'):
@@ -84,35 +279,37 @@ class WikiDownloader:
             
             # Получаем полный URL
             full_url = str(urljoin(base_url, href))
+            # канонический url страницы (doku.php?id=... тоже приводится к нему)
+            page_url = canonicalize_url(full_url)
             full_url = full_url.split('?')[0]
             full_url = full_url.split('#')[0]
 
             # Пропускаем, если url уже загружен (такого не должно быть!)
-            if full_url in self.downloaded_urls:
+            if page_url in self.downloaded_urls:
                 continue
 
-            if full_url.endswith('.php'):
+            if page_url.endswith('.php'):
                 continue
             elif full_url.split('.')[-1] in ('png', 'jpg', 'jpeg', 'gif', 'webp'):
                 # Скачиваем изображение если оно еще не скачано
                 if full_url not in self.downloaded_images:
                     logging.debug(f"Найдена ссылка на новое изображение: {full_url}")
-                    self.download_image(full_url)
+                    self._found_image(full_url, found)
                 else:
                     logging.debug(f"Ссылка на уже найденное изображение: {full_url}")
                 continue
             
             # Проверяем, что ссылка ведет на тот же домен
-            if urlparse(full_url).netloc == urlparse(base_url).netloc:
-                links.add(full_url)
+            if page_url == base_root or page_url.startswith(base_root + '/'):
+                links.add(page_url)
         
         return links
     
-    def extract_images(self, soup:BeautifulSoup, base_url):
-        # Ищем изображения в тегах <img>
+    def extract_images(self, srcs, base_url, found=None):
+        """Ищет изображения по значениям атрибутов src тегов <img>, новые добавляет в found"""
+        base_netloc = urlparse(base_url).netloc
 
-        for img in soup.find_all('img', src=True):
-            src = img['src']
+        for src in srcs:
             if src.startswith('http'):
                 image_url = src
             else:
@@ -122,13 +319,25 @@ class WikiDownloader:
                 continue
             
             # Скачиваем изображение если это локальный файл и оно еще не скачано
-            if urlparse(image_url).netloc == urlparse(base_url).netloc:
+            if urlparse(image_url).netloc == base_netloc:
                 if image_url not in self.downloaded_images:
                     logging.debug(f"Найдено новое изображение в <img>: {image_url}")
-                    self.download_image(image_url)
+                    self._found_image(image_url, found)
                 else:
                     logging.debug(f"Изображение уже найдено ранее: {image_url}")
     
+    def _found_image(self, image_url, found=None):
+        """Передаёт найденное изображение на скачивание"""
+        if image_url not in self._image_order:
+            self._image_order[image_url] = len(self._image_order)
+            if found is not None:
+                found.append(image_url)
+        if self._image_pool is None:
+            self.download_image(image_url)
+        elif image_url not in self._image_futures:
+            # изображения качаются в отдельной очереди и не тормозят обход страниц
+            self._image_futures[image_url] = self._image_pool.submit(self.download_image, image_url)
+
     def save_page(self, url, html_content):
         """Сохраняет страницу в файл"""
         try:
@@ -157,10 +366,17 @@ class WikiDownloader:
             #     filepath = f"{name}_{counter}{ext}"
             #     counter += 1
             
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(html_content)
+            data = html_content.encode('utf-8')
+            with self.metrics.timer('write_page'):
+                if not self.cache.is_stored(url, filepath, data):
+                    if self.corpus is not None:
+                        self.corpus.write_file(filepath, data)
+                    else:
+                        with open(filepath, 'wb') as f:
+                            f.write(data)
+                self.cache.record(url, filepath, data)
 
-            self.urls_link_file['pages'][url] = filepath
+            self._add_to_scheme('pages', url, filepath)
             
             logging.info(f"Сохранена страница: {filename}")
             return True
@@ -176,71 +392,122 @@ class WikiDownloader:
             logging.debug(f"Изображение уже скачано, пропускаю: {image_url}")
             return
         try:
-            # Получаем изображение
-            response = self.session.get(image_url, timeout=30)
-            response.raise_for_status()
-            
-            # Определяем расширение файла
-            content_type = response.headers.get('content-type', '')
-            if 'image/' in content_type:
-                ext = content_type.split('/')[-1]
-                if ext == 'jpeg':
-                    ext = 'jpg'
-            else:
-                # Пытаемся определить расширение по URL
-                parsed_url = urlparse(image_url)
-                path = parsed_url.path.lower()
-                if path.endswith('.png'):
-                    ext = 'png'
-                elif path.endswith('.jpg') or path.endswith('.jpeg'):
-                    ext = 'jpg'
-                elif path.endswith('.gif'):
-                    ext = 'gif'
-                elif path.endswith('.webp'):
-                    ext = 'webp'
-                else:
-                    ext = 'jpg'  # По умолчанию
-            
-            # Создаем безопасное имя файла
-            parsed_url = urlparse(image_url)
-            path_parts = parsed_url.path.strip('/').split('/')
-            
-            if not path_parts or path_parts[0] == '':
-                filename = f"image_{int(time.time())}.{ext}"
-            else:
-                # Берем последнюю часть пути как имя файла
-                last_part = path_parts[-1]
-                # Убираем расширение если есть
-                name_without_ext = os.path.splitext(last_part)[0]
-                # Очищаем имя файла от недопустимых символов
-                safe_name = re.sub(r'[<>:"/\\|?*]', '_', name_without_ext)
-                filename = f"{safe_name}.{ext}"
-            
-            filepath = os.path.join(self.images_dir, filename)
-            
-            # Если файл уже существует, добавляем номер
-            # counter = 1
-            # original_filepath = filepath
-            # while os.path.exists(filepath):
-            #     name, ext = os.path.splitext(original_filepath)
-            #     filepath = f"{name}_{counter}{ext}"
-            #     counter += 1
-            
-            # Сохраняем изображение
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
+            if self.offline:
+                if self._reuse_cached_image(image_url):
+                    return True
+                raise FileNotFoundError('изображение отсутствует в кэше')
 
-            self.urls_link_file['images'][image_url] = filepath
-            
-            logging.info(f"Скачано изображение: {filename}")
-            self.downloaded_images.add(image_url)
+            # Получаем изображение потоком, не держа его целиком в памяти
+            headers = self.cache.conditional_headers(image_url)
+            with self._request(image_url, kind='image', stream=True, headers=headers) as response:
+                if response.status_code == 304 and self._reuse_cached_image(image_url, response):
+                    return True
+                response.raise_for_status()
+                self.cache.remember_validators(image_url, response.headers)
+                ext = self._image_ext(response, image_url)
+                filepath, digest, is_new = self._store_image(response, ext)
+
+            with self._lock:
+                self.cache.record(image_url, filepath, digest=digest)
+                self._add_to_scheme('images', image_url, filepath)
+                self.downloaded_images.add(image_url)
+                self.failed_images.discard(image_url)
+            self.journal.image(image_url, filepath)
+
+            if is_new:
+                logging.info(f"Скачано изображение: {image_url} -> {os.path.basename(filepath)}")
+            else:
+                logging.info(f"Изображение совпадает с уже сохранённым: {image_url} -> {os.path.basename(filepath)}")
             return True
             
         except Exception as e:
             logging.error(f"Ошибка при скачивании изображения {image_url}: {e}")
-            self.failed_images.add(image_url)
+            self._note_failure(image_url, e)
+            with self._lock:
+                self.failed_images.add(image_url)
+            self.journal.image_failed(image_url)
             return False
+
+    def _image_ext(self, response, image_url) -> str:
+        """Определяет расширение файла изображения"""
+        content_type = response.headers.get('content-type', '')
+        if 'image/' in content_type:
+            ext = content_type.split('/')[-1].split(';')[0].strip()
+            if ext == 'jpeg':
+                ext = 'jpg'
+            return ext
+
+        # Пытаемся определить расширение по URL
+        parsed_url = urlparse(image_url)
+        path = parsed_url.path.lower()
+        if path.endswith('.png'):
+            return 'png'
+        elif path.endswith('.jpg') or path.endswith('.jpeg'):
+            return 'jpg'
+        elif path.endswith('.gif'):
+            return 'gif'
+        elif path.endswith('.webp'):
+            return 'webp'
+        return 'jpg'  # По умолчанию
+
+    def _store_image(self, response, ext):
+        """
+        Записывает изображение на диск по частям, одновременно считая хэш.
+        Файл называется по хэшу содержимого, поэтому одинаковые изображения
+        с разных url хранятся один раз, а разные с одинаковым именем
+        не перезаписывают друг друга.
+        """
+        hasher = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.images_dir, suffix='.part')
+        size = 0
+        try:
+            # тело ответа читается по ходу записи, поэтому входит в этап записи
+            with self.metrics.timer('write_image'), os.fdopen(fd, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=IMAGE_CHUNK_SIZE):
+                    hasher.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            self.metrics.count('bytes_images', size)
+            digest = hasher.hexdigest()
+            filepath = os.path.join(self.images_dir, f"{digest[:IMAGE_HASH_LENGTH]}.{ext}")
+            with self._lock:
+                if self.corpus is not None:
+                    is_new = not self.corpus.exists(filepath)
+                    if is_new:
+                        with open(tmp_path, 'rb') as f:
+                            self.corpus.write_stream(filepath, f, size, digest, IMAGE_CHUNK_SIZE)
+                else:
+                    is_new = not os.path.exists(filepath)
+                    if is_new:
+                        os.replace(tmp_path, filepath)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return filepath, digest, is_new
     
+    def _reuse_cached_image(self, image_url, response=None) -> bool:
+        """Берёт изображение из кэша: без сети или по ответу 304"""
+        entry = self.cache.get(image_url)
+        if entry is None:
+            return False
+        if response is not None:
+            self.cache.touch(image_url)
+        with self._lock:
+            if response is not None:
+                self.not_modified += 1
+            self._add_to_scheme('images', image_url, entry['path'])
+            self.downloaded_images.add(image_url)
+            self.failed_images.discard(image_url)
+        self.journal.image(image_url, entry['path'])
+        logging.debug(f"Изображение взято из кэша: {image_url}")
+        return True
+
+    def _add_to_scheme(self, section, url, path):
+        """Записывает файл в схему и сообщает об этом on_stored"""
+        self.urls_link_file[section][url] = path
+        if self.on_stored is not None:
+            self.on_stored(section, url, path)
+
     def get_download_stats(self):
         """Возвращает статистику скачивания"""
         return {
@@ -248,25 +515,181 @@ class WikiDownloader:
             'failed_urls': len(self.failed_urls),
             'downloaded_images': len(self.downloaded_images),
             'failed_images': len(self.failed_images),
-            'total_images_found': len(self.downloaded_images) + len(self.failed_images)
+            'total_images_found': len(self.downloaded_images) + len(self.failed_images),
+            'not_modified': self.not_modified,
+            'duplicate_enqueues_avoided': self.frontier.duplicates_avoided
         }
     
     def save_urls_link_files(self) -> None:
         """ Сохраняет JSON-файл со списком итоговых файлов и гиперссылок. """
-        json_path = os.path.join(self.output_dir, 'urls_links_to_files.json')
-        with open(json_path, 'w', encoding='utf-8') as fp:
-            json.dump(self.urls_link_file, fp, ensure_ascii=False, indent=4)
-        logging.info('JSON структура со связкой url и путей к файлам сохраена.')
+        if self.corpus is not None:
+            self.corpus.save_scheme(self.urls_link_file)
+            self.cache.save()
+            # корпус целиком заменяется одним переименованием
+            self.corpus.publish()
+            logging.info(f'Корпус сохранён: {self.corpus.final_path}')
+        else:
+            json_path = os.path.join(self.output_dir, 'urls_links_to_files.json')
+            with open(json_path, 'w', encoding='utf-8') as fp:
+                json.dump(self.urls_link_file, fp, ensure_ascii=False, indent=4)
+            logging.info('JSON структура со связкой url и путей к файлам сохраена.')
+            self.cache.save()
+        # полное состояние теперь в JSON, журнал больше не нужен
+        self.journal.close(remove=True)
+
+    def save_checkpoint(self) -> None:
+        """ Сбрасывает на диск журнал и кэш, например при прерывании обхода """
+        self.journal.close()
+        self.cache.save()
+        if self.corpus is not None:
+            self.corpus.commit()
     
     def download_wiki(self):
         """Основная функция для скачивания всей вики"""
         logging.info(f"Начинаю скачивание с {self.base_url}")
-        
-        # Начинаем с главной страницы
-        urls_to_process = [self.base_url]
-        
+        started = time.perf_counter()
+
+        urls_to_process = self._restore_checkpoint()
+        if self.enumerate_sources:
+            self._enumerate_pages(urls_to_process)
+        crawl = self._download_wiki_concurrent if self.workers > 1 else self._download_wiki_sequential
+        try:
+            crawl(urls_to_process)
+            for _ in range(self.retry_rounds):
+                if not self._requeue_failed(urls_to_process):
+                    break
+                crawl(urls_to_process)
+        finally:
+            self.metrics.wall_s = time.perf_counter() - started
+
+        if self.enumerate_sources:
+            self.save_enumeration_report()
+        self._log_summary()
+
+    def _fetch_listing(self, url):
+        """Загружает служебную страницу (указатель, карту сайта); None при ошибке"""
+        try:
+            with self._request(url, kind='listing') as response:
+                response.raise_for_status()
+                return response.content
+        except requests.RequestException as e:
+            logging.warning(f"Ошибка при загрузке {url}: {e}")
+            return None
+
+    def _seed_layout_links(self, urls_to_process) -> None:
+        """
+        В выгрузке содержимого нет ссылок вёрстки (меню, боковая панель, подвал),
+        поэтому главная один раз загружается целиком, и её ссылки ставятся в очередь:
+        набор страниц тот же, что при загрузке полных страниц
+        """
+        if self.offline:
+            return
+        data = self._fetch_listing(self.base_url)
+        if data is None:
+            logging.warning("Не удалось загрузить вёрстку главной, обход только по ссылкам содержимого")
+            return
+        hrefs = self.extract_page_links(data.decode('utf-8', errors='replace'))[0]
+        links = self.extract_links(hrefs, self.base_url)
+        if self.enumerate_sources:
+            self.found_pages.setdefault('links', set()).update(links)
+        for url in sorted(links):
+            if urls_to_process.push(url):
+                self.journal.start(url)
+
+    def _enumerate_pages(self, urls_to_process) -> None:
+        """
+        Ставит в очередь все страницы из указателя и карты сайта сразу,
+        чтобы загрузка шла параллельно с первых секунд, а страницы без
+        входящих ссылок тоже были скачаны
+        """
+        if self.offline:
+            logging.warning("Без сети список страниц не загружается, обход только по ссылкам")
+            return
+        with self.metrics.timer('enumerate'):
+            enumerator = PageEnumerator(self._fetch_listing, self.base_url, self.workers)
+            self.found_pages.update(enumerator.run(self.enumerate_sources))
+        pages = sorted(set().union(*self.found_pages.values()))
+        enqueued = 0
+        for url in pages:
+            if urls_to_process.push(url):
+                # в журнале - как начальные url, чтобы --resume их не потерял
+                self.journal.start(url)
+                enqueued += 1
+        self.metrics.count('enumerated_pages', len(pages))
+        logging.info(f"Страниц в списках: {len(pages)}, поставлено в очередь: {enqueued}")
+
+    def save_enumeration_report(self) -> dict:
+        """Сохраняет enumeration_report.json: страницы, найденные только одним способом"""
+        found = dict(self.found_pages)
+        found['links'] = set(self.found_pages.get('links', ())) | {canonicalize_url(self.base_url)}
+        report = diff_report(found)
+        with open(os.path.join(self.output_dir, 'enumeration_report.json'), 'w', encoding='utf-8') as fp:
+            json.dump(report, fp, ensure_ascii=False, indent=4)
+        for method, pages in report['only'].items():
+            logging.info(f"Найдено только способом {method}: {len(pages)}")
+        return report
+
+    def _restore_checkpoint(self) -> CrawlFrontier:
+        """Открывает журнал и возвращает очередь обхода"""
+        state = self.journal.open(self.resume)
+        if not (state['pages'] or state['frontier'] or state['failed_pages']):
+            # Начинаем с главной страницы
+            self.frontier = CrawlFrontier([self.base_url])
+            self.journal.start(self.base_url)
+            if self.content_only:
+                self._seed_layout_links(self.frontier)
+            return self.frontier
+
+        self.urls_link_file['pages'].update(state['pages'])
+        self.downloaded_urls.update(state['pages'])
+        self.urls_link_file['images'].update(state['images'])
+        self.downloaded_images.update(state['images'])
+        for url in state['images']:
+            self._image_order[url] = len(self._image_order)
+        # изображения, найденные до прерывания, но ещё не скачанные
+        self._pending_images = state['pending_images'] + sorted(
+            url for url in state['failed_images'] if url not in state['pending_images'])
+
+        logging.info(f"Продолжаю обход: сохранено страниц {len(state['pages'])}, "
+                     f"в очереди {len(state['frontier'])}")
+        # страницы, сохранённые до прерывания, повторно в очередь не попадут
+        self.frontier = CrawlFrontier(state['frontier'], seen=state['pages'])
+        return self.frontier
+
+    def _note_failure(self, url, error) -> None:
+        """Запоминает url, если сервер отказал окончательно (4xx, кроме 408 и 429)"""
+        response = getattr(error, 'response', None)
+        if response is not None and 400 <= response.status_code < 500 \
+                and response.status_code not in (408, 429):
+            with self._lock:
+                self.permanent_failures.add(url)
+
+    def _requeue_failed(self, urls_to_process) -> bool:
+        """Ставит неудачные из-за временных сбоев страницы и изображения на повторную загрузку"""
+        pages = sorted(self.failed_urls - self.permanent_failures)
+        images = sorted(self.failed_images - self.permanent_failures)
+        if not (pages or images):
+            return False
+        logging.info(f"Повтор неудачных загрузок: страниц {len(pages)}, изображений {len(images)}")
+        for url in pages:
+            urls_to_process.requeue(url)
+        self._pending_images = images
+        for url in images:
+            self._image_futures.pop(url, None)
+        return True
+
+    def _resume_images(self):
+        """Ставит на скачивание изображения, оставшиеся с прерванного обхода"""
+        for url in self._pending_images:
+            self._found_image(url)
+        self._pending_images = []
+
+    def _download_wiki_sequential(self, urls_to_process):
+        """Последовательный обход: одна страница за раз"""
+        self._resume_images()
+
         while urls_to_process:
-            current_url = urls_to_process.pop(0)
+            current_url = urls_to_process.pop()
             
             if current_url in self.downloaded_urls:
                 continue
@@ -275,28 +698,110 @@ class WikiDownloader:
             
             # Получаем содержимое страницы
             html_content = self.get_page_content(current_url)
-            if not html_content:
-                self.failed_urls.add(current_url)
+            self._process_page(current_url, html_content, urls_to_process)
+
+    def _download_wiki_concurrent(self, urls_to_process):
+        """
+        Параллельный обход. Страницы разбираются в том же порядке, что и при
+        последовательном обходе, но загружаются заранее пулом потоков;
+        изображения качаются отдельным пулом.
+        """
+        prefetched = {}
+        # url из очереди обхода, ещё не поставленные на загрузку, в том же порядке
+        unfetched = deque(urls_to_process)
+        page_pool = ThreadPoolExecutor(self.workers, thread_name_prefix='page')
+        self._image_pool = ThreadPoolExecutor(self.workers, thread_name_prefix='image')
+        try:
+            self._resume_images()
+            while urls_to_process:
+                self._prefetch_pages(unfetched, prefetched, page_pool)
+                current_url = urls_to_process.pop()
+
+                if current_url in self.downloaded_urls:
+                    continue
+
+                logging.info(f"Обрабатываю: {current_url}")
+
+                future = prefetched.pop(current_url, None)
+                if future is None:
+                    future = page_pool.submit(self.get_page_content, current_url)
+                # ожидание загрузки, которую не удалось скрыть предвыборкой
+                with self.metrics.timer('wait_page'):
+                    html_content = future.result()
+                unfetched.extend(self._process_page(current_url, html_content, urls_to_process))
+
+            wait(list(self._image_futures.values()))
+        finally:
+            page_pool.shutdown(cancel_futures=True)
+            self._image_pool.shutdown()
+            self._image_pool = None
+
+        # порядок записей в схеме такой же, как при последовательном обходе
+        images = self.urls_link_file['images']
+        self.urls_link_file['images'] = {
+            url: images[url]
+            for url in sorted(images, key=lambda url: self._image_order.get(url, 0))
+        }
+
+    def _prefetch_pages(self, unfetched, prefetched, page_pool):
+        """
+        Ставит в очередь загрузки ближайшие страницы обхода. unfetched - ещё не
+        загружаемые url в порядке очереди: каждый просматривается один раз
+        """
+        while unfetched and len(prefetched) < self.workers * 2:
+            url = unfetched.popleft()
+            if url in prefetched or url in self.downloaded_urls:
                 continue
-            
-            # Сохраняем страницу
-            if self.save_page(current_url, html_content):
-                self.downloaded_urls.add(current_url)
-            
-            # Извлекаем новые ссылки
-            soup = BeautifulSoup(html_content, 'html.parser')
-            new_links = self.extract_links(soup, current_url)
-            for link in new_links:
-                if link not in self.downloaded_urls:
-                    urls_to_process.append(link)
-            self.extract_images(soup, current_url)
-            
-            # Небольшая задержка между запросами
-            time.sleep(0.5)
+            prefetched[url] = page_pool.submit(self.get_page_content, url)
+
+    def _process_page(self, current_url, html_content, urls_to_process):
+        """Сохраняет загруженную страницу и пополняет очередь обхода; возвращает новые url очереди"""
+        if not html_content:
+            self.failed_urls.add(current_url)
+            self.journal.page_failed(current_url)
+            return []
+        
+        # Сохраняем страницу
+        saved = self.save_page(current_url, html_content)
+        if saved:
+            self.downloaded_urls.add(current_url)
+            self.failed_urls.discard(current_url)
         
+        # Извлекаем новые ссылки
+        # изображения, впервые найденные на этой странице, - для журнала
+        images = []
+        with self.metrics.timer('parse'):
+            parsed = self.extract_page_links(html_content)
+        hrefs, srcs = parsed[0], parsed[1]
+        # синхронная загрузка изображений в этот этап не входит
+        with self.metrics.timer('extract'):
+            new_links = self.extract_links(hrefs, current_url, images)
+            if self.enumerate_sources:
+                self.found_pages.setdefault('links', set()).update(new_links)
+            enqueued = []
+            for link in new_links:
+                # дубликаты отсекаются очередью при постановке
+                if urls_to_process.push(link):
+                    enqueued.append(link)
+            self.extract_images(srcs, current_url, images)
+
+        if saved:
+            # контрольная точка: страница вместе с найденными на ней ссылками
+            with self.metrics.timer('checkpoint'):
+                self.journal.page(
+                    current_url, self.urls_link_file['pages'][current_url], enqueued, images
+                )
+            if self.on_page is not None:
+                with self.metrics.timer('on_page'):
+                    self.on_page(current_url, html_content, parsed)
+        return enqueued
+
+    def _log_summary(self):
+        """Итоговая статистика в лог"""
         logging.info(f"Скачивание завершено!")
         logging.info(f"Успешно скачано: {len(self.downloaded_urls)} страниц")
         logging.info(f"Ошибок: {len(self.failed_urls)} страниц")
+        logging.info(f"Отсечено повторных постановок в очередь: {self.frontier.duplicates_avoided}")
         logging.info(f"Успешно скачано изображений: {len(self.downloaded_images)}")
         logging.info(f"Ошибок при скачивании изображений: {len(self.failed_images)}")
         
@@ -310,15 +815,84 @@ class WikiDownloader:
             for url in self.failed_images:
                 logging.warning(f"  - {url}")
 
+def parse_args(argv=None):
+    """Разбор аргументов командной строки"""
+    parser = argparse.ArgumentParser(description='Скачивание справки с wiki.qsp.org')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='число потоков загрузки (1 - последовательный обход)')
+    parser.add_argument('--per-host', type=int, default=4,
+                        help='максимум одновременных запросов к одному хосту')
+    parser.add_argument('--rate', type=float, default=4.0,
+                        help='максимум запросов в секунду к хосту (0 - без ограничения)')
+    parser.add_argument('--burst', type=int, default=2,
+                        help='сколько запросов можно отправить подряд без ожидания')
+    parser.add_argument('--retries', type=int, default=3,
+                        help='повторов запроса при ответах 429/5xx и сетевых сбоях')
+    parser.add_argument('--backoff', type=float, default=1.0,
+                        help='начальная задержка повтора, сек. (удваивается с каждой попыткой)')
+    parser.add_argument('--max-backoff', type=float, default=60.0,
+                        help='предел задержки повтора и ожидания по Retry-After, сек.')
+    parser.add_argument('--retry-rounds', type=int, default=1,
+                        help='сколько раз в конце обхода повторить неудачные url')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='не использовать кэш ответов (urls_cache.json)')
+    parser.add_argument('--offline', action='store_true',
+                        help='собрать html_src из кэша без обращения к сети')
+    parser.add_argument('--resume', action='store_true',
+                        help='продолжить прерванный обход с последней контрольной точки')
+    parser.add_argument('--checkpoint-every', type=int, default=20,
+                        help='через сколько событий журнал сбрасывается на диск (fsync)')
+    parser.add_argument('--extractor', choices=sorted(EXTRACTORS), default='stream',
+                        help='извлечение ссылок: stream - потоковый разбор, soup - дерево BeautifulSoup')
+    parser.add_argument('--enumerate', nargs='*', choices=SOURCES, metavar='SOURCE',
+                        help='до обхода получить список всех страниц: index - указатель ?do=index, '
+                             'sitemap - карта сайта (по умолчанию оба); обход по ссылкам дополняет список')
+    parser.add_argument('--content-only', action='store_true',
+                        help='загружать только содержимое страниц (?do=export_xhtml), без вёрстки вики')
+    parser.add_argument('--site-title', default='Документация QSP',
+                        help='название вики в заголовках страниц при --content-only')
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='сохранить метрики этапов в FILE (.json или .csv)')
+    parser.add_argument('--corpus', metavar='FILE',
+                        help='сохранить выгрузку в один файл SQLite вместо отдельных файлов')
+    parser.add_argument('--profile', metavar='FILE', nargs='?', const='download.prof',
+                        help='выполнить обход под cProfile и сохранить статистику (по умолчанию download.prof)')
+    return parser.parse_args(argv)
+
 def main():
     """Главная функция"""
-    downloader = WikiDownloader()
+    args = parse_args()
+    downloader = WikiDownloader(
+        workers=args.workers,
+        per_host_limit=args.per_host,
+        rate=args.rate,
+        burst=args.burst,
+        retries=args.retries,
+        backoff=args.backoff,
+        max_backoff=args.max_backoff,
+        retry_rounds=args.retry_rounds,
+        use_cache=not args.no_cache,
+        offline=args.offline,
+        resume=args.resume,
+        checkpoint_every=args.checkpoint_every,
+        extractor=args.extractor,
+        corpus=args.corpus,
+        enumerate_sources=SOURCES if args.enumerate == [] else (args.enumerate or ()),
+        content_only=args.content_only,
+        site_title=args.site_title
+    )
     
     try:
-        downloader.download_wiki()
+        if args.profile:
+            run_profiled(downloader.download_wiki, args.profile)
+        else:
+            downloader.download_wiki()
         print(f"\nСкачивание завершено!")
-        print(f"HTML файлы сохранены в папке: {downloader.output_dir}")
-        print(f"Изображения сохранены в папке: {downloader.images_dir}")
+        if args.corpus:
+            print(f"Страницы и изображения сохраняются в корпус: {args.corpus}")
+        else:
+            print(f"HTML файлы сохранены в папке: {downloader.output_dir}")
+            print(f"Изображения сохранены в папке: {downloader.images_dir}")
         print(f"Лог сохранен в файле: wiki_download.log")
         
         # Выводим детальную статистику
@@ -329,13 +903,21 @@ def main():
         print(f"  - Скачано изображений: {stats['downloaded_images']}")
         print(f"  - Ошибок изображений: {stats['failed_images']}")
         print(f"  - Всего изображений найдено: {stats['total_images_found']}")
+        print(f"  - Не изменилось с прошлой выгрузки: {stats['not_modified']}")
+        print(f"  - Отсечено дубликатов в очереди: {stats['duplicate_enqueues_avoided']}")
 
         downloader.save_urls_link_files()
+        if args.metrics:
+            downloader.metrics.save(args.metrics)
+            print(f"Метрики сохранены в файле: {args.metrics}")
         
     except KeyboardInterrupt:
+        downloader.save_checkpoint()
         logging.info("Скачивание прервано пользователем")
         print("\nСкачивание прервано пользователем")
+        print("Для продолжения запустите скрипт с ключом --resume")
     except Exception as e:
+        downloader.save_checkpoint()
         logging.error(f"Критическая ошибка: {e}")
         print(f"Произошла ошибка: {e}")
 
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ограничение частоты запросов к вики: корзина токенов с адаптивной
+скоростью, учёт Retry-After и экспоненциальная задержка повторов.
+"""
+
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+# ответы, после которых запрос имеет смысл повторить
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+# ответы, означающие, что сервер просит снизить нагрузку
+THROTTLE_STATUSES = frozenset((429, 503))
+
+class TokenBucket:
+    """
+    Корзина токенов: не больше rate запросов в секунду, всплеск до burst.
+    Скорость адаптивная: при ответах 429/503 она падает вдвое,
+    после череды успешных ответов плавно возвращается к rate.
+    rate <= 0 - без ограничения.
+    """
+
+    def __init__(self, rate:float, burst:int = 1, min_rate:float = 0.1) -> None:
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate) if rate > 0 else 0
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        # до этого момента запросы не отправляются (Retry-After, задержка повтора)
+        self._not_before = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """ Ждёт разрешения на запрос; возвращает время ожидания, сек. """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                delay = self._not_before - now
+                if delay <= 0:
+                    if self.rate <= 0:
+                        return waited
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return waited
+                    delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds:float) -> None:
+        """ Откладывает все следующие запросы на seconds """
+        with self._lock:
+            self._not_before = max(self._not_before, time.monotonic() + seconds)
+
+    def on_throttle(self) -> None:
+        """ Сервер просит снизить нагрузку: скорость падает вдвое """
+        with self._lock:
+            if self.rate > 0:
+                self.rate = max(self.min_rate, self.rate / 2)
+
+    def on_success(self) -> None:
+        """ Успешный ответ: скорость постепенно растёт до заданной """
+        with self._lock:
+            if 0 < self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+def retry_after(value:Optional[str], now:float = None) -> Optional[float]:
+    """ Значение заголовка Retry-After в секундах: число секунд или HTTP-дата """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = time.time() if now is None else now
+    return max(0.0, moment.timestamp() - now)
+
+def backoff_delay(attempt:int, base:float, cap:float, rnd:random.Random = random) -> float:
+    """ Экспоненциальная задержка перед повтором attempt (с 0) со случайным разбросом """
+    delay = min(cap, base * 2 ** attempt)
+    # половина задержки фиксирована, половина случайна: повторы потоков не совпадают
+    return delay / 2 + rnd.uniform(0, delay / 2)
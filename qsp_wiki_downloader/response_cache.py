@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Постоянный кэш ответов для повторной выгрузки вики.
+Хранит для каждого url ETag, Last-Modified, хэш содержимого,
+время загрузки и путь к локальному файлу.
+Файлы и манифест лежат либо на диске, либо в корпусе SQLite (corpus_store).
+"""
+
+import os, json
+import time
+import hashlib
+import threading
+from typing import Optional
+
+# файлы хэшируются кусками, чтобы не читать большие изображения целиком
+HASH_CHUNK_SIZE = 64 * 1024
+
+def content_hash(data:bytes) -> str:
+    """ Хэш содержимого файла """
+    return hashlib.sha256(data).hexdigest()
+
+def file_hash(path:str) -> Optional[str]:
+    """ Хэш файла на диске или None, если файла нет """
+    hasher = hashlib.sha256()
+    try:
+        with open(path, 'rb') as fp:
+            for chunk in iter(lambda: fp.read(HASH_CHUNK_SIZE), b''):
+                hasher.update(chunk)
+    except OSError:
+        return None
+    return hasher.hexdigest()
+
+class ResponseCache:
+    """
+    Манифест кэша: url -> метаданные последнего успешного ответа.
+    Если задан corpus, файлы читаются из корпуса и манифест хранится в нём же.
+    """
+
+    def __init__(self, path:str, enabled:bool = True, corpus = None) -> None:
+        self.path = path
+        self.enabled = enabled
+        self.corpus = corpus
+        self.entries:dict[str, dict] = self._load() if enabled else {}
+        # валидаторы ответа до того, как содержимое сохранено на диск
+        self._validators:dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        if self.corpus is not None:
+            return self.corpus.load_fetch_meta()
+        if not os.path.isfile(self.path):
+            return {}
+        with open(self.path, 'r', encoding='utf-8') as fp:
+            return json.load(fp)
+
+    def _stored_hash(self, path:str) -> Optional[str]:
+        """ Хэш сохранённого файла или None, если его нет """
+        if self.corpus is not None:
+            return self.corpus.file_hash(path)
+        return file_hash(path)
+
+    def get(self, url:str) -> Optional[dict]:
+        """ Запись кэша, если локальный файл на месте и не изменился """
+        entry = self.entries.get(url)
+        if entry is None:
+            return None
+        if self._stored_hash(entry['path']) != entry['sha256']:
+            return None
+        return entry
+
+    def conditional_headers(self, url:str) -> dict:
+        """ Заголовки условного запроса для url """
+        entry = self.get(url) if self.enabled else None
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def read(self, url:str) -> bytes:
+        """ Содержимое закэшированного файла """
+        if self.corpus is not None:
+            return self.corpus.read_file(self.entries[url]['path'])
+        with open(self.entries[url]['path'], 'rb') as fp:
+            return fp.read()
+
+    def remember_validators(self, url:str, headers) -> None:
+        """ Запоминает ETag и Last-Modified ответа до сохранения файла """
+        with self._lock:
+            self._validators[url] = {
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified')
+            }
+
+    def touch(self, url:str) -> None:
+        """ Ответ 304: файл актуален, обновляем только время проверки """
+        with self._lock:
+            self.entries[url]['fetched'] = time.time()
+
+    def is_stored(self, url:str, path:str, data:bytes) -> bool:
+        """ Лежит ли на диске ровно это содержимое по этому пути """
+        entry = self.entries.get(url)
+        return (entry is not None and entry['path'] == path
+                and entry['sha256'] == content_hash(data)
+                and self._stored_hash(path) == entry['sha256'])
+
+    def record(self, url:str, path:str, data:bytes = None, digest:str = None) -> None:
+        """ Записывает в манифест сохранённый файл (содержимое или готовый хэш) """
+        with self._lock:
+            validators = self._validators.pop(url, None)
+            entry = self.entries.get(url, {})
+            if validators is None:
+                validators = {
+                    'etag': entry.get('etag'),
+                    'last_modified': entry.get('last_modified')
+                }
+            self.entries[url] = {
+                'etag': validators['etag'],
+                'last_modified': validators['last_modified'],
+                'sha256': digest or content_hash(data),
+                'fetched': time.time(),
+                'path': path
+            }
+
+    def save(self) -> None:
+        """ Атомарно сохраняет манифест """
+        if not self.enabled:
+            return
+        if self.corpus is not None:
+            with self._lock:
+                self.corpus.save_fetch_meta(self.entries)
+            return
+        tmp_path = f'{self.path}.tmp'
+        with self._lock:
+            with open(tmp_path, 'w', encoding='utf-8') as fp:
+                json.dump(self.entries, fp, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Метрики прогона по этапам: время этапов, гистограммы задержек HTTP,
+счётчики байтов и времена обработки отдельных файлов.
+Общие для загрузчика и ChmPrepare; отчёт сохраняется в JSON или CSV.
+"""
+
+import os, json
+import csv
+import time
+import bisect
+import cProfile
+import pstats
+import threading
+from contextlib import contextmanager
+
+# верхние границы корзин гистограммы задержек, мс
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+def percentile(sorted_values:list, fraction:float) -> float:
+    """ Перцентиль по отсортированному списку (ближайший ранг) """
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+class RunMetrics:
+    """
+    Сборщик метрик, безопасный для потоков.
+    Время этапа считается без вложенных этапов: если во время разбора
+    страницы скачивается изображение, это время уходит этапу загрузки.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stages:dict[str, list] = {}        # этап -> [число, сумма сек., максимум сек.]
+        self.latencies:dict[str, list] = {}     # 'page:200' -> задержки, сек.
+        self.counters:dict[str, int] = {}
+        self.files:dict[str, dict] = {}         # файл -> этап -> сек.
+        self.wall_s = 0.0
+
+    def add_time(self, stage:str, seconds:float, calls:int = 1) -> None:
+        with self._lock:
+            entry = self.stages.setdefault(stage, [0, 0.0, 0.0])
+            entry[0] += calls
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def count(self, name:str, value:int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def timer(self, stage:str):
+        """ Замер этапа; время вложенных этапов из него вычитается """
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        now = time.perf_counter()
+        if stack:
+            parent = stack[-1]
+            parent['own'] += now - parent['start']
+        frame = {'stage': stage, 'start': now, 'own': 0.0}
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            stack.pop()
+            self.add_time(stage, frame['own'] + now - frame['start'])
+            if stack:
+                stack[-1]['start'] = now
+
+    @contextmanager
+    def fetch(self, kind:str):
+        """
+        Замер HTTP-запроса: kind - 'page' или 'image'.
+        В словарь, выдаваемый блоку, записывается код ответа.
+        """
+        record = {'status': 'error'}
+        started = time.perf_counter()
+        try:
+            with self.timer(f'fetch_{kind}'):
+                yield record
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.latencies.setdefault(f"{kind}:{record['status']}", []).append(elapsed)
+
+    def record_file(self, name:str, timings:dict) -> None:
+        """ Времена обработки одного файла; суммируются и в этапы """
+        with self._lock:
+            self.files[name] = dict(timings)
+        for stage, seconds in timings.items():
+            self.add_time(stage, seconds)
+
+    def histogram(self, values:list) -> dict:
+        """ Число запросов по корзинам задержки """
+        buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        for value in values:
+            buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, value * 1000)] += 1
+        labels = [f'<={b}ms' for b in LATENCY_BUCKETS_MS] + [f'>{LATENCY_BUCKETS_MS[-1]}ms']
+        return dict(zip(labels, buckets))
+
+    def report(self) -> dict:
+        """ Отчёт: этапы, задержки запросов, счётчики, файлы """
+        with self._lock:
+            stages = {
+                stage: {
+                    'count': count,
+                    'total_s': round(total, 6),
+                    'mean_ms': round(total / count * 1000, 3) if count else 0.0,
+                    'max_ms': round(longest * 1000, 3)
+                }
+                for stage, (count, total, longest) in sorted(self.stages.items())
+            }
+            fetch = {}
+            for key, values in sorted(self.latencies.items()):
+                ordered = sorted(values)
+                fetch[key] = {
+                    'count': len(ordered),
+                    'total_s': round(sum(ordered), 6),
+                    'p50_ms': round(percentile(ordered, 0.5) * 1000, 3),
+                    'p90_ms': round(percentile(ordered, 0.9) * 1000, 3),
+                    'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+                    'max_ms': round(ordered[-1] * 1000, 3),
+                    'histogram': self.histogram(ordered)
+                }
+            return {
+                'wall_s': round(self.wall_s, 6),
+                'stages': stages,
+                'fetch': fetch,
+                'counters': dict(sorted(self.counters.items())),
+                'files': {
+                    name: {stage: round(seconds, 6) for stage, seconds in timings.items()}
+                    for name, timings in sorted(self.files.items())
+                }
+            }
+
+    def rows(self):
+        """ Отчёт в виде строк (раздел, имя, метрика, значение) для CSV """
+        report = self.report()
+        yield 'run', 'total', 'wall_s', report['wall_s']
+        for section in ('stages', 'fetch', 'files'):
+            for name, values in report[section].items():
+                for metric, value in values.items():
+                    if metric == 'histogram':
+                        for bucket, count in value.items():
+                            yield section, name, bucket, count
+                    else:
+                        yield section, name, metric, value
+        for name, value in report['counters'].items():
+            yield 'counters', name, 'value', value
+
+    def save(self, path:str) -> None:
+        """ Сохраняет отчёт: .csv - таблицей, иначе JSON """
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        if path.lower().endswith('.csv'):
+            with open(path, 'w', encoding='utf-8', newline='') as fp:
+                writer = csv.writer(fp)
+                writer.writerow(('section', 'name', 'metric', 'value'))
+                writer.writerows(self.rows())
+        else:
+            with open(path, 'w', encoding='utf-8') as fp:
+                json.dump(self.report(), fp, ensure_ascii=False, indent=2)
+
+def run_profiled(func, path:str, top:int = 30):
+    """
+    Выполняет func под cProfile, сохраняет статистику в path
+    и печатает самые затратные функции. Профилируется только текущий поток.
+    """
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func)
+    finally:
+        profiler.dump_stats(path)
+        print(f'\nПрофиль сохранён в {path} (просмотр: python -m pstats {path})')
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(top)
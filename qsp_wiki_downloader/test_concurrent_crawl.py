@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка параллельного обхода на локальной копии вики (html_src)
+"""
+
+def test_concurrent_crawl(tmp_path, wiki_server, crawl):
+    """Параллельный обход даёт тот же результат, что и последовательный"""
+    seq, seq_files, seq_scheme = crawl(wiki_server.base_url, tmp_path / 'seq')
+    par, par_files, par_scheme = crawl(
+        wiki_server.base_url, tmp_path / 'par', workers=4, per_host_limit=3)
+
+    assert len(seq.downloaded_urls) > 50
+    assert seq_files == par_files
+    assert list(seq_scheme['pages'].items()) == list(par_scheme['pages'].items())
+    assert list(seq_scheme['images'].items()) == list(par_scheme['images'].items())
+    assert seq.get_download_stats() == par.get_download_stats()
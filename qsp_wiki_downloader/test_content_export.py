@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка загрузки только содержимого (?do=export_xhtml): набор страниц,
+заголовки, ссылки, изображения и якоря области div.page.group те же,
+что при загрузке полных страниц, а байтов передаётся меньше
+"""
+
+import re
+
+from qsp_wiki_downloader import WikiDownloader
+from link_extractor import extract_stream_content
+from content_export import export_url, content_page
+
+ATTR_RE = re.compile(r'\s(href|src|id|name)="([^"]*)"')
+TITLE_RE = re.compile(r'<title>(.*?)</title>')
+
+def test_export_url_and_title():
+    assert export_url('https://wiki.qsp.org') == 'https://wiki.qsp.org/?do=export_xhtml'
+    assert export_url('https://wiki.qsp.org/help:acts#x') == 'https://wiki.qsp.org/help:acts?do=export_xhtml'
+    assert export_url('https://wiki.qsp.org/doku.php?id=help:acts&do=show') == \
+        'https://wiki.qsp.org/doku.php?id=help:acts&do=export_xhtml'
+
+    export = '<html><head><title>help:acts</title></head><body><div class="dokuwiki export">{}</div></body></html>'
+    toc = '<!-- TOC START --><div id="dw__toc"><h3>Содержание</h3></div><!-- TOC END -->'
+    page = content_page(export.format(toc + '<h1 id="a">Действия <b>и</b></h1><p>x</p>'), 'Вики')
+    assert '<title>Действия и [Вики]</title>' in page and '<div class="page group">' in page
+    assert '<title>help:acts [Вики]</title>' in content_page(export.format('<p>без заголовка</p>'), 'Вики')
+    assert content_page(export.format('\n'), 'Вики') is None
+
+def content_attrs(html_content):
+    """ Заголовок и атрибуты ссылок, изображений и якорей области содержимого """
+    start, end = extract_stream_content(html_content)[2]
+    return TITLE_RE.search(html_content).group(1), ATTR_RE.findall(html_content[start:end])
+
+def test_content_only_parity(tmp_path, wiki_server):
+    downloaders = {}
+    for content_only in (False, True):
+        downloader = WikiDownloader(base_url=wiki_server.base_url, output_dir=str(tmp_path / str(content_only)),
+                                    rate=0, workers=4, content_only=content_only)
+        downloader.download_wiki()
+        downloaders[content_only] = downloader
+
+    full, content = downloaders[False], downloaders[True]
+    assert full.downloaded_urls == content.downloaded_urls and len(full.downloaded_urls) > 50
+    assert content.downloaded_images == full.downloaded_images
+    assert content.metrics.counters['bytes_pages'] < full.metrics.counters['bytes_pages'] / 2
+
+    for url, path in full.urls_link_file['pages'].items():
+        with open(path, encoding='utf-8') as fp:
+            expected = content_attrs(fp.read())
+        with open(content.urls_link_file['pages'][url], encoding='utf-8') as fp:
+            assert content_attrs(fp.read()) == expected, url
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка корпуса SQLite: та же выгрузка, что и в папку, без частичных корпусов
+"""
+
+import io
+import os
+import hashlib
+
+from corpus_store import CorpusStore
+from qsp_wiki_downloader import WikiDownloader
+
+def crawl_corpus(base_url, output_dir, corpus_path, **kwargs):
+    """Скачивает локальную вики в корпус"""
+    downloader = WikiDownloader(base_url=base_url, output_dir=str(output_dir), rate=0,
+                                corpus=str(corpus_path), **kwargs)
+    downloader.download_wiki()
+    downloader.save_urls_link_files()
+    return downloader
+
+def export(corpus_path, dst_dir):
+    """Разворачивает корпус в папку формата html_src"""
+    CorpusStore(str(corpus_path), readonly=True).export_folder(str(dst_dir))
+    return dst_dir
+
+def test_corpus_matches_folder(tmp_path, wiki_server, crawl, read_output):
+    """Корпус содержит ровно то, что легло бы в папку; повторный обход идёт по кэшу корпуса"""
+    corpus_path = tmp_path / 'wiki.sqlite'
+    _, files, scheme = crawl(wiki_server.base_url, tmp_path / 'folder', workers=4)
+    first = crawl_corpus(wiki_server.base_url, tmp_path / 'corpus', corpus_path, workers=4)
+    again = crawl_corpus(wiki_server.base_url, tmp_path / 'corpus', corpus_path, workers=4)
+
+    assert not any(name.endswith('.html') for name in os.listdir(tmp_path / 'corpus'))
+    assert not os.listdir(tmp_path / 'corpus' / 'images')
+    corpus_files, corpus_scheme = read_output(export(corpus_path, tmp_path / 'exported'))
+    assert corpus_files == files
+    assert list(corpus_scheme['pages'].items()) == list(scheme['pages'].items())
+    assert list(corpus_scheme['images'].items()) == list(scheme['images'].items())
+
+    stats = again.get_download_stats()
+    assert stats['not_modified'] == stats['downloaded_urls'] + stats['downloaded_images']
+    assert stats == {**first.get_download_stats(), 'not_modified': stats['not_modified']}
+
+def test_write_stream(tmp_path):
+    """Файл из потока пишется по частям и не отличается от записанного целиком"""
+    corpus = CorpusStore(str(tmp_path / 'wiki.sqlite'), root=str(tmp_path))
+    data = os.urandom(100_000)
+    digest = hashlib.sha256(data).hexdigest()
+    corpus.write_stream(str(tmp_path / 'images' / 'a.png'), io.BytesIO(data), len(data), digest, chunk_size=4096)
+    assert corpus.write_file(str(tmp_path / 'images' / 'b.png'), data) == digest
+    assert corpus.read_file(str(tmp_path / 'images' / 'a.png')) == data
+    assert corpus.stats()['blobs'] == 1 and corpus.file_size(str(tmp_path / 'images' / 'b.png')) == len(data)
+
+def test_interrupted_crawl_leaves_no_partial_corpus(tmp_path, wiki_server, crawl, read_output):
+    """До сохранения схемы корпуса нет; --resume продолжает с .part и публикует его"""
+    corpus_path = tmp_path / 'wiki.sqlite'
+    interrupted = WikiDownloader(base_url=wiki_server.base_url, output_dir=str(tmp_path / 'out'),
+                                 rate=0, corpus=str(corpus_path))
+    interrupted.download_wiki()
+    interrupted.save_checkpoint()
+    assert not corpus_path.exists()
+    assert (tmp_path / 'wiki.sqlite.part').exists()
+
+    resumed = crawl_corpus(wiki_server.base_url, tmp_path / 'out', corpus_path, resume=True)
+    _, files, scheme = crawl(wiki_server.base_url, tmp_path / 'folder')
+
+    assert not (tmp_path / 'wiki.sqlite.part').exists()
+    assert resumed.get_download_stats()['downloaded_urls'] == len(scheme['pages'])
+    corpus_files, corpus_scheme = read_output(export(corpus_path, tmp_path / 'exported'))
+    assert corpus_files == files
+    assert corpus_scheme == scheme
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка очереди обхода и канонизации url
+"""
+
+from crawl_frontier import CrawlFrontier, canonicalize_url
+
+def test_canonicalize_url():
+    """Разные записи одной страницы приводятся к одному url"""
+    canonical = 'https://wiki.qsp.org/help:acts'
+    variants = [
+        'https://wiki.qsp.org/help:acts',
+        'HTTPS://Wiki.QSP.org/help:acts',
+        'https://wiki.qsp.org:443/help:acts',
+        'https://wiki.qsp.org/help:acts/',
+        'https://wiki.qsp.org/Help:Acts',
+        'https://wiki.qsp.org/help%3Aacts',
+        'https://wiki.qsp.org/help:acts?do=index#top',
+        'https://wiki.qsp.org/doku.php?id=help:acts',
+        'https://wiki.qsp.org/doku.php?id=help%3Aacts&rev=0',
+        'https://wiki.qsp.org/doku.php/help:acts',
+    ]
+    for url in variants:
+        assert canonicalize_url(url) == canonical, url
+
+    assert canonicalize_url('https://wiki.qsp.org/') == 'https://wiki.qsp.org'
+    assert canonicalize_url('https://wiki.qsp.org/doku.php') == 'https://wiki.qsp.org/doku.php'
+    assert canonicalize_url('http://127.0.0.1:8000/start') == 'http://127.0.0.1:8000/start'
+
+def test_frontier_deduplicates_on_enqueue():
+    """Повторно встреченный url не попадает в очередь"""
+    frontier = CrawlFrontier(['https://wiki.qsp.org'])
+    assert frontier.push('https://wiki.qsp.org/help:acts')
+    assert not frontier.push('https://wiki.qsp.org/Help:Acts/')
+    assert not frontier.push('https://wiki.qsp.org/')
+
+    assert [frontier.pop(), frontier.pop()] == [
+        'https://wiki.qsp.org', 'https://wiki.qsp.org/help:acts']
+    assert not frontier
+    # обработанный url не возвращается в очередь
+    assert not frontier.push('https://wiki.qsp.org/help:acts')
+    assert frontier.get_stats() == {'enqueued': 2, 'duplicates_avoided': 3}
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка продолжения прерванного обхода по журналу
+"""
+
+import os
+
+import pytest
+
+from qsp_wiki_downloader import WikiDownloader
+
+class InterruptedDownloader(WikiDownloader):
+    """Загрузчик, который «падает» после заданного числа страниц"""
+
+    def __init__(self, *args, pages_before_interrupt=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pages_before_interrupt = pages_before_interrupt
+
+    def save_page(self, url, html_content):
+        if len(self.downloaded_urls) >= self.pages_before_interrupt:
+            raise KeyboardInterrupt
+        return super().save_page(url, html_content)
+
+class RecordingDownloader(WikiDownloader):
+    """Загрузчик, запоминающий запрошенные страницы"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fetched_pages = []
+
+    def get_page_content(self, url):
+        self.fetched_pages.append(url)
+        return super().get_page_content(url)
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_resume_after_interrupt(tmp_path, workers, wiki_server, crawl, read_output):
+    """После прерывания обход продолжается без повторной загрузки страниц"""
+    _, full_files, full_scheme = crawl(wiki_server.base_url, tmp_path / 'full')
+
+    output_dir = str(tmp_path / 'resumed')
+    interrupted = InterruptedDownloader(
+        base_url=wiki_server.base_url, output_dir=output_dir, rate=0,
+        use_cache=False, workers=workers, pages_before_interrupt=20)
+    with pytest.raises(KeyboardInterrupt):
+        interrupted.download_wiki()
+    interrupted.save_checkpoint()
+    saved_before = set(interrupted.downloaded_urls)
+    assert len(saved_before) == 20
+
+    resumed = RecordingDownloader(
+        base_url=wiki_server.base_url, output_dir=output_dir, rate=0,
+        use_cache=False, workers=workers, resume=True)
+    resumed.download_wiki()
+    resumed.save_urls_link_files()
+
+    assert not saved_before & set(resumed.fetched_pages)
+    assert not os.path.exists(os.path.join(output_dir, 'crawl_journal.jsonl'))
+    resumed_files, resumed_scheme = read_output(output_dir)
+    assert resumed_files == full_files
+    assert resumed_scheme['pages'] == full_scheme['pages']
+    assert resumed_scheme['images'] == full_scheme['images']
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка хранилища изображений, адресуемого по хэшу содержимого
+"""
+
+import os
+
+from qsp_wiki_downloader import WikiDownloader
+from local_wiki_server import LocalWikiServer
+
+def test_content_addressed_images(tmp_path, html_src):
+    """Одинаковые изображения хранятся один раз, одноимённые не затирают друг друга"""
+    smile = os.path.join(html_src, 'images', 'icon_smile.gif')
+    smile2 = os.path.join(html_src, 'images', 'icon_smile2.gif')
+    routes = {
+        '/a/icon.gif': smile,
+        '/b/icon.gif': smile2,
+        '/c/copy.gif': smile,
+    }
+    with LocalWikiServer(routes) as server:
+        downloader = WikiDownloader(base_url=server.base_url, output_dir=str(tmp_path), rate=0)
+        for path in routes:
+            assert downloader.download_image(server.base_url + path)
+
+    images = downloader.urls_link_file['images']
+    assert images[server.base_url + '/a/icon.gif'] == images[server.base_url + '/c/copy.gif']
+    assert images[server.base_url + '/a/icon.gif'] != images[server.base_url + '/b/icon.gif']
+    assert sorted(os.listdir(downloader.images_dir)) == sorted(
+        os.path.basename(path) for path in set(images.values()))
+
+    for url, local_path in images.items():
+        with open(local_path, 'rb') as fp, open(routes[url[len(server.base_url):]], 'rb') as src:
+            assert fp.read() == src.read()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка совпадения потокового и древесного извлечения ссылок на html_src
+"""
+
+import os, glob
+
+from bs4 import BeautifulSoup
+
+from link_extractor import extract_soup, extract_stream, extract_stream_content
+
+def test_extractors_parity(html_src):
+    """Оба способа извлекают одни и те же href и src на каждой странице"""
+    pages = sorted(glob.glob(os.path.join(html_src, '*.html')))
+    assert pages
+    for page in pages:
+        with open(page, 'r', encoding='utf-8') as fp:
+            html_content = fp.read()
+        assert extract_stream(html_content) == extract_soup(html_content), page
+
+def test_extractor_edge_cases():
+    """Сущности, пустые и повторные атрибуты разбираются одинаково"""
+    html_content = '''
+        <a href="/help:acts?do=index&amp;x=1">a</a>
+        <a href>empty</a><a name="top">no href</a>
+        <a href="/first" href="/second">dup</a>
+        <IMG SRC="/_media/logo.png"/><img alt="no src">
+        <script>var s = '<a href="/in_script">';</script>
+    '''
+    assert extract_stream(html_content) == extract_soup(html_content)
+    assert extract_stream(html_content) == (
+        ['/help:acts?do=index&x=1', '', '/second'], ['/_media/logo.png'])
+
+def test_content_span(html_src):
+    """Границы div.page.group указывают на тот же фрагмент, что выделяет BeautifulSoup"""
+    for page in sorted(glob.glob(os.path.join(html_src, '*.html'))):
+        with open(page, 'r', encoding='utf-8') as fp:
+            html_content = fp.read()
+        hrefs, srcs, span = extract_stream_content(html_content)
+        assert (hrefs, srcs) == extract_stream(html_content)
+        expected = BeautifulSoup(html_content, 'html.parser').select('div.page.group')
+        if not expected:
+            assert span is None, page
+            continue
+        fragment = BeautifulSoup(html_content[span[0]:span[1]], 'html.parser')
+        assert fragment.select('div.page.group')[0] == expected[0], page
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка перечисления страниц по указателю и карте сайта: страницы без
+входящих ссылок скачиваются, обход по ссылкам дополняет список, а отчёт
+показывает страницы, найденные только одним способом
+"""
+
+import os, json
+import gzip
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from qsp_wiki_downloader import WikiDownloader
+from page_enumerator import parse_index, parse_sitemap
+
+INDEX_PAGE = '''<html><body><div id="dokuwiki__aside"><a href="/help:acts">не указатель</a></div>
+<div id="index__tree"><ul class="idx">{items}</ul></div></body></html>'''
+ORPHAN = '<html><body><div class="page group"><h1>{}</h1><a href="/start">start</a></div></body></html>'
+
+def make_wiki(folder, routes, base, html_src):
+    """ Маршруты локальной вики с указателем, картой сайта и двумя страницами без входящих ссылок """
+    with open(os.path.join(html_src, 'urls_links_to_files.json'), encoding='utf-8') as fp:
+        pages = [urlsplit(url).path.lstrip('/') for url in json.load(fp)['pages']]
+    # help:acts в списках нет - её находит только обход по ссылкам
+    pages = [page for page in pages if page and page != 'help:acts']
+    namespaces = defaultdict(list)
+    for page in pages + ['orphan']:
+        namespace, _, _ = page.rpartition(':')
+        namespaces[namespace].append(page)
+
+    def write(name, data):
+        path = folder / name
+        path.write_bytes(data)
+        return str(path)
+
+    items = [f'<li class="closed"><div class="li"><a href="/doku.php?id=start&amp;idx={ns}" class="idx_dir">'
+             f'<strong>{ns}</strong></a></div></li>' for ns in sorted(namespaces) if ns]
+    items += [f'<li class="level1"><div class="li"><a href="/{page}" class="wikilink1">{page}</a></div></li>'
+              for page in namespaces['']]
+    routes['/doku.php?id=start&do=index'] = write('index.html', INDEX_PAGE.format(items=''.join(items)).encode())
+    for ns in namespaces:
+        if ns:
+            items = ''.join(f'<li><div class="li"><a href="/doku.php?id={page}" class="wikilink1">{page}</a></div></li>'
+                            for page in namespaces[ns])
+            routes[f'/doku.php?id=start&idx={ns}&do=index'] = write(f'index_{ns}.html', INDEX_PAGE.format(items=items).encode())
+
+    locs = ''.join(f'<url><loc>{base}/{page}</loc></url>' for page in pages + ['orphan2'])
+    sitemap = f'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{locs}</urlset>'
+    routes['/doku.php?do=sitemap'] = write('sitemap.xml.gz', gzip.compress(sitemap.encode()))
+    routes['/orphan'] = write('orphan.html', ORPHAN.format('orphan').encode())
+    routes['/orphan2'] = write('orphan2.html', ORPHAN.format('orphan2').encode())
+
+def test_parse_index_and_sitemap():
+    pages, namespaces = parse_index(INDEX_PAGE.format(
+        items='<li><a href="/doku.php?id=start&amp;idx=help" class="idx_dir">help</a></li>'
+              '<li><a href="/help:acts" class="wikilink1">acts</a></li>'))
+    assert pages == ['/help:acts'] and namespaces == ['/doku.php?id=start&idx=help']
+    sitemap = b'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"><url><loc> https://x/a </loc></url></urlset>'
+    assert parse_sitemap(sitemap) == parse_sitemap(gzip.compress(sitemap)) == ['https://x/a']
+
+def test_enumerated_crawl(tmp_path, html_src, wiki_routes, wiki_server):
+    (tmp_path / 'wiki').mkdir()
+    # карта сайта содержит абсолютные адреса, поэтому маршруты дописываются после запуска
+    base = wiki_server.base_url
+    make_wiki(tmp_path / 'wiki', wiki_routes, base, html_src)
+    linked = WikiDownloader(base_url=base, output_dir=str(tmp_path / 'links'), rate=0)
+    linked.download_wiki()
+    downloader = WikiDownloader(base_url=base, output_dir=str(tmp_path / 'out'), rate=0,
+                                workers=4, enumerate_sources=('index', 'sitemap'))
+    downloader.download_wiki()
+
+    assert linked.downloaded_urls < downloader.downloaded_urls
+    assert downloader.downloaded_urls - linked.downloaded_urls == {f'{base}/orphan', f'{base}/orphan2'}
+    # в списках нет главной и help:acts, зато есть обе страницы без ссылок
+    assert downloader.metrics.counters['enumerated_pages'] == len(linked.downloaded_urls) - 2 + 2
+
+    with open(tmp_path / 'out' / 'enumeration_report.json', encoding='utf-8') as fp:
+        report = json.load(fp)
+    assert report['only']['index'] == [f'{base}/orphan']
+    assert report['only']['sitemap'] == [f'{base}/orphan2']
+    assert f'{base}/help:acts' in report['only']['links']
+    assert f'{base}/start' not in report['only']['links']
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка ограничения частоты запросов и повторов при сбоях сервера
+"""
+
+import time
+import random
+from email.utils import formatdate
+
+from rate_limiter import TokenBucket, retry_after, backoff_delay
+from local_wiki_server import LocalWikiServer
+
+def test_token_bucket_rate():
+    """Не больше rate запросов в секунду; 429/503 снижают скорость, успехи возвращают"""
+    bucket = TokenBucket(rate=20, burst=1)
+    started = time.monotonic()
+    for _ in range(11):
+        bucket.acquire()
+    assert time.monotonic() - started >= 0.45
+
+    bucket.on_throttle()
+    assert bucket.rate == 10
+    for _ in range(100):
+        bucket.on_success()
+    assert bucket.rate == 20
+
+    bucket.pause(0.2)
+    assert bucket.acquire() >= 0.15
+
+def test_retry_after_and_backoff():
+    assert retry_after('3') == 3
+    assert retry_after(None) is None
+    assert retry_after('soon') is None
+    now = time.time()
+    assert 9 <= retry_after(formatdate(now + 10, usegmt=True), now) <= 10
+
+    rnd = random.Random(1)
+    for attempt in range(10):
+        delay = backoff_delay(attempt, 1.0, 30.0, rnd)
+        assert min(30, 2 ** attempt) / 2 <= delay <= min(30, 2 ** attempt)
+
+def test_transient_errors_are_retried(tmp_path, wiki_server, wiki_routes, crawl):
+    """Ответы 503/429/500 повторяются, результат совпадает с обходом без сбоев"""
+    clean, clean_files, clean_scheme = crawl(wiki_server.base_url, tmp_path / 'clean')
+    clean_base = wiki_server.base_url
+
+    faults = {'/help:acts': [503, 429], '/_media/wiki:logo.png': [500]}
+    with LocalWikiServer(wiki_routes, faults=faults, retry_after='0') as server:
+        downloader, files, scheme = crawl(server.base_url, tmp_path / 'faults', backoff=0.01)
+        assert server.faults_served == 3
+        base = server.base_url
+
+    # остаются только отсутствующие в локальной копии изображения, как и без сбоев
+    assert not downloader.failed_urls
+    assert {url.replace(base, '') for url in downloader.failed_images} == \
+        {url.replace(clean_base, '') for url in clean.failed_images}
+    assert downloader.failed_images == downloader.permanent_failures
+    assert downloader.metrics.report()['counters']['retries'] == 3
+    assert files == clean_files
+    # порядок обхода зависит от хэшей url, а в них входит порт сервера
+    assert {url.replace(base, '') for url in scheme['pages']} == \
+        {url.replace(clean_base, '') for url in clean_scheme['pages']}
+
+def test_failed_urls_retried_after_crawl(tmp_path, wiki_routes, crawl):
+    """Без повторов запроса страница восстанавливается повтором в конце обхода"""
+    faults = {'/help:acts': [503]}
+    with LocalWikiServer(wiki_routes, faults=dict(faults)) as server:
+        skipped, _, _ = crawl(server.base_url, tmp_path / 'no_rounds', retries=0, retry_rounds=0)
+    assert any(url.endswith('/help:acts') for url in skipped.failed_urls)
+
+    with LocalWikiServer(wiki_routes, faults=dict(faults)) as server:
+        downloader, _, scheme = crawl(server.base_url, tmp_path / 'rounds', retries=0, workers=4)
+    assert not downloader.failed_urls
+    assert any(url.endswith('/help:acts') for url in scheme['pages'])
+    assert len(downloader.downloaded_urls) == len(skipped.downloaded_urls) + 1
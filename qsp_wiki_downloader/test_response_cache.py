@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка повторной выгрузки с условными запросами и сборки из кэша
+"""
+
+import os
+
+from local_wiki_server import LocalWikiServer
+
+def test_conditional_recrawl(tmp_path, wiki_server, crawl):
+    """Повторная выгрузка получает 304 и не меняет результат"""
+    first, first_files, first_scheme = crawl(wiki_server.base_url, tmp_path)
+    assert first.not_modified == 0
+    assert os.path.isfile(os.path.join(tmp_path, 'urls_cache.json'))
+
+    second, second_files, second_scheme = crawl(wiki_server.base_url, tmp_path)
+
+    stored = len(first.downloaded_urls) + len(first.downloaded_images)
+    assert second.not_modified == stored
+    assert wiki_server.not_modified_count == stored
+    assert first_files == second_files
+    assert first_scheme == second_scheme
+
+def test_offline_rebuild(tmp_path, wiki_routes, crawl):
+    """Без сети html_src и схема восстанавливаются из кэша"""
+    # сервер останавливается до сборки без сети
+    with LocalWikiServer(wiki_routes) as server:
+        base_url = server.base_url
+        online, _, online_scheme = crawl(base_url, tmp_path)
+
+    offline, _, offline_scheme = crawl(base_url, tmp_path, offline=True)
+    assert offline_scheme == online_scheme
+    assert offline.get_download_stats()['downloaded_urls'] == len(online.downloaded_urls)
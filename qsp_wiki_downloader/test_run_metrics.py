@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка метрик этапов: вложенные замеры, гистограммы запросов, отчёты
+"""
+
+import csv, json
+import time
+
+from run_metrics import RunMetrics
+
+def test_nested_timers_are_exclusive():
+    """Время вложенного этапа не входит во внешний"""
+    metrics = RunMetrics()
+    with metrics.timer('outer'):
+        with metrics.timer('inner'):
+            time.sleep(0.05)
+    stages = metrics.report()['stages']
+    assert stages['inner']['total_s'] >= 0.05
+    assert stages['outer']['total_s'] < 0.02
+    assert stages['outer']['count'] == stages['inner']['count'] == 1
+
+def test_crawl_metrics(tmp_path, wiki_server, crawl):
+    """Каждый запрос попадает в гистограмму, байты совпадают с отданными сервером"""
+    downloader, _, _ = crawl(wiki_server.base_url, tmp_path / 'out', workers=4)
+    requests_count, bytes_sent = wiki_server.requests_count, wiki_server.bytes_sent
+
+    report = downloader.metrics.report()
+    fetched = sum(entry['count'] for entry in report['fetch'].values())
+    assert fetched == requests_count
+    assert report['fetch']['page:200']['count'] == len(downloader.downloaded_urls)
+    assert sum(report['fetch']['page:200']['histogram'].values()) == len(downloader.downloaded_urls)
+    assert report['counters']['bytes_pages'] + report['counters']['bytes_images'] == bytes_sent
+    for stage in ('parse', 'extract', 'write_page', 'write_image', 'checkpoint', 'fetch_page'):
+        assert report['stages'][stage]['count'] > 0
+    assert report['wall_s'] > 0
+
+    downloader.metrics.save(str(tmp_path / 'metrics.json'))
+    downloader.metrics.save(str(tmp_path / 'metrics.csv'))
+    with open(tmp_path / 'metrics.json', encoding='utf-8') as fp:
+        assert json.load(fp)['stages'].keys() == report['stages'].keys()
+    with open(tmp_path / 'metrics.csv', encoding='utf-8') as fp:
+        rows = list(csv.DictReader(fp))
+    assert {'section': 'fetch', 'name': 'page:200', 'metric': 'count',
+            'value': str(len(downloader.downloaded_urls))} in rows